@@ -12,6 +12,7 @@ class MCPContextRequest(BaseModel):
     messages: List[MCPMessage] = Field(..., description="The conversation history")
     query: str = Field(..., description="The current query or message to find context for")
     max_context_length: Optional[int] = Field(1000, description="Maximum length of context to return")
+    max_context_tokens: Optional[int] = Field(None, description="Token budget for the context; derived from max_context_length when omitted")
     metadata_filter: Optional[Dict[str, Any]] = Field(None, description="Optional filter for document metadata")
 
     model_config = ConfigDict(
@@ -32,6 +33,7 @@ class MCPContextSource(BaseModel):
     content: str = Field(..., description="The relevant content from the source")
     similarity: float = Field(..., description="Similarity score between query and content")
     last_modified: str = Field(..., description="Last modification date of the source")
+    duplicates: List[str] = Field(default_factory=list, description="URLs of near-duplicate copies collapsed into this source")
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -66,3 +68,23 @@ class MCPContextResponse(BaseModel):
             }
         }
     )
+
+class MCPBatchContextRequest(BaseModel):
+    """Request model for retrieving context for several queries at once"""
+    requests: List[MCPContextRequest] = Field(..., min_length=1, max_length=100, description="Context requests to answer in order")
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        json_schema_extra={
+            "example": {
+                "requests": [
+                    {"messages": [], "query": "What is RAG?", "max_context_length": 1000},
+                    {"messages": [], "query": "How do I deploy?", "max_context_length": 1000}
+                ]
+            }
+        }
+    )
+
+class MCPBatchContextResponse(BaseModel):
+    """Response model for batch context retrieval"""
+    responses: List[MCPContextResponse] = Field(..., description="One context response per request, in request order")
@@ -1,71 +1,162 @@
 """MCP Protocol router for context retrieval"""
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from loguru import logger
-from typing import List
+from typing import List, Dict, Any, Optional
+import asyncio
 from pydantic import BaseModel
 
-from app.api.mcp.models import MCPContextRequest, MCPContextResponse, MCPContextSource
+from app.api.mcp.models import (
+    MCPContextRequest,
+    MCPContextResponse,
+    MCPContextSource,
+    MCPBatchContextRequest,
+    MCPBatchContextResponse,
+)
 from app.core.config import Settings
-from app.services.rag import RAGService
-from app.services.chromadb import ChromaDBService
+from app.core.tracing import stage
+from app.services.rag import RAGService, SEARCH_STAGE
+from app.services.rerank import RerankService
+from app.services.context import ContextPacker, SOURCE_SEPARATOR
 
 router = APIRouter()
 
+# Number of sources returned for a context request
+CONTEXT_TOP_K = 5
+
 def get_settings() -> Settings:
     """Get application settings."""
     return Settings()
 
-def get_rag_service(settings: Settings = Depends(get_settings)) -> RAGService:
-    """Dependency to get RAG service instance"""
-    chromadb = ChromaDBService(settings)
-    return RAGService(chromadb, settings)
+def get_rag_service(request: Request) -> RAGService:
+    """Dependency to get the warm RAG service created at startup"""
+    rag_service = getattr(request.app.state, "rag", None)
+    if rag_service is None:
+        raise HTTPException(status_code=503, detail="Services are still starting")
+    return rag_service
+
+def get_context_packer(settings: Settings = Depends(get_settings)) -> ContextPacker:
+    """Dependency to get the context packer"""
+    return ContextPacker(settings)
+
+def get_rerank_service(request: Request) -> Optional[RerankService]:
+    """Dependency to get the optional rerank service created at startup"""
+    return getattr(request.app.state, "rerank", None)
 
 @router.post("/context", response_model=MCPContextResponse)
 async def get_context(
     request: MCPContextRequest,
-    rag_service: RAGService = Depends(get_rag_service)
+    rag_service: RAGService = Depends(get_rag_service),
+    rerank_service: Optional[RerankService] = Depends(get_rerank_service),
+    packer: ContextPacker = Depends(get_context_packer)
 ) -> MCPContextResponse:
     """Get relevant context for the given query"""
     try:
+        # Over-fetch candidates when a rerank stage is configured
+        n_results = CONTEXT_TOP_K
+        if rerank_service is not None:
+            n_results = max(CONTEXT_TOP_K, rerank_service.settings.RERANK_CANDIDATES)
+
         # Get relevant documents
         results = await rag_service.search(
             query=request.query,
-            n_results=5,
+            n_results=n_results,
             metadata_filter=request.metadata_filter
         )
+
+        if rerank_service is not None:
+            with stage(SEARCH_STAGE, "search.rerank", stage="rerank"):
+                results = await rerank_service.rerank(request.query, results, top_k=CONTEXT_TOP_K)
+
+        with stage(SEARCH_STAGE, "search.pack", stage="pack"):
+            return _build_response(request, results, packer)
         
-        if not results:
-            return MCPContextResponse(
-                context="",
-                sources=[]
-            )
-        
-        # Format sources
-        sources = [
-            MCPContextSource(
-                title=doc["metadata"]["title"],
-                url=doc["metadata"]["url"],
-                content=doc["content"],
-                similarity=1.0 - doc["distance"],
-                last_modified=doc["metadata"]["last_modified"]
-            )
-            for doc in results
-        ]
-        
-        # Combine context
-        context = "\n\n".join(
-            f"{source.title}:\n{source.content}"
-            for source in sources
-        )[:request.max_context_length]
-        
-        return MCPContextResponse(
-            context=context,
-            sources=sources
-        )
-        
+    except ValueError as e:
+        # Malformed filters are the caller's mistake
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting context: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving context: {str(e)}"
         )
+
+@router.post("/context/batch", response_model=MCPBatchContextResponse)
+async def get_context_batch(
+    batch: MCPBatchContextRequest,
+    rag_service: RAGService = Depends(get_rag_service),
+    rerank_service: Optional[RerankService] = Depends(get_rerank_service),
+    packer: ContextPacker = Depends(get_context_packer)
+) -> MCPBatchContextResponse:
+    """Get relevant context for several queries with one encode and one vector search"""
+    try:
+        n_results = CONTEXT_TOP_K
+        if rerank_service is not None:
+            n_results = max(CONTEXT_TOP_K, rerank_service.settings.RERANK_CANDIDATES)
+
+        results = await rag_service.search_batch(
+            queries=[request.query for request in batch.requests],
+            n_results=n_results,
+            metadata_filters=[request.metadata_filter for request in batch.requests]
+        )
+
+        if rerank_service is not None:
+            with stage(SEARCH_STAGE, "search.rerank", stage="rerank"):
+                results = await asyncio.gather(*(
+                    rerank_service.rerank(request.query, request_results, top_k=CONTEXT_TOP_K)
+                    for request, request_results in zip(batch.requests, results)
+                ))
+
+        with stage(SEARCH_STAGE, "search.pack", stage="pack"):
+            return MCPBatchContextResponse(responses=[
+                _build_response(request, request_results, packer)
+                for request, request_results in zip(batch.requests, results)
+            ])
+
+    except ValueError as e:
+        # Malformed filters are the caller's mistake
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting batch context: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving context: {str(e)}"
+        )
+
+def _build_response(
+    request: MCPContextRequest,
+    results: List[Dict[str, Any]],
+    packer: ContextPacker
+) -> MCPContextResponse:
+    """Pack search results into a context response within the request's token budget"""
+    if not results:
+        return MCPContextResponse(
+            context="",
+            sources=[]
+        )
+
+    max_tokens = request.max_context_tokens
+    if max_tokens is None:
+        # Roughly four characters per token
+        max_tokens = max(1, (request.max_context_length or 1000) // 4)
+
+    segments = packer.pack(results, max_tokens)
+
+    # Only segments that fit the budget are returned as sources
+    sources = [
+        MCPContextSource(
+            title=segment.title,
+            url=segment.metadata.get("url", ""),
+            content=segment.content,
+            similarity=segment.similarity,
+            last_modified=segment.metadata.get("last_modified", ""),
+            duplicates=segment.duplicates
+        )
+        for segment in segments
+    ]
+
+    context = SOURCE_SEPARATOR.join(segment.render() for segment in segments)
+
+    return MCPContextResponse(
+        context=context,
+        sources=sources
+    )
@@ -0,0 +1,295 @@
+"""Asynchronous JSON-RPC transport for the MCP server over stdin/stdout"""
+from typing import Dict, Any, Optional, Callable, Awaitable, Set
+import asyncio
+import inspect
+import json
+import sys
+
+from fastapi import HTTPException
+from loguru import logger
+from pydantic import ValidationError
+
+from app.api.mcp.models import MCPContextRequest, MCPBatchContextRequest
+from app.api.mcp.router import get_context, get_context_batch
+from app.core.config import Settings
+from app.core.metrics import registry
+from app.core.tracing import span
+from app.services.jobs import JobConflict
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SERVER_ERROR = -32000
+
+SERVER_NAME = "confluence-rag-mcp"
+SERVER_VERSION = "1.0.0"
+DEFAULT_PROTOCOL_VERSION = "2024-11-05"
+
+# Methods answered without waiting for the models and index to load
+HANDSHAKE_METHODS = ("initialize", "ping", "health")
+
+STDIO_REQUESTS = registry.counter("stdio_requests_total", "Stdio requests by method and outcome")
+STDIO_IN_FLIGHT = registry.gauge("stdio_requests_in_flight", "Stdio requests currently being handled")
+
+
+class RPCError(Exception):
+    """Error reported to the client as a JSON-RPC error object"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class _ThreadLineReader:
+    """Line reader for a stdin that asyncio cannot watch, such as a regular file"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def readline(self) -> bytes:
+        return await asyncio.to_thread(self._stream.readline)
+
+
+async def _stdin_reader():
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 24)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+    except (ValueError, OSError, NotImplementedError):
+        return _ThreadLineReader(sys.stdin.buffer)
+    return reader
+
+
+def _write_stdout(line: str) -> None:
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+class StdioServer:
+    """Reads newline-delimited JSON-RPC requests and answers them concurrently.
+
+    Each request runs as its own task, with at most ``max_concurrency`` in
+    flight; the reader stops pulling lines while all slots are busy. Responses
+    are written as soon as they are ready and carry the request id, so a slow
+    request never holds back the ones behind it. Requests in the older
+    ``{"type": "request", "content": ...}`` format are still understood and
+    answered in the same format.
+
+    ``services`` may also be an awaitable that resolves to the services, so
+    the server can start reading before the models have loaded. The
+    handshake methods answer at once; everything else waits until the
+    services are ready.
+    """
+
+    def __init__(
+        self,
+        services,
+        max_concurrency: Optional[int] = None,
+        reader=None,
+        write: Callable[[str], None] = _write_stdout,
+        settings: Optional[Settings] = None
+    ):
+        if inspect.isawaitable(services):
+            self._services = asyncio.ensure_future(services)
+        else:
+            settings = settings or services.settings
+            self._services = asyncio.get_event_loop().create_future()
+            self._services.set_result(services)
+        settings = settings or Settings()
+        self._read_only = settings.READ_ONLY
+        self._reader = reader
+        self._write = write
+        self._slots = asyncio.Semaphore(max_concurrency or settings.STDIO_MAX_CONCURRENCY)
+        self._tasks: Set[asyncio.Task] = set()
+        self._methods: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+            "initialize": self._initialize,
+            "ping": self._ping,
+            "context": self._context,
+            "context/batch": self._context_batch,
+            "crawl": self._crawl,
+            "crawl/status": self._crawl_status,
+            "crawl/cancel": self._crawl_cancel,
+            "health": self._health,
+        }
+
+    async def serve(self) -> None:
+        """Handle requests until stdin is closed, then wait for those still running"""
+        reader = self._reader or await _stdin_reader()
+        logger.info("Stdio MCP server ready")
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            await self._slots.acquire()
+            task = asyncio.create_task(self._handle(line))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        logger.info("Stdin closed, stdio MCP server stopped")
+
+    async def _handle(self, line: bytes) -> None:
+        STDIO_IN_FLIGHT.inc()
+        try:
+            response = await self._dispatch(line)
+            if response is not None:
+                self._write(json.dumps(response, default=str))
+        finally:
+            STDIO_IN_FLIGHT.dec()
+            self._slots.release()
+
+    async def _dispatch(self, line: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "Parse error")
+        if not isinstance(message, dict):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+
+        if message.get("type") == "request":
+            return await self._dispatch_legacy(message)
+
+        request_id = message.get("id")
+        method = message.get("method")
+        params = message.get("params") or {}
+        if not isinstance(method, str) or not isinstance(params, dict):
+            return _error(request_id, INVALID_REQUEST, "Invalid request")
+
+        try:
+            result = await self._call(method, params)
+        except RPCError as e:
+            return None if "id" not in message else _error(request_id, e.code, e.message)
+
+        # Requests without an id are notifications and get no response
+        if "id" not in message:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    async def _dispatch_legacy(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        request_id = message.get("id", "unknown")
+        content = message.get("content") or {}
+        try:
+            if "query" in content:
+                result = await self._call("context", {"messages": [], "query": content["query"]})
+            elif content.get("command") == "crawl":
+                result = await self._call("crawl", {})
+            else:
+                raise RPCError(INVALID_REQUEST, "Expected a query or a crawl command")
+        except RPCError as e:
+            return {"version": "1.0", "type": "error", "id": request_id, "error": e.message}
+        return {"version": "1.0", "type": "response", "id": request_id, "content": result}
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> Any:
+        handler = self._methods.get(method)
+        if handler is None:
+            STDIO_REQUESTS.inc(method="unknown", outcome="error")
+            raise RPCError(METHOD_NOT_FOUND, f"Method not found: {method}")
+        try:
+            with span(f"stdio {method}"):
+                if method not in HANDSHAKE_METHODS:
+                    await self._ready()
+                result = await handler(params)
+        except RPCError:
+            STDIO_REQUESTS.inc(method=method, outcome="error")
+            raise
+        except ValidationError as e:
+            STDIO_REQUESTS.inc(method=method, outcome="error")
+            raise RPCError(INVALID_PARAMS, str(e))
+        except HTTPException as e:
+            STDIO_REQUESTS.inc(method=method, outcome="error")
+            raise RPCError(INVALID_PARAMS if e.status_code == 400 else SERVER_ERROR, str(e.detail))
+        except Exception as e:
+            logger.error(f"Error handling stdio {method} request: {str(e)}")
+            STDIO_REQUESTS.inc(method=method, outcome="error")
+            raise RPCError(INTERNAL_ERROR, str(e))
+        STDIO_REQUESTS.inc(method=method, outcome="ok")
+        return result
+
+    @property
+    def ready(self) -> bool:
+        return self._services.done() and not self._services.cancelled() and self._services.exception() is None
+
+    @property
+    def services(self):
+        """The loaded services; only valid once ``ready``"""
+        return self._services.result()
+
+    async def _ready(self) -> None:
+        try:
+            # Shielded so a cancelled request cannot cancel loading for everyone
+            await asyncio.shield(self._services)
+        except Exception as e:
+            raise RPCError(SERVER_ERROR, f"Services failed to start: {str(e)}")
+
+    # Methods
+
+    async def _initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "protocolVersion": params.get("protocolVersion", DEFAULT_PROTOCOL_VERSION),
+            "serverInfo": {"name": SERVER_NAME, "version": SERVER_VERSION},
+            "capabilities": {},
+            "methods": sorted(self._methods),
+            "ready": self.ready,
+        }
+
+    async def _ping(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {}
+
+    async def _context(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = await get_context(
+            MCPContextRequest(**params),
+            rag_service=self.services.rag,
+            rerank_service=self.services.rerank,
+            packer=self.services.packer
+        )
+        return response.model_dump()
+
+    async def _context_batch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        response = await get_context_batch(
+            MCPBatchContextRequest(**params),
+            rag_service=self.services.rag,
+            rerank_service=self.services.rerank,
+            packer=self.services.packer
+        )
+        return response.model_dump()
+
+    async def _crawl(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            job, merged = self._jobs().submit(reason="manual")
+        except JobConflict as e:
+            raise RPCError(SERVER_ERROR, str(e))
+        return {"job": job.to_dict(), "merged": merged}
+
+    async def _crawl_status(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if "job_id" not in params:
+            return {"jobs": [job.to_dict() for job in self._jobs().jobs()]}
+        return self._job(self._jobs().get(params["job_id"]), params["job_id"])
+
+    async def _crawl_cancel(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = params.get("job_id")
+        if not job_id:
+            raise RPCError(INVALID_PARAMS, "job_id is required")
+        return self._job(self._jobs().cancel(job_id), job_id)
+
+    def _jobs(self):
+        if self._read_only:
+            raise RPCError(SERVER_ERROR, "This process serves a read-only index; crawls run in the writer process")
+        return self.services.jobs
+
+    def _job(self, job, job_id: str) -> Dict[str, Any]:
+        if job is None:
+            raise RPCError(INVALID_PARAMS, f"Unknown crawl job {job_id}")
+        return job.to_dict()
+
+    async def _health(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"status": "healthy", "ready": self.ready}
+
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
@@ -15,6 +15,23 @@ class Settings(BaseSettings):
     # ChromaDB settings
     CHROMA_PERSIST_DIR: str = Field("./data/chroma", description="Directory for ChromaDB persistence")
     CHROMA_COLLECTION_NAME: str = Field("confluence_docs", description="Name of the ChromaDB collection")
+
+    # Vector store settings
+    VECTOR_BACKEND: str = Field("chroma", description="Vector store backend: chroma or mmap")
+    MMAP_INDEX_DIR: str = Field("./data/mmap_index", description="Directory for the memory-mapped vector index")
+    MMAP_HNSW: bool = Field(False, description="Add an HNSW graph over the mmap index (requires hnswlib)")
+    # HNSW settings; space, M and ef_construction only apply to newly created
+    # indexes (run a compaction to rebuild), ef_search also to existing ones
+    HNSW_SPACE: str = Field("l2", description="Distance for new ChromaDB collections: l2, cosine or ip")
+    HNSW_M: int = Field(16, description="Neighbours per HNSW graph node")
+    HNSW_EF_CONSTRUCTION: int = Field(100, description="Candidate list size while building the HNSW graph")
+    HNSW_EF_SEARCH: int = Field(100, description="Candidate list size while searching the HNSW graph")
+    SHARD_BY_SPACE: bool = Field(False, description="Keep each Confluence space in its own collection or index directory")
+    INDEX_SWAP_GRACE_SECONDS: float = Field(5.0, description="Delay before dropping a replaced index so in-flight queries finish")
+    WRITE_BATCH_SIZE: int = Field(0, description="Rows per vector store write; 0 uses the backend maximum")
+    WRITE_MAX_IN_FLIGHT: int = Field(2, description="Batches written concurrently while embedding continues")
+    WRITE_MAX_RETRIES: int = Field(3, description="Attempts per failed batch before the write is abandoned")
+    SNAPSHOT_PATH: Optional[str] = Field(None, description="Snapshot directory imported at startup when the index is empty")
     
     # RAG settings
     EMBEDDING_MODEL: str = Field("sentence-transformers/all-MiniLM-L6-v2", description="Model for embeddings")
@@ -22,11 +39,61 @@ class Settings(BaseSettings):
     CHUNK_OVERLAP: int = Field(50, description="Overlap between chunks")
     TOP_K: int = Field(3, description="Number of results to return")
     SIMILARITY_THRESHOLD: float = Field(0.7, description="Threshold for similarity matches")
-    
+
+    # Hybrid search settings
+    HYBRID_SEARCH: bool = Field(True, description="Combine BM25 lexical and vector results")
+    LEXICAL_INDEX_FILE: str = Field("lexical_index.json", description="BM25 index file inside CHROMA_PERSIST_DIR")
+    RRF_K: int = Field(60, description="Rank constant for reciprocal-rank fusion")
+
+    # Metadata filter settings
+    METADATA_INDEX_FILE: str = Field("metadata_index.json", description="Metadata index file inside CHROMA_PERSIST_DIR")
+    EXACT_SEARCH_MAX_CANDIDATES: int = Field(2000, description="Filters matching at most this many chunks use exact search")
+
+    # Near-duplicate settings
+    DEDUP_ENABLED: bool = Field(True, description="Reuse the vector of near-duplicate chunks instead of embedding them")
+    DEDUP_THRESHOLD: float = Field(0.9, description="Estimated Jaccard similarity of word shingles above which chunks are duplicates")
+    DEDUP_NUM_PERM: int = Field(128, description="MinHash permutations per chunk signature")
+    DEDUP_SHINGLE_SIZE: int = Field(3, description="Words per shingle")
+    DEDUP_INDEX_FILE: str = Field("dedup_index.pkl", description="Near-duplicate index file inside CHROMA_PERSIST_DIR")
+    DEDUP_SEARCH_FACTOR: int = Field(3, description="Over-fetch factor so collapsing duplicates still fills the requested results")
+
+    # Hierarchical search settings
+    HIERARCHICAL_SEARCH: bool = Field(False, description="Find the closest pages first, then rank only their chunks")
+    HIERARCHICAL_TOP_PAGES: int = Field(50, description="Pages whose chunks are ranked per query")
+    PAGE_TITLE_WEIGHT: float = Field(0.3, description="Weight of the title embedding in a page vector, against its pooled chunks")
+    PAGE_INDEX_FILE: str = Field("page_index.pkl", description="Page vector index file inside CHROMA_PERSIST_DIR")
+
+    # Rerank settings
+    RERANK_ENABLED: bool = Field(False, description="Rerank vector candidates with a cross-encoder")
+    RERANK_MODEL: str = Field("cross-encoder/ms-marco-MiniLM-L-6-v2", description="Cross-encoder model for reranking")
+    RERANK_CANDIDATES: int = Field(20, description="Number of vector candidates to over-fetch for reranking")
+    RERANK_BATCH_SIZE: int = Field(16, description="Number of candidate pairs scored per model call")
+    RERANK_TIMEOUT_MS: int = Field(150, description="Per-request rerank budget before falling back to vector order")
+    RERANK_CACHE_SIZE: int = Field(10000, description="Maximum cached (query, chunk) scores")
+
+    # Context assembly settings
+    CONTEXT_MMR_LAMBDA: float = Field(0.7, description="Relevance/diversity trade-off when ordering context segments")
+    CONTEXT_DEDUP_THRESHOLD: float = Field(0.8, description="Term overlap above which a segment is dropped as a near-duplicate")
+    CONTEXT_MIN_SEGMENT_TOKENS: int = Field(32, description="Smallest truncated segment worth adding to the context")
+
+    # Stdio server settings
+    STDIO_MAX_CONCURRENCY: int = Field(8, description="Requests handled concurrently by the stdio server")
+    STDIO_INITIAL_CRAWL: bool = Field(False, description="Crawl an empty index when started as a stdio MCP server")
+
+    # Multi-worker serving settings
+    READ_ONLY: bool = Field(False, description="Serve queries without crawling or writing the index; another process is the writer")
+    INDEX_RELOAD_SECONDS: float = Field(5.0, description="How often read-only processes check for a newly published index generation")
+    WRITER_HOST: str = Field("127.0.0.1", description="Host the writer process serves crawl and maintenance requests on with --workers")
+    WRITER_PORT: int = Field(8001, description="Port the writer process serves crawl and maintenance requests on with --workers")
+
+    # Observability settings
+    TRACING_ENABLED: bool = Field(False, description="Emit OpenTelemetry-style spans for requests and pipeline stages")
+
     # Crawling settings
     MAX_PAGES: int = Field(1000, description="Maximum number of pages to crawl")
     INCLUDE_ATTACHMENTS: bool = Field(True, description="Include attachments in crawl")
     INCLUDE_COMMENTS: bool = Field(True, description="Include comments in crawl")
     MAX_DEPTH: int = Field(5, description="Maximum depth to crawl")
     UPDATE_FREQUENCY: str = Field("24h", description="Frequency of updates")
-    INITIAL_CRAWL: bool = Field(True, description="Whether to crawl on startup")
+    INITIAL_CRAWL: bool = Field(True, description="Whether the HTTP server crawls on startup when the index is empty")
+    CRAWL_JOB_HISTORY: int = Field(20, description="Finished crawl jobs kept for status queries")
@@ -0,0 +1,124 @@
+"""Optional OpenTelemetry-style request tracing.
+
+Spans are off unless ``TRACING_ENABLED`` is set. While tracing is
+disabled, ``span`` hands back a shared no-op object and costs one
+attribute check. When enabled, spans go to OpenTelemetry if it is installed (configure its
+exporter the usual way, e.g. with ``OTEL_*`` environment variables) and are
+otherwise logged with their trace and parent IDs and duration.
+"""
+from typing import Any, Dict, Optional
+import contextvars
+import secrets
+import time
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core.metrics import Histogram
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # tracing falls back to log output
+    otel_trace = None
+
+_enabled = False
+_tracer = None
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+def configure(settings: Settings) -> None:
+    """Turn spans on or off for the process"""
+    global _enabled, _tracer
+    _enabled = settings.TRACING_ENABLED
+    _tracer = otel_trace.get_tracer("confluence-mcp") if _enabled and otel_trace is not None else None
+    if _enabled:
+        logger.info(f"Tracing enabled ({'OpenTelemetry' if _tracer is not None else 'log output'})")
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """A timed operation within a trace, nested under the span active when it starts"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.span_id = secrets.token_hex(8)
+        self.parent: Optional[Span] = None
+        self.trace_id = ""
+        self.duration = 0.0
+        self._start = 0.0
+        self._token = None
+        self._otel = None
+
+    def __enter__(self) -> "Span":
+        self.parent = _current.get()
+        self.trace_id = self.parent.trace_id if self.parent is not None else secrets.token_hex(16)
+        self._token = _current.set(self)
+        if _tracer is not None:
+            self._otel = _tracer.start_as_current_span(self.name, attributes=self.attributes)
+            self._otel.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.duration = time.perf_counter() - self._start
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        if self._otel is not None:
+            self._otel.__exit__(exc_type, exc, tb)
+        else:
+            logger.info(
+                f"span {self.name} {self.duration * 1000:.2f}ms trace={self.trace_id} span={self.span_id} "
+                f"parent={self.parent.span_id if self.parent else '-'} {self.attributes}"
+            )
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        if self._otel is not None:
+            otel_trace.get_current_span().set_attribute(key, value)
+
+
+def span(name: str, **attributes: Any):
+    """Context manager for a span, or a shared no-op when tracing is off"""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attributes)
+
+
+class stage:
+    """Time a pipeline stage into a histogram and, when tracing is on, a span of the same name"""
+
+    __slots__ = ("histogram", "name", "labels", "_span", "_start")
+
+    def __init__(self, histogram: Histogram, name: str, **labels: str):
+        self.histogram = histogram
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "stage":
+        self._span = span(self.name) if _enabled else _NOOP
+        self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.histogram.observe(time.perf_counter() - self._start, **self.labels)
+        self._span.__exit__(exc_type, exc, tb)
@@ -1,16 +1,26 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 import uvicorn
 import sys
-import json
-from typing import Dict, Any
+import os
+import argparse
+import asyncio
+import subprocess
+import time
+from dataclasses import asdict
+from typing import Optional
 
 from app.core.config import Settings
-from app.services.confluence import ConfluenceService
-from app.services.chromadb import ChromaDBService
-from app.services.rag import RAGService
+from app.core.metrics import registry
+from app.core.tracing import span
+from app.services.container import Services, create_services, INDEX_CHUNKS
+from app.services.jobs import JobConflict
+from app.services.reloader import IndexReloader
+from app.services.snapshot import export_snapshot, import_snapshot
+from app.services.vector_store import create_vector_store
 from app.api.mcp.router import router as mcp_router
+from app.api.mcp.stdio import StdioServer
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -39,84 +49,309 @@ logger.add("logs/app.log", rotation="100 MB")
 # Include MCP router
 app.include_router(mcp_router, prefix="/mcp", tags=["MCP"])
 
+HTTP_LATENCY = registry.histogram("http_request_seconds", "HTTP request latency by method, route and status")
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Record request latency per route and wrap each request in a span"""
+    start = time.perf_counter()
+    status = "500"
+    HTTP_IN_FLIGHT.inc()
+    try:
+        with span(f"{request.method} {request.url.path}") as request_span:
+            response = await call_next(request)
+            status = str(response.status_code)
+            request_span.set_attribute("http.status_code", response.status_code)
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        HTTP_LATENCY.observe(
+            time.perf_counter() - start, method=request.method, route=_route_label(request), status=status
+        )
+
+def _route_label(request: Request) -> str:
+    """The request path with path parameters put back as {name}, so each job ID is not its own series"""
+    if "route" not in request.scope:
+        return "unmatched"
+    params = {str(value): f"{{{name}}}" for name, value in request.path_params.items()}
+    return "/".join(params.get(segment, segment) for segment in request.url.path.split("/"))
+
 @app.on_event("startup")
-async def startup_event():
-    """Initialize services and data on startup"""
+async def startup_event(initial_crawl: Optional[bool] = None):
+    """Start loading the models and opening the index in the background.
+
+    The process answers health checks and the stdio handshake straight
+    away; /ready and other requests wait until the services are loaded.
+    ``initial_crawl`` overrides INITIAL_CRAWL, e.g. for stdio sessions.
+    """
+    if getattr(app.state, "services_task", None) is None:
+        if initial_crawl is None:
+            initial_crawl = settings.INITIAL_CRAWL
+        app.state.services_task = asyncio.create_task(_start_services(initial_crawl))
+
+async def _start_services(initial_crawl: bool) -> Services:
     try:
-        # Initialize services
-        confluence_service = ConfluenceService(settings)
-        chromadb_service = ChromaDBService(settings)
-        rag_service = RAGService(chromadb_service)
-        
-        # Store services in app state
-        app.state.confluence = confluence_service
-        app.state.chromadb = chromadb_service
-        app.state.rag = rag_service
-        
-        # Initial crawl if configured
-        if settings.INITIAL_CRAWL:
-            logger.info("Starting initial Confluence crawl...")
-            documents = await confluence_service.crawl()
-            await rag_service.ingest_documents(documents)
-            logger.info(f"Initial crawl complete. Ingested {len(documents)} documents.")
-            
+        # Services may have been installed already, e.g. by a benchmark
+        services = getattr(app.state, "services", None) or await create_services(settings)
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
         raise
+    install_services(services)
+
+    if settings.READ_ONLY:
+        # The writer process crawls; this one follows the generations it publishes
+        reloader = IndexReloader(services.rag, settings, on_reload=lambda: _index_reloaded(services))
+        app.state.reloader_task = asyncio.create_task(reloader.run())
+    elif initial_crawl:
+        # Only an empty index is filled at startup; refreshes go through explicit crawls
+        if await services.vector_store.count():
+            logger.info("Existing index found, skipping initial crawl")
+        else:
+            services.jobs.start_crawl(reason="initial")
+    return services
+
+def _index_reloaded(services: Services) -> None:
+    services.vector_store = services.rag.vector_store
+    install_services(services)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Cancel background loading and crawls so the process can exit"""
+    for name in ("services_task", "reloader_task"):
+        task = getattr(app.state, name, None)
+        if task is not None and not task.done():
+            task.cancel()
+    services = getattr(app.state, "services", None)
+    if services is not None:
+        await services.jobs.shutdown()
+
+def _services() -> Services:
+    services = getattr(app.state, "services", None)
+    if services is None:
+        raise HTTPException(status_code=503, detail="Services are still starting")
+    return services
 
-@app.post("/crawl")
+def _writer_services() -> Services:
+    """Services of a process that may crawl and rewrite the index"""
+    services = _services()
+    if settings.READ_ONLY:
+        raise HTTPException(
+            status_code=409,
+            detail=f"This process serves a read-only index; send crawl and maintenance requests to the writer "
+                   f"at {settings.WRITER_HOST}:{settings.WRITER_PORT}"
+        )
+    return services
+
+def install_services(services: Services) -> None:
+    """Expose shared service instances to the HTTP handlers"""
+    app.state.services = services
+    app.state.confluence = services.confluence
+    app.state.vector_store = services.vector_store
+    app.state.rag = services.rag
+    app.state.rerank = services.rerank
+    app.state.maintenance = services.maintenance
+
+@app.post("/crawl", status_code=202)
 async def crawl():
-    """Manually trigger Confluence crawl"""
+    """Start a Confluence crawl in the background and return its job; a running crawl is reused"""
     try:
-        documents = await app.state.confluence.crawl()
-        await app.state.rag.ingest_documents(documents)
-        return {"message": f"Successfully crawled and ingested {len(documents)} documents"}
+        job, merged = _writer_services().jobs.submit(reason="manual")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"job": job.to_dict(), "merged": merged}
+
+@app.get("/crawl/jobs")
+async def list_crawl_jobs():
+    """Running and recently finished crawl jobs, newest first"""
+    return {"jobs": [job.to_dict() for job in _writer_services().jobs.jobs()]}
+
+@app.get("/crawl/jobs/{job_id}")
+async def get_crawl_job(job_id: str):
+    """Status, per-stage progress and timings of a crawl job"""
+    job = _writer_services().jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown crawl job {job_id}")
+    return job.to_dict()
+
+@app.delete("/crawl/jobs/{job_id}")
+async def cancel_crawl_job(job_id: str):
+    """Cancel a running crawl job"""
+    job = _writer_services().jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown crawl job {job_id}")
+    return job.to_dict()
+
+@app.post("/maintenance/gc")
+async def maintenance_gc(dry_run: bool = False):
+    """Remove chunks of pages that no longer exist in Confluence"""
+    _check_maintenance_idle()
+    try:
+        live_page_ids = await app.state.confluence.list_page_ids()
+        # A crawl may have started while the page list was fetched
+        _check_maintenance_idle()
+        spaces = [settings.CONFLUENCE_SPACE_KEY] if settings.CONFLUENCE_SPACE_KEY else None
+        report = await app.state.maintenance.collect_garbage(live_page_ids, spaces=spaces, dry_run=dry_run)
+        return asdict(report)
     except Exception as e:
-        logger.error(f"Error during crawl: {str(e)}")
+        logger.error(f"Error during garbage collection: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/maintenance/compact")
+async def maintenance_compact():
+    """Rewrite the index without deleted rows and swap it in"""
+    _check_maintenance_idle()
+    try:
+        report = await app.state.maintenance.compact()
+        app.state.vector_store = app.state.rag.vector_store
+        return asdict(report)
+    except Exception as e:
+        logger.error(f"Error during compaction: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/maintenance/rebuild", status_code=202)
+async def maintenance_rebuild():
+    """Re-crawl Confluence into a shadow index in the background and swap it in when complete"""
+    _check_maintenance_idle()
+    try:
+        job = _writer_services().jobs.start_rebuild(reason="manual")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"job": job.to_dict()}
+
+def _check_maintenance_idle() -> None:
+    services = _writer_services()
+    if services.maintenance.running:
+        raise HTTPException(status_code=409, detail="Another maintenance operation is running")
+    if services.jobs.running:
+        raise HTTPException(status_code=409, detail=f"A {services.jobs.current.kind} job is running; try again when it finishes")
+
 @app.get("/health")
 async def health():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Metrics in the Prometheus text format"""
+    services = getattr(app.state, "services", None)
+    if services is not None:
+        INDEX_CHUNKS.set(await services.rag.vector_store.count())
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: services loaded and either the index has chunks or no crawl is still filling it"""
+    services = getattr(app.state, "services", None)
+    if services is None:
+        response.status_code = 503
+        task = getattr(app.state, "services_task", None)
+        if task is not None and task.done() and not task.cancelled() and task.exception() is not None:
+            return {"ready": False, "reason": f"Services failed to start: {str(task.exception())}"}
+        return {"ready": False, "reason": "Services are still loading"}
+
+    chunks = await services.rag.vector_store.count()
+    job = services.jobs.current
+    crawling = job is not None and job.active
+    is_ready = chunks > 0 or not crawling
+    if not is_ready:
+        response.status_code = 503
+    return {
+        "ready": is_ready,
+        "index_chunks": chunks,
+        "index_generation": services.rag.manifest.generation if services.rag.manifest else 0,
+        "crawl": job.to_dict() if job else None,
+    }
+
 def main():
-    """Main entry point for stdio-based MCP server"""
-    for line in sys.stdin:
+    """Main entry point: stdio MCP server, optionally also serving HTTP"""
+    parser = argparse.ArgumentParser(description="Confluence RAG MCP server")
+    parser.add_argument("--web", action="store_true", help="Run only the HTTP server")
+    parser.add_argument(
+        "--workers", type=int,
+        help="With --web, serve HTTP from this many read-only worker processes and crawl in a separate writer process"
+    )
+    parser.add_argument("--http-port", type=int, help="Also serve HTTP on this port, sharing the stdio server's services")
+    commands = parser.add_subparsers(dest="command")
+    export = commands.add_parser("export-snapshot", help="Write the index to a portable snapshot directory")
+    export.add_argument("path", help="New or empty directory for the snapshot")
+    restore = commands.add_parser("import-snapshot", help="Replace the index with a snapshot, without crawling")
+    restore.add_argument("path", help="Directory written by export-snapshot")
+    args = parser.parse_args()
+
+    if args.command is not None:
+        asyncio.run(run_snapshot_command(args.command, args.path))
+    elif args.web and args.workers:
+        serve_workers(args.workers)
+    elif args.web:
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8000)
+    else:
+        asyncio.run(serve_stdio(args.http_port))
+
+def serve_workers(workers: int) -> None:
+    """Serve HTTP from read-only worker processes beside one writer process that crawls and ingests.
+
+    Workers map the same mmap index files, so the OS page cache holds one
+    copy of the vectors and texts for all of them. Each worker still loads
+    its own embedding model for query encoding: with the default
+    all-MiniLM-L6-v2 that is about 0.9 GB resident per worker, almost all
+    of it torch itself rather than the 90 MB of weights, so budget memory
+    for ``workers + 1`` model processes. The writer is the usual single
+    process app on WRITER_PORT; workers pick up the generations it
+    publishes without restarting.
+    """
+    if settings.VECTOR_BACKEND != "mmap":
+        raise SystemExit("--workers needs VECTOR_BACKEND=mmap, whose index files workers can share read-only")
+
+    # The writer keeps a replaced index until every worker has had time to
+    # poll for the generation that replaced it
+    grace = max(settings.INDEX_SWAP_GRACE_SECONDS, 2 * settings.INDEX_RELOAD_SECONDS)
+    writer = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", settings.WRITER_HOST, "--port", str(settings.WRITER_PORT)],
+        env={**os.environ, "READ_ONLY": "false", "INDEX_SWAP_GRACE_SECONDS": str(grace)}
+    )
+    # Workers inherit the environment: read-only, and a share of the cores
+    # each for torch instead of every worker using all of them
+    os.environ["READ_ONLY"] = "true"
+    os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+    try:
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8000, workers=workers)
+    finally:
+        writer.terminate()
+        writer.wait()
+
+async def run_snapshot_command(command: str, path: str) -> None:
+    """Export or import a snapshot of the index; the server should not be running against it"""
+    vector_store = create_vector_store(settings)
+    if command == "export-snapshot":
+        snapshot = await export_snapshot(vector_store, settings, path)
+    else:
+        snapshot = await import_snapshot(vector_store, settings, path)
+    print(f"{command}: {snapshot.rows} chunks, {snapshot.embedding_model} "
+          f"({snapshot.dimension} dims), generation {snapshot.generation}")
+
+async def serve_stdio(http_port: Optional[int] = None) -> None:
+    """Serve JSON-RPC on stdin/stdout until stdin closes"""
+    # Logs go to stderr, so stdout carries protocol messages only. Every MCP
+    # session starts its own process, so sessions do not crawl unless asked to
+    await startup_event(initial_crawl=settings.STDIO_INITIAL_CRAWL)
+    server = StdioServer(app.state.services_task, settings=settings)
+
+    if http_port is None:
         try:
-            request = json.loads(line)
-            response = None
-            
-            if request["type"] == "request":
-                if "query" in request["content"]:
-                    response = app.state.rag.process_query(request["content"]["query"])
-                elif request["content"].get("command") == "crawl":
-                    response = app.state.confluence.crawl()
-            
-            if response:
-                print(json.dumps({
-                    "version": "1.0",
-                    "type": "response",
-                    "id": request["id"],
-                    "content": response
-                }))
-                sys.stdout.flush()
-            
-        except Exception as e:
-            logger.error(f"Error processing request: {str(e)}")
-            error_response = {
-                "version": "1.0",
-                "type": "error",
-                "id": request.get("id", "unknown"),
-                "error": str(e)
-            }
-            print(json.dumps(error_response))
-            sys.stdout.flush()
+            await server.serve()
+        finally:
+            await shutdown_event()
+        return
+
+    http = uvicorn.Server(uvicorn.Config(app, host="0.0.0.0", port=http_port, access_log=False))
+    http_task = asyncio.create_task(http.serve())
+    try:
+        await server.serve()
+    finally:
+        http.should_exit = True
+        await http_task
 
 if __name__ == "__main__":
-    # If no arguments, run as stdio MCP server
-    if len(sys.argv) == 1:
-        main()
-    # If --web argument, run as web server
-    elif sys.argv[1] == "--web":
-        uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    main()
@@ -2,57 +2,136 @@ import chromadb
 from chromadb.config import Settings as ChromaSettings
 from chromadb.utils import embedding_functions
 from loguru import logger
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set, Callable
+import asyncio
 import os
 
 from app.core.config import Settings
+from app.services.metadata_index import normalize_metadata
+from app.services.vector_store import VectorStore
 
-class ChromaDBService:
-    """Service for managing document vectors using ChromaDB"""
-    
-    def __init__(self, settings: Settings):
+def hnsw_configuration(settings: Settings) -> Dict[str, Any]:
+    """ChromaDB collection configuration for the HNSW settings"""
+    return {
+        "hnsw": {
+            "space": settings.HNSW_SPACE,
+            "max_neighbors": settings.HNSW_M,
+            "ef_construction": settings.HNSW_EF_CONSTRUCTION,
+            "ef_search": settings.HNSW_EF_SEARCH,
+        }
+    }
+
+class ChromaDBService(VectorStore):
+    """Vector store backed by a ChromaDB collection"""
+
+    def __init__(
+        self,
+        settings: Settings,
+        embedder: Optional[Callable[[List[str]], Any]] = None,
+        collection_name: Optional[str] = None
+    ):
         self.settings = settings
-        
+        self.collection_name = collection_name or settings.CHROMA_COLLECTION_NAME
+
         # Create persist directory if it doesn't exist
         os.makedirs(settings.CHROMA_PERSIST_DIR, exist_ok=True)
-        
-        # Initialize ChromaDB client
-        self.client = chromadb.Client(ChromaSettings(
-            persist_directory=settings.CHROMA_PERSIST_DIR,
-            anonymized_telemetry=False
-        ))
-        
-        # Initialize sentence transformer embedding function
-        self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=settings.EMBEDDING_MODEL
+
+        # Initialize a persistent ChromaDB client; writes go to its SQLite
+        # write-ahead log, so the index survives restarts and crashes
+        self.client = chromadb.PersistentClient(
+            path=settings.CHROMA_PERSIST_DIR,
+            settings=ChromaSettings(anonymized_telemetry=False)
         )
-        
+
+        # Embeddings are computed by the caller; the embedder is only needed for
+        # the text query helpers and is created on first use when not supplied.
+        self._embedder = embedder
+
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
-            name=settings.CHROMA_COLLECTION_NAME,
-            embedding_function=self.embedding_function
+            name=self.collection_name,
+            configuration=hnsw_configuration(settings)
         )
-        
-    async def add_documents(self, documents: List[Dict[Any, Any]]) -> None:
-        """Add documents to the vector store"""
+        self._apply_search_ef()
+
+    def distance_space(self) -> str:
+        """The space the collection was created with, which may predate HNSW_SPACE"""
+        current = getattr(self.collection, "configuration", None)
+        if isinstance(current, dict) and isinstance(current.get("hnsw"), dict) and current["hnsw"].get("space"):
+            return current["hnsw"]["space"]
+        return self.settings.HNSW_SPACE
+
+    def _apply_search_ef(self) -> None:
+        """Bring an existing collection's ef_search in line with the settings"""
+        current = getattr(self.collection, "configuration", None)
+        if not isinstance(current, dict) or not isinstance(current.get("hnsw"), dict):
+            return
+        hnsw = current["hnsw"]
+        wanted = hnsw_configuration(self.settings)["hnsw"]
+        fixed = [key for key in ("space", "max_neighbors", "ef_construction") if hnsw.get(key) != wanted[key]]
+        if fixed:
+            logger.warning(
+                f"Collection {self.collection_name} was built with different HNSW {', '.join(fixed)}; "
+                "compact the index to rebuild it with the current settings"
+            )
+        if hnsw.get("ef_search") != wanted["ef_search"]:
+            self.collection.modify(configuration={"hnsw": {"ef_search": wanted["ef_search"]}})
+            logger.info(f"Set ef_search={wanted['ef_search']} on collection {self.collection_name}")
+
+    def _embed(self, texts: List[str]) -> Any:
+        """Embed texts with the configured sentence transformer"""
+        if self._embedder is None:
+            self._embedder = embedding_functions.SentenceTransformerEmbeddingFunction(
+                model_name=self.settings.EMBEDDING_MODEL
+            )
+        return self._embedder(texts)
+
+    async def add_documents(
+        self,
+        documents: List[Any],
+        ids: Optional[List[str]] = None,
+        embeddings: Any = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """Upsert chunks with precomputed embeddings, or page dicts when no ids are given"""
+        if ids is None:
+            await self.add_pages(documents)
+            return
+        try:
+            await asyncio.to_thread(
+                self.collection.upsert,
+                ids=ids,
+                documents=documents,
+                embeddings=[list(map(float, embedding)) for embedding in embeddings],
+                metadatas=metadatas
+            )
+            logger.info(f"Added {len(ids)} documents to ChromaDB")
+        except Exception as e:
+            logger.error(f"Error adding documents to ChromaDB: {str(e)}")
+            raise
+
+    async def add_pages(self, documents: List[Dict[Any, Any]]) -> None:
+        """Add whole Confluence page documents, embedding their content"""
         try:
             # Prepare documents for ChromaDB
             ids = [str(doc['id']) for doc in documents]
             texts = [doc['content'] for doc in documents]
-            metadatas = [{
+            metadatas = [normalize_metadata({
                 'title': doc['title'],
                 'space_key': doc['space_key'],
                 'url': doc['url'],
                 'author': doc['author'],
                 'last_modified': doc['last_modified'],
-                'labels': ','.join(doc.get('labels', [])),
+                'page_id': str(doc['id']),
                 'type': doc.get('type', 'page')
-            } for doc in documents]
-            
+            }, labels=doc.get('labels', [])) for doc in documents]
+
             # Add documents to collection
-            self.collection.add(
+            await asyncio.to_thread(
+                self.collection.add,
                 documents=texts,
                 ids=ids,
+                embeddings=self._embed(texts),
                 metadatas=metadatas
             )
             logger.info(f"Added {len(documents)} documents to ChromaDB")
@@ -65,100 +144,152 @@ class ChromaDBService:
         try:
             if top_k is None:
                 top_k = self.settings.TOP_K
-                
-            results = self.collection.query(
-                query_texts=[query_text],
-                n_results=top_k,
-                include=['documents', 'metadatas', 'distances']
-            )
-            
-            # Format results
-            documents = []
-            for i in range(len(results['ids'][0])):
-                doc = {
-                    'id': results['ids'][0][i],
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'similarity': 1 - results['distances'][0][i]  # Convert distance to similarity
-                }
-                documents.append(doc)
-            
+
+            documents = await self.search(self._embed([query_text])[0], n_results=top_k)
+            for doc in documents:
+                doc['similarity'] = 1 - doc.pop('distance')  # Convert distance to similarity
+
             # Filter by similarity threshold
             documents = [
-                doc for doc in documents 
+                doc for doc in documents
                 if doc['similarity'] >= self.settings.SIMILARITY_THRESHOLD
             ]
-            
+
             return documents
-            
+
         except Exception as e:
             logger.error(f"Error querying ChromaDB: {str(e)}")
             raise
-            
+
     async def query_documents(self, query: str, n_results: int = 5, metadata_filter: Dict = None) -> List[Dict]:
         """Query documents from the vector store"""
         try:
-            # Prepare query parameters
-            where = metadata_filter if metadata_filter else None
-            
-            results = await self.collection.query(
-                query_texts=[query],
+            return await self.search(
+                self._embed([query])[0],
                 n_results=n_results,
-                where=where,
-                include=['documents', 'metadatas', 'distances']
+                where=metadata_filter
             )
-            
-            # Format results
-            documents = []
-            for i in range(len(results['ids'][0])):
-                doc = {
-                    'id': results['ids'][0][i],
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i]
-                }
-                documents.append(doc)
-            
-            return documents
-            
+
         except Exception as e:
             logger.error(f"Error querying ChromaDB: {str(e)}")
             raise
 
+    async def search_batch(
+        self,
+        query_embeddings: List[Any],
+        n_results: int = 5,
+        where: Dict = None,
+        candidates: Optional[Set[str]] = None
+    ) -> List[List[Dict]]:
+        """Search for several query embeddings in a single ChromaDB query.
+
+        ChromaDB applies ``where`` through its own metadata index, so
+        ``candidates`` is not needed.
+        """
+        try:
+            if len(query_embeddings) == 0:
+                return []
+
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=[list(map(float, embedding)) for embedding in query_embeddings],
+                n_results=n_results,
+                where=where or None,
+                include=['documents', 'metadatas', 'distances']
+            )
+
+            # One result list per query, in query order
+            batches = []
+            for q in range(len(results['ids'])):
+                batches.append([
+                    {
+                        'id': results['ids'][q][i],
+                        'content': results['documents'][q][i],
+                        'metadata': results['metadatas'][q][i],
+                        'distance': results['distances'][q][i]
+                    }
+                    for i in range(len(results['ids'][q]))
+                ])
+            return batches
+
+        except Exception as e:
+            logger.error(f"Error searching ChromaDB: {str(e)}")
+            raise
+
     async def delete_documents(self, ids: List[str]) -> None:
         """Delete documents from the vector store"""
         try:
-            self.collection.delete(ids=ids)
+            await asyncio.to_thread(self.collection.delete, ids=ids)
             logger.info(f"Deleted {len(ids)} documents from ChromaDB")
         except Exception as e:
             logger.error(f"Error deleting documents from ChromaDB: {str(e)}")
             raise
 
-    async def get_document(self, doc_id: str) -> Dict:
-        """Get a specific document from the vector store"""
+    async def get_documents(
+        self,
+        ids: List[str],
+        where: Dict = None,
+        include_embeddings: bool = False
+    ) -> List[Dict]:
+        """Get several documents by ID, optionally restricted by a metadata filter"""
         try:
-            result = self.collection.get(ids=[doc_id])
-            if not result['ids']:
-                return None
-                
-            return {
-                'id': result['ids'][0],
-                'content': result['documents'][0],
-                'metadata': result['metadatas'][0]
-            }
+            if not ids:
+                return []
+
+            include = ['documents', 'metadatas']
+            if include_embeddings:
+                include.append('embeddings')
+
+            result = await asyncio.to_thread(
+                self.collection.get, ids=ids, where=where or None, include=include
+            )
+
+            documents = []
+            for i in range(len(result['ids'])):
+                doc = {
+                    'id': result['ids'][i],
+                    'content': result['documents'][i],
+                    'metadata': result['metadatas'][i]
+                }
+                if include_embeddings:
+                    doc['embedding'] = result['embeddings'][i]
+                documents.append(doc)
+            return documents
         except Exception as e:
-            logger.error(f"Error getting document from ChromaDB: {str(e)}")
+            logger.error(f"Error getting documents from ChromaDB: {str(e)}")
             raise
 
+    async def list_ids(self) -> List[str]:
+        """IDs of every chunk in the collection"""
+        result = await asyncio.to_thread(self.collection.get, include=[])
+        return result['ids']
+
+    def max_batch_size(self) -> int:
+        """Batch limit reported by the ChromaDB client"""
+        return self.client.get_max_batch_size()
+
+    async def count(self) -> int:
+        """Number of chunks in the collection"""
+        return await asyncio.to_thread(self.collection.count)
+
     async def clear(self) -> None:
         """Clear all documents from the collection"""
         try:
-            self.collection.delete()
+            await asyncio.to_thread(self.client.delete_collection, self.collection_name)
             self.collection = self.client.get_or_create_collection(
-                name=self.settings.CHROMA_COLLECTION_NAME,
-                embedding_function=self.embedding_function
+                name=self.collection_name,
+                configuration=hnsw_configuration(self.settings)
             )
             logger.info("Cleared ChromaDB collection")
         except Exception as e:
             logger.error(f"Error clearing ChromaDB collection: {str(e)}")
             raise
+
+    async def drop(self) -> None:
+        """Delete the collection without recreating it"""
+        try:
+            await asyncio.to_thread(self.client.delete_collection, self.collection_name)
+            logger.info(f"Dropped ChromaDB collection {self.collection_name}")
+        except Exception as e:
+            logger.error(f"Error dropping ChromaDB collection: {str(e)}")
+            raise
@@ -1,23 +1,48 @@
-from atlassian import Confluence
 from loguru import logger
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Set, Optional
 import asyncio
-from bs4 import BeautifulSoup
+from itertools import islice
 
 from app.core.config import Settings
+from app.core.metrics import registry
+from app.services.progress import CrawlProgress
+
+# Pages requested per call when listing page IDs
+PAGE_LIST_LIMIT = 500
+
+CONFLUENCE_REQUESTS = registry.counter("confluence_requests_total", "Confluence REST requests by HTTP status")
+CONFLUENCE_LATENCY = registry.histogram("confluence_request_seconds", "Confluence REST response time")
+
+def _record_response(response, *args, **kwargs) -> None:
+    CONFLUENCE_REQUESTS.inc(status=str(response.status_code))
+    CONFLUENCE_LATENCY.observe(response.elapsed.total_seconds())
+
+def _results(response: Any, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Items of a client response, which depending on the client version is a
+    list, a generator over every page of results or a raw ``{"results": [...]}`` body"""
+    if isinstance(response, dict):
+        response = response.get("results", [])
+    return list(islice(response, limit))
 
 class ConfluenceService:
     """Service for interacting with Confluence"""
     
     def __init__(self, settings: Settings):
+        from atlassian import Confluence
+
         self.settings = settings
         self.client = Confluence(
             url=settings.CONFLUENCE_BASE_URL,
             token=settings.CONFLUENCE_TOKEN
         )
+        self.client.session.hooks["response"].append(_record_response)
         
-    async def crawl(self) -> List[Dict[Any, Any]]:
+    async def crawl(self, progress: Optional[CrawlProgress] = None) -> List[Dict[Any, Any]]:
         """Crawl Confluence space and return processed documents"""
+        # The Confluence client is blocking; keep the event loop free for queries
+        return await asyncio.to_thread(self._crawl, progress)
+
+    def _crawl(self, progress: Optional[CrawlProgress] = None) -> List[Dict[Any, Any]]:
         try:
             space_key = self.settings.CONFLUENCE_SPACE_KEY
             pages = []
@@ -25,48 +50,83 @@ class ConfluenceService:
             if space_key:
                 pages.extend(self._get_space_content(space_key))
             else:
-                spaces = self.client.get_all_spaces()
+                spaces = _results(self.client.get_all_spaces())
                 for space in spaces:
                     pages.extend(self._get_space_content(space['key']))
             
-            return self._process_pages(pages)
+            return self._process_pages(pages, progress)
             
         except Exception as e:
             logger.error(f"Error crawling Confluence: {str(e)}")
             raise
             
+    async def list_page_ids(self) -> Set[str]:
+        """IDs of every page currently in the configured spaces, without fetching bodies"""
+        try:
+            return await asyncio.to_thread(self._list_page_ids)
+        except Exception as e:
+            logger.error(f"Error listing Confluence pages: {str(e)}")
+            raise
+
+    def _list_page_ids(self) -> Set[str]:
+        space_key = self.settings.CONFLUENCE_SPACE_KEY
+        space_keys = [space_key] if space_key else [space['key'] for space in _results(self.client.get_all_spaces())]
+
+        page_ids = set()
+        for key in space_keys:
+            start = 0
+            while True:
+                pages = _results(self.client.get_all_pages_from_space(key, start=start, limit=PAGE_LIST_LIMIT))
+                page_ids.update(str(page['id']) for page in pages)
+                if len(pages) < PAGE_LIST_LIMIT:
+                    break
+                start += len(pages)
+        return page_ids
+
     def _get_space_content(self, space_key: str) -> List[Dict[Any, Any]]:
         """Get all content from a Confluence space"""
         try:
-            pages = self.client.get_all_pages_from_space(space_key, start=0, limit=self.settings.MAX_PAGES)
+            pages = _results(
+                self.client.get_all_pages_from_space(space_key, start=0, limit=self.settings.MAX_PAGES),
+                limit=self.settings.MAX_PAGES
+            )
             
             if self.settings.INCLUDE_ATTACHMENTS:
                 for page in pages:
-                    attachments = self.client.get_attachments_from_content(page['id'])
-                    page['attachments'] = attachments
+                    page['attachments'] = _results(self.client.get_attachments_from_content(page['id']))
                     
             if self.settings.INCLUDE_COMMENTS:
                 for page in pages:
-                    comments = self.client.get_page_comments(page['id'])
-                    page['comments'] = comments
+                    page['comments'] = _results(self.client.get_page_comments(page['id'], expand='body.storage'))
                     
             return pages
         except Exception as e:
             logger.error(f"Error getting space content: {str(e)}")
             raise
     
-    def _process_pages(self, pages: List[Dict[Any, Any]]) -> List[Dict[Any, Any]]:
+    def _process_pages(
+        self,
+        pages: List[Dict[Any, Any]],
+        progress: Optional[CrawlProgress] = None
+    ) -> List[Dict[Any, Any]]:
         """Process Confluence pages into documents for vectorization"""
+        progress = progress or CrawlProgress()
+        progress.pages_total = len(pages)
         try:
             documents = []
             
             for page in pages:
+                progress.check_cancelled()
+
                 # Get page content
-                content = self.client.get_page_by_id(page['id'])
+                with progress.timed("fetch"):
+                    content = self.client.get_page_by_id(page['id'])
+                progress.pages_fetched += 1
                 
                 # Extract text from HTML content
                 html_content = content.get('body', {}).get('storage', {}).get('value', '')
-                clean_text = self._clean_html(html_content)
+                with progress.timed("clean"):
+                    clean_text = self._clean_html(html_content)
                 
                 # Create document
                 doc = {
@@ -100,6 +160,7 @@ class ConfluenceService:
                     } for att in page['attachments']]
                 
                 documents.append(doc)
+                progress.pages_cleaned += 1
                 
             return documents
             
@@ -114,6 +175,8 @@ class ConfluenceService:
                 return ""
                 
             # Parse HTML
+            from bs4 import BeautifulSoup
+
             soup = BeautifulSoup(html_content, 'html.parser')
             
             # Remove script and style elements
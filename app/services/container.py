@@ -0,0 +1,83 @@
+"""Service instances shared by the HTTP and stdio transports."""
+from typing import Any, Optional, Tuple
+from dataclasses import dataclass
+import asyncio
+import time
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core import tracing
+from app.core.metrics import registry
+from app.services.confluence import ConfluenceService
+from app.services.context import ContextPacker
+from app.services.jobs import JobManager
+from app.services.maintenance import IndexMaintenance
+from app.services.rag import RAGService
+from app.services.rerank import RerankService
+from app.services.snapshot import import_snapshot
+from app.services.vector_store import VectorStore, create_vector_store
+
+STARTUP_SECONDS = registry.gauge("startup_seconds", "Time from startup to serving the existing index with warm models")
+INDEX_CHUNKS = registry.gauge("index_chunks", "Number of chunks in the index")
+
+
+@dataclass
+class Services:
+    """Warm service instances created once per process"""
+    settings: Settings
+    confluence: ConfluenceService
+    vector_store: VectorStore
+    rag: RAGService
+    rerank: Optional[RerankService]
+    maintenance: IndexMaintenance
+    packer: ContextPacker
+    jobs: JobManager
+
+
+async def create_services(settings: Settings) -> Services:
+    """Load and warm up the models, open the persisted index and check it matches the embedding model"""
+    start = time.perf_counter()
+    tracing.configure(settings)
+
+    # Loading the models blocks for seconds; do it off the event loop so a
+    # transport started alongside keeps answering
+    model, rerank = await asyncio.to_thread(_load_models, settings)
+
+    vector_store = create_vector_store(settings)
+    if settings.SNAPSHOT_PATH and not settings.READ_ONLY and await vector_store.count() == 0:
+        # A fresh node serves from the snapshot without waiting for a crawl
+        await import_snapshot(vector_store, settings, settings.SNAPSHOT_PATH)
+    rag = RAGService(vector_store, settings, model=model)
+    confluence = ConfluenceService(settings)
+    maintenance = IndexMaintenance(rag, settings)
+    services = Services(
+        settings=settings,
+        confluence=confluence,
+        vector_store=vector_store,
+        rag=rag,
+        rerank=rerank,
+        maintenance=maintenance,
+        packer=ContextPacker(settings),
+        jobs=JobManager(confluence, rag, settings, maintenance),
+    )
+
+    indexed = await rag.open_index()
+    await rag.warm_up()
+    if rerank is not None:
+        await rerank.warm_up()
+    INDEX_CHUNKS.set(indexed)
+    STARTUP_SECONDS.set(time.perf_counter() - start)
+    logger.info(f"Serving index with {indexed} chunks after {STARTUP_SECONDS.value():.2f}s")
+    return services
+
+
+def _load_models(settings: Settings) -> Tuple[Any, Optional[RerankService]]:
+    from sentence_transformers import SentenceTransformer
+
+    if settings.VECTOR_BACKEND == "chroma":
+        # The first import takes about a second; pay it here rather than on the loop
+        import chromadb  # noqa: F401
+    model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    rerank = RerankService(settings) if settings.RERANK_ENABLED else None
+    return model, rerank
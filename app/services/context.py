@@ -0,0 +1,195 @@
+"""Token-budgeted context assembly from retrieved chunks."""
+from typing import List, Dict, Any, Optional, FrozenSet
+from dataclasses import dataclass, field
+import re
+
+from app.core.config import Settings
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional
+    _ENCODING = None
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+SOURCE_SEPARATOR = "\n\n"
+
+
+def count_tokens(text: str) -> int:
+    """Count LLM tokens, estimating BPE pieces when tiktoken is not installed"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    # Roughly one token per four characters of each word or punctuation mark
+    return sum((len(piece) + 3) // 4 for piece in _PIECE_RE.findall(text))
+
+
+@dataclass
+class ContextSegment:
+    """A contiguous span of one page assembled from one or more chunks"""
+    title: str
+    content: str
+    metadata: Dict[str, Any]
+    distance: float
+    relevance: float = 0.0
+    chunk_indices: List[int] = field(default_factory=list)
+    duplicates: List[str] = field(default_factory=list)
+    terms: FrozenSet[str] = frozenset()
+
+    @property
+    def similarity(self) -> float:
+        return 1.0 - self.distance
+
+    def render(self) -> str:
+        return f"{self.title}:\n{self.content}"
+
+
+class ContextPacker:
+    """Merges, deduplicates and packs retrieved chunks into a token budget"""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+
+    def pack(self, results: List[Dict[str, Any]], max_tokens: int) -> List[ContextSegment]:
+        """Return the segments that fit the budget, most useful first"""
+        segments = self._merge_adjacent(results)
+        packed: List[ContextSegment] = []
+        remaining = max_tokens
+
+        for segment in self._mmr_order(segments):
+            if packed:
+                remaining -= count_tokens(SOURCE_SEPARATOR)
+            cost = count_tokens(segment.render())
+            if cost <= remaining:
+                packed.append(segment)
+                remaining -= cost
+                continue
+
+            # Fill the rest of the budget with a truncated segment, then stop; the
+            # first segment is always truncated to fit, so a small budget is not left empty
+            header_cost = count_tokens(f"{segment.title}:\n")
+            minimum = self.settings.CONTEXT_MIN_SEGMENT_TOKENS if packed else 1
+            if remaining - header_cost >= minimum:
+                segment.content = truncate_to_tokens(segment.content, remaining - header_cost)
+                if segment.content:
+                    packed.append(segment)
+            break
+
+        return packed
+
+    def _merge_adjacent(self, results: List[Dict[str, Any]]) -> List[ContextSegment]:
+        """Join consecutive chunks of the same page, removing their overlap.
+
+        Results arrive ranked by the search, lexical fusion or reranker, so
+        a chunk's relevance comes from its position rather than its vector
+        distance; a merged segment keeps the best of its chunks.
+        """
+        pages: Dict[str, List[Dict[str, Any]]] = {}
+        relevance: Dict[int, float] = {}
+        for position, doc in enumerate(results):
+            metadata = doc.get("metadata") or {}
+            key = str(metadata.get("page_id") or metadata.get("url") or doc.get("id"))
+            pages.setdefault(key, []).append(doc)
+            relevance[id(doc)] = 1.0 - position / len(results)
+
+        segments = []
+        for docs in pages.values():
+            docs.sort(key=lambda d: (d.get("metadata") or {}).get("chunk_index", 0))
+            current: Optional[ContextSegment] = None
+            for doc in docs:
+                metadata = doc.get("metadata") or {}
+                index = metadata.get("chunk_index")
+                if (
+                    current is not None
+                    and index is not None
+                    and current.chunk_indices
+                    and index == current.chunk_indices[-1] + 1
+                ):
+                    current.content = _join_overlapping(
+                        current.content, doc["content"], self.settings.CHUNK_OVERLAP * 2
+                    )
+                    current.chunk_indices.append(index)
+                    current.distance = min(current.distance, doc["distance"])
+                    current.relevance = max(current.relevance, relevance[id(doc)])
+                    current.duplicates.extend(url for url in doc.get("duplicates", []) if url not in current.duplicates)
+                    continue
+
+                current = ContextSegment(
+                    title=metadata.get("title", ""),
+                    content=doc["content"],
+                    metadata=metadata,
+                    distance=doc["distance"],
+                    relevance=relevance[id(doc)],
+                    chunk_indices=[index] if index is not None else [],
+                    duplicates=list(doc.get("duplicates", []))
+                )
+                segments.append(current)
+
+        for segment in segments:
+            segment.terms = frozenset(_WORD_RE.findall(segment.content.lower()))
+        return segments
+
+    def _mmr_order(self, segments: List[ContextSegment]) -> List[ContextSegment]:
+        """Order segments by maximal marginal relevance, dropping near-duplicates"""
+        lam = self.settings.CONTEXT_MMR_LAMBDA
+        threshold = self.settings.CONTEXT_DEDUP_THRESHOLD
+        candidates = sorted(segments, key=lambda s: s.relevance, reverse=True)
+        selected: List[ContextSegment] = []
+
+        while candidates:
+            best_index, best_score = None, None
+            for i, candidate in enumerate(candidates):
+                redundancy = max((_jaccard(candidate.terms, s.terms) for s in selected), default=0.0)
+                if redundancy >= threshold:
+                    continue
+                score = lam * candidate.relevance - (1.0 - lam) * redundancy
+                if best_score is None or score > best_score:
+                    best_index, best_score = i, score
+            if best_index is None:
+                break
+            selected.append(candidates.pop(best_index))
+
+        return selected
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens, preferring sentence and then word boundaries"""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    kept = ""
+    for sentence in _SENTENCE_RE.split(text):
+        candidate = f"{kept} {sentence}" if kept else sentence
+        if count_tokens(candidate) > max_tokens:
+            break
+        kept = candidate
+    if kept:
+        return kept
+
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
+
+
+def _join_overlapping(first: str, second: str, max_overlap: int) -> str:
+    """Concatenate two chunks, dropping the longest suffix of first that prefixes second"""
+    for size in range(min(len(first), len(second), max_overlap), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first} {second}"
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,233 @@
+"""MinHash/LSH near-duplicate detection for chunks, so copies are not embedded twice."""
+from typing import List, Dict, Any, Optional, Set, Tuple
+import hashlib
+import os
+import pickle
+import re
+import threading
+import zlib
+
+import numpy as np
+from loguru import logger
+
+from app.utils.persistence import atomic_write_bytes
+
+_WORD_RE = re.compile(r"\w+")
+
+_FORMAT_VERSION = 1
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Bands and rows per band whose LSH threshold (1/b)^(1/r) is closest to, but not above, threshold"""
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+
+def collapse_duplicates(results: List[Dict[str, Any]], n_results: int) -> List[Dict[str, Any]]:
+    """Keep the best hit per duplicate group, listing the copies it stands for under ``duplicates``"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    collapsed: List[Dict[str, Any]] = []
+    for doc in results:
+        metadata = doc.get("metadata") or {}
+        key = metadata.get("dedup_group") or doc.get("id")
+        first = groups.get(key)
+        if first is None:
+            groups[key] = first = {**doc, "duplicates": []}
+            collapsed.append(first)
+            continue
+        url = metadata.get("url")
+        if url and url != (first.get("metadata") or {}).get("url") and url not in first["duplicates"]:
+            first["duplicates"].append(url)
+    return collapsed[:n_results]
+
+
+class DuplicateIndex:
+    """Locality-sensitive hash index of chunk MinHash signatures.
+
+    Only canonical chunks, the first copy seen and embedded, are hashed
+    into the LSH bands; later near-duplicates are recorded as aliases of
+    their canonical chunk. Candidates from the bands are confirmed with
+    the estimated Jaccard similarity of word shingles before a chunk is
+    treated as a copy.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 3,
+        seed: int = 1
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._lock = threading.RLock()
+
+        # x -> a * x + b modulo 2^32 with odd a permutes 32-bit hashes; uint32
+        # arithmetic wraps, so no modulo is needed
+        rng = np.random.default_rng(seed)
+        self._a = (rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64) | 1).astype(np.uint32)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64).astype(np.uint32)
+
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(self.bands)]
+        self._aliases: Dict[str, str] = {}
+        self._aliases_of: Dict[str, Set[str]] = {}
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._signatures) + len(self._aliases)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of the text's word shingles, or None for text without words"""
+        words = _WORD_RE.findall(text.lower())
+        if not words:
+            return None
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint32, count=len(shingles)
+        )
+        return (hashes[:, None] * self._a + self._b).min(axis=0)
+
+    def find(self, signature: Optional[np.ndarray], exclude: Optional[str] = None) -> Optional[str]:
+        """Canonical chunk most similar to the signature above the threshold, if any"""
+        if signature is None:
+            return None
+        with self._lock:
+            candidates: Set[str] = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates |= self._buckets[band].get(key, set())
+            candidates.discard(exclude)
+
+            best, best_similarity = None, self.threshold
+            for doc_id in candidates:
+                similarity = float(np.mean(self._signatures[doc_id] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = doc_id, similarity
+            return best
+
+    def canonical(self, doc_id: str) -> str:
+        """The chunk a duplicate reuses the vector of, or the chunk itself"""
+        return self._aliases.get(doc_id, doc_id)
+
+    def aliases_of(self, canonical: str) -> Set[str]:
+        """Chunks recorded as near-duplicates of a canonical chunk"""
+        with self._lock:
+            return set(self._aliases_of.get(canonical, ()))
+
+    def group(self, doc_id: str) -> Optional[str]:
+        """Key shared by a canonical chunk and its near-duplicates; changes when the canonical's content does"""
+        signature = self._signatures.get(self.canonical(doc_id))
+        if signature is None:
+            return None
+        return hashlib.blake2b(signature.tobytes(), digest_size=8).hexdigest()
+
+    def add(self, doc_id: str, signature: Optional[np.ndarray]) -> None:
+        """Index a canonical chunk, replacing whatever was recorded for its ID"""
+        with self._lock:
+            self._remove_one(doc_id)
+            if signature is None:
+                return
+            self._signatures[doc_id] = signature
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, set()).add(doc_id)
+
+    def alias(self, doc_id: str, canonical: str) -> None:
+        """Record a chunk as a near-duplicate of a canonical chunk"""
+        with self._lock:
+            self._remove_one(doc_id)
+            self._aliases[doc_id] = canonical
+            self._aliases_of.setdefault(canonical, set()).add(doc_id)
+
+    def remove(self, ids: List[str]) -> None:
+        """Forget chunks, ignoring unknown IDs"""
+        with self._lock:
+            for doc_id in ids:
+                self._remove_one(doc_id)
+
+    def merge(self, other: "DuplicateIndex") -> None:
+        """Take over the canonical chunks and aliases of an index built with the same parameters"""
+        with self._lock, other._lock:
+            for doc_id, signature in other._signatures.items():
+                self.add(doc_id, signature)
+            for doc_id, canonical in other._aliases.items():
+                self.alias(doc_id, canonical)
+
+    def ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._signatures) | set(self._aliases)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._signatures = {}
+            self._buckets = [{} for _ in range(self.bands)]
+            self._aliases = {}
+            self._aliases_of = {}
+
+    def _remove_one(self, doc_id: str) -> None:
+        canonical = self._aliases.pop(doc_id, None)
+        if canonical is not None:
+            aliases = self._aliases_of.get(canonical)
+            if aliases is not None:
+                aliases.discard(doc_id)
+                if not aliases:
+                    del self._aliases_of[canonical]
+        signature = self._signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def save(self) -> None:
+        """Persist the index atomically to its path"""
+        if not self.path:
+            return
+        with self._lock:
+            state = {
+                "version": _FORMAT_VERSION,
+                "params": (self.num_perm, self.shingle_size, self.seed),
+                "signatures": self._signatures,
+                "aliases": self._aliases,
+            }
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        atomic_write_bytes(self.path, data)
+        logger.debug(f"Saved duplicate index with {len(self)} chunks to {self.path}")
+
+    def load(self) -> None:
+        """Load a previously persisted index from its path"""
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != _FORMAT_VERSION:
+            logger.warning(f"Ignoring duplicate index at {self.path} with unsupported format")
+            return
+        if state["params"] != (self.num_perm, self.shingle_size, self.seed):
+            # Signatures from other hash parameters cannot be compared; chunks are re-hashed as they are re-ingested
+            logger.warning(f"Ignoring duplicate index at {self.path} built with other MinHash parameters")
+            return
+        with self._lock:
+            self.clear()
+            for doc_id, signature in state["signatures"].items():
+                self.add(doc_id, signature)
+            for doc_id, canonical in state["aliases"].items():
+                self.alias(doc_id, canonical)
+        logger.info(f"Loaded duplicate index with {len(self)} chunks from {self.path}")
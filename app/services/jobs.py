@@ -0,0 +1,233 @@
+"""Background crawl and rebuild jobs so crawling never blocks startup or requests."""
+from typing import Dict, Any, Optional, List, Tuple
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+import asyncio
+import time
+import uuid
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core.metrics import registry
+from app.core.tracing import span
+from app.services.confluence import ConfluenceService
+from app.services.maintenance import IndexMaintenance
+from app.services.progress import CrawlProgress, JobCancelled
+from app.services.rag import RAGService
+
+CRAWL_JOBS = registry.counter("crawl_jobs_total", "Crawl jobs by final status")
+CRAWL_JOBS_MERGED = registry.counter("crawl_jobs_merged_total", "Crawl requests merged into a running job")
+CRAWL_JOBS_ACTIVE = registry.gauge("crawl_jobs_active", "Crawl jobs pending or running")
+
+
+class JobStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+ACTIVE_STATUSES = (JobStatus.PENDING, JobStatus.RUNNING)
+
+
+class JobConflict(RuntimeError):
+    """A job cannot start because another job or a maintenance operation is running"""
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+@dataclass
+class CrawlJob:
+    """State of one crawl-and-ingest or crawl-and-rebuild run"""
+    id: str
+    reason: str
+    kind: str = "crawl"
+    status: JobStatus = JobStatus.PENDING
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    documents: int = 0
+    error: Optional[str] = None
+    progress: CrawlProgress = field(default_factory=CrawlProgress)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "reason": self.reason,
+            "kind": self.kind,
+            "status": self.status.value,
+            "created_at": _isoformat(self.created_at),
+            "started_at": _isoformat(self.started_at),
+            "finished_at": _isoformat(self.finished_at),
+            "elapsed_seconds": end - self.started_at if self.started_at else 0.0,
+            "documents": self.documents,
+            "error": self.error,
+            "progress": self.progress.to_dict(),
+        }
+
+
+class JobManager:
+    """Runs crawl and rebuild jobs as background tasks, one at a time.
+
+    Starting a crawl while one is pending or running merges the request into
+    that job rather than starting a second full crawl. A rebuild crawls into
+    a shadow index and swaps it in, so it never runs alongside a crawl or
+    another maintenance operation: whichever comes second is refused with
+    ``JobConflict``, as a crawl writing to the old store during the swap
+    would lose its writes. Cancellation stops the
+    crawl thread at the next page and the ingest at the next document; chunks
+    already written stay in the index, since re-crawling overwrites them by
+    ID. The most recent ``CRAWL_JOB_HISTORY`` finished jobs are kept with
+    their progress and stage timings.
+    """
+
+    def __init__(
+        self,
+        confluence: ConfluenceService,
+        rag: RAGService,
+        settings: Optional[Settings] = None,
+        maintenance: Optional[IndexMaintenance] = None
+    ):
+        self.confluence = confluence
+        self.rag = rag
+        self.settings = settings or rag.settings
+        self.maintenance = maintenance
+        self._jobs: Dict[str, CrawlJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def current(self) -> Optional[CrawlJob]:
+        """The running job, or the most recent one"""
+        jobs = list(self._jobs.values())
+        active = [job for job in jobs if job.active]
+        if active:
+            return active[-1]
+        return jobs[-1] if jobs else None
+
+    @property
+    def running(self) -> bool:
+        """Whether a job is pending or running"""
+        current = self.current
+        return current is not None and current.active
+
+    def get(self, job_id: str) -> Optional[CrawlJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[CrawlJob]:
+        """All known jobs, newest first"""
+        return list(reversed(self._jobs.values()))
+
+    def start_crawl(self, reason: str = "manual") -> CrawlJob:
+        """Start a crawl in the background, or return the one already running"""
+        return self.submit(reason)[0]
+
+    def submit(self, reason: str = "manual") -> Tuple[CrawlJob, bool]:
+        """Start a crawl in the background; returns the job and whether it was merged into a running one"""
+        current = self.current
+        if current is not None and current.active and current.kind == "crawl":
+            CRAWL_JOBS_MERGED.inc()
+            logger.info(f"Crawl already running as job {current.id}, merging {reason} request")
+            return current, True
+        return self._start(CrawlJob(id=uuid.uuid4().hex, reason=reason)), False
+
+    def start_rebuild(self, reason: str = "manual") -> CrawlJob:
+        """Crawl into a shadow index in the background and swap it in when complete"""
+        if self.maintenance is None:
+            raise ValueError("Rebuilds need the index maintenance service")
+        return self._start(CrawlJob(id=uuid.uuid4().hex, reason=reason, kind="rebuild"))
+
+    def _start(self, job: CrawlJob) -> CrawlJob:
+        current = self.current
+        if current is not None and current.active:
+            raise JobConflict(f"A {current.kind} job is running ({current.id}); try again when it finishes")
+        if self.maintenance is not None and self.maintenance.running:
+            raise JobConflict("Index maintenance is running; try again when it finishes")
+
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        CRAWL_JOBS_ACTIVE.inc()
+        logger.info(f"Started {job.reason} {job.kind} job {job.id}")
+        return job
+
+    def cancel(self, job_id: str) -> Optional[CrawlJob]:
+        """Ask a job to stop; returns None for unknown jobs and finished jobs unchanged"""
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return job
+        # The flag stops the crawl thread, which task cancellation cannot reach
+        job.progress.cancel()
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        logger.info(f"Cancelling {job.kind} job {job_id}")
+        return job
+
+    async def wait(self, job_id: str) -> CrawlJob:
+        """Wait for a job to finish and return it"""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+        return self._jobs[job_id]
+
+    async def shutdown(self) -> None:
+        """Cancel jobs that are still running"""
+        for job_id in list(self._tasks):
+            self.cancel(job_id)
+        await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    async def _run(self, job: CrawlJob) -> None:
+        progress = job.progress
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        start = time.perf_counter()
+        try:
+            with span("crawl.job", job_id=job.id, reason=job.reason, kind=job.kind):
+                progress.enter("crawl")
+                with span("crawl.fetch"):
+                    documents = await self.confluence.crawl(progress)
+                job.documents = len(documents)
+
+                if job.kind == "rebuild":
+                    progress.enter("rebuild")
+                    with span("crawl.rebuild", documents=job.documents):
+                        await self.maintenance.rebuild(documents)
+                else:
+                    progress.enter("ingest")
+                    with span("crawl.ingest", documents=job.documents):
+                        await self.rag.ingest_documents(documents, progress)
+            job.status = JobStatus.SUCCEEDED
+            logger.info(f"{job.kind.capitalize()} job {job.id} ingested {job.documents} documents")
+        except (asyncio.CancelledError, JobCancelled):
+            job.status = JobStatus.CANCELLED
+            logger.warning(f"{job.kind.capitalize()} job {job.id} cancelled")
+        except Exception as e:
+            # A failed crawl must not take the server down with it
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            logger.error(f"{job.kind.capitalize()} job {job.id} failed: {str(e)}")
+        finally:
+            progress.enter("done")
+            progress.timings["total"] = time.perf_counter() - start
+            job.finished_at = time.time()
+            self._tasks.pop(job.id, None)
+            self._prune()
+            CRAWL_JOBS_ACTIVE.dec()
+            CRAWL_JOBS.inc(status=job.status.value)
+
+    def _prune(self) -> None:
+        """Forget the oldest finished jobs beyond the history limit"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(len(finished) - self.settings.CRAWL_JOB_HISTORY, 0)]:
+            del self._jobs[job_id]
@@ -0,0 +1,217 @@
+"""Lexical BM25 index over chunk IDs for exact-match retrieval."""
+from typing import Any, List, Dict, Tuple, Optional, Iterable, Set
+from collections import Counter
+import heapq
+import math
+import os
+import re
+import threading
+
+from loguru import logger
+
+from app.utils.persistence import SnapshotLog
+
+# Compound tokens such as ERR-1234, PROJ-42 or get_page_by_id are kept whole
+# and additionally split into their parts.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.:/][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_.:/]")
+
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the
+this to was were will with
+""".split())
+
+_FORMAT_VERSION = 2
+
+# A posting list longer than this multiple of the current candidate set only
+# re-scores existing candidates during a query.
+_SCAN_FACTOR = 8
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, keeping compound identifiers"""
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if _SPLIT_RE.search(token):
+            terms.extend(part for part in _SPLIT_RE.split(token) if part and part not in _STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Combine ranked ID lists into a single ranking using reciprocal-rank fusion"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """Incrementally maintained BM25 inverted index keyed by chunk ID"""
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+
+        # Chunk IDs are mapped to dense integer slots so postings stay compact.
+        self._ids: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._doc_len: List[int] = []
+        self._doc_terms: List[Tuple[str, ...]] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_len = 0
+        # Changes since the last save, recorded once there is a file to log them against
+        self._log: Optional[SnapshotLog] = None
+        self._changes: Optional[List[Any]] = None
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._slots
+
+    def add(self, ids: List[str], texts: List[str]) -> None:
+        """Insert or replace chunks in the index"""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                counts = Counter(tokenize(text))
+                self._add_counts(doc_id, counts)
+                if self._changes is not None:
+                    self._changes.append(["add", doc_id, counts])
+
+    def _add_counts(self, doc_id: str, counts: Dict[str, int]) -> None:
+        if doc_id in self._slots:
+            self._remove_slot(self._slots[doc_id])
+
+        slot = self._free.pop() if self._free else len(self._ids)
+        if slot == len(self._ids):
+            self._ids.append(doc_id)
+            self._doc_len.append(0)
+            self._doc_terms.append(())
+        else:
+            self._ids[slot] = doc_id
+
+        length = sum(counts.values())
+        self._slots[doc_id] = slot
+        self._doc_len[slot] = length
+        self._doc_terms[slot] = tuple(counts)
+        self._total_len += length
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[slot] = tf
+
+    def remove(self, ids: List[str]) -> None:
+        """Remove chunks from the index, ignoring unknown IDs"""
+        with self._lock:
+            for doc_id in ids:
+                slot = self._slots.get(doc_id)
+                if slot is not None:
+                    self._remove_slot(slot)
+                    if self._changes is not None:
+                        self._changes.append(["remove", doc_id])
+
+    def _remove_slot(self, slot: int) -> None:
+        for term in self._doc_terms[slot]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(slot, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len[slot]
+        del self._slots[self._ids[slot]]
+        self._ids[slot] = None
+        self._doc_len[slot] = 0
+        self._doc_terms[slot] = ()
+        self._free.append(slot)
+
+    def search(self, query: str, k: int = 10, allowed_ids: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """Return the top-k (chunk ID, BM25 score) pairs for a query"""
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._slots)
+            if not terms or n_docs == 0:
+                return []
+
+            avg_len = self._total_len / n_docs or 1.0
+            k1, b = self.k1, self.b
+            doc_len = self._doc_len
+            scores: Dict[int, float] = {}
+
+            # Rare terms first: once they have produced candidates, long posting
+            # lists of common terms only re-score those candidates instead of
+            # being scanned in full, which keeps lookups cheap on large corpora.
+            term_postings = sorted(
+                (self._postings[term] for term in terms if term in self._postings),
+                key=len
+            )
+            for postings in term_postings:
+                df = len(postings)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                if scores and df > _SCAN_FACTOR * len(scores):
+                    matches = [(slot, postings[slot]) for slot in scores if slot in postings]
+                else:
+                    matches = postings.items()
+                for slot, tf in matches:
+                    norm = tf + k1 * (1.0 - b + b * doc_len[slot] / avg_len)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (k1 + 1.0) / norm
+
+            if allowed_ids is not None:
+                scores = {slot: s for slot, s in scores.items() if self._ids[slot] in allowed_ids}
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(self._ids[slot], score) for slot, score in top]
+
+    def save(self) -> None:
+        """Persist the changes since the last save, or a full snapshot when one is due"""
+        if not self.path:
+            return
+        with self._lock:
+            if self._log is None or self._log.path != self.path or self._changes is None or self._log.compaction_due:
+                self._log = SnapshotLog(self.path)
+                self._log.write({"version": _FORMAT_VERSION, "docs": self._term_counts()})
+                logger.debug(f"Saved lexical index with {len(self)} chunks to {self.path}")
+            elif self._changes:
+                self._log.append(self._changes)
+                logger.debug(f"Logged {len(self._changes)} lexical index changes to {self._log.log_path}")
+            self._changes = []
+
+    def _term_counts(self) -> Dict[str, Dict[str, int]]:
+        postings = self._postings
+        return {
+            doc_id: {term: postings[term][slot] for term in self._doc_terms[slot]}
+            for slot, doc_id in enumerate(self._ids)
+            if doc_id is not None
+        }
+
+    def load(self) -> None:
+        """Load a previously persisted index and replay the changes logged since"""
+        log = SnapshotLog(self.path)
+        try:
+            state, changes = log.read()
+        except ValueError:
+            logger.warning(f"Ignoring lexical index at {self.path} with unsupported format")
+            return
+        if state.get("version") != _FORMAT_VERSION:
+            logger.warning(f"Ignoring lexical index at {self.path} with unsupported format")
+            return
+        with self._lock:
+            self._ids, self._slots, self._free = [], {}, []
+            self._doc_len, self._doc_terms, self._postings = [], [], {}
+            self._total_len = 0
+            for doc_id, counts in state["docs"].items():
+                self._add_counts(doc_id, counts)
+            for change in changes:
+                if change[0] == "add":
+                    self._add_counts(*change[1:])
+                elif change[1] in self._slots:
+                    self._remove_slot(self._slots[change[1]])
+            self._log, self._changes = log, []
+        logger.info(f"Loaded lexical index with {len(self)} chunks from {self.path}")
@@ -0,0 +1,212 @@
+"""Index maintenance: orphan garbage collection, compaction and blue/green rebuilds."""
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from dataclasses import dataclass
+import asyncio
+import time
+import uuid
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core.metrics import registry
+from app.services.rag import RAGService
+from app.services.sharding import ShardedVectorStore
+from app.services.vector_store import VectorStore, create_backend, write_active_index
+from app.services.writer import BulkWriter
+
+MAINTENANCE_RUNS = registry.counter("maintenance_runs_total", "Index maintenance runs by operation")
+MAINTENANCE_REMOVED = registry.counter("maintenance_removed_chunks_total", "Orphaned chunks removed by garbage collection")
+
+
+@dataclass
+class MaintenanceReport:
+    """Outcome of one maintenance operation"""
+    operation: str
+    scanned: int = 0
+    removed: int = 0
+    written: int = 0
+    seconds: float = 0.0
+
+
+class IndexMaintenance:
+    """Keeps the index clean without taking it offline.
+
+    Compaction and rebuilds write into a shadow store that searches cannot
+    see. Only when it is complete is it swapped in: the active-index pointer
+    (or shard registry) is replaced atomically, the RAG service switches to
+    the new store and the old one is dropped after a grace period so
+    in-flight queries finish. Only one operation runs at a time.
+    """
+
+    def __init__(self, rag: RAGService, settings: Optional[Settings] = None):
+        self.rag = rag
+        self.settings = settings or rag.settings
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def collect_garbage(
+        self,
+        live_page_ids: Iterable[str],
+        spaces: Optional[Iterable[str]] = None,
+        dry_run: bool = False
+    ) -> MaintenanceReport:
+        """Delete chunks whose page is no longer in Confluence.
+
+        Only chunks in ``spaces`` are considered when given, since the live
+        page list usually covers just the configured spaces.
+        """
+        live = {str(page_id) for page_id in live_page_ids}
+        if not live:
+            raise ValueError("Live page list is empty; refusing to garbage-collect the whole index")
+        spaces = set(spaces) if spaces else None
+
+        async with self._lock:
+            report = MaintenanceReport("gc")
+            start = time.perf_counter()
+
+            # Collect first and delete afterwards so the scan is not paginating a shrinking store
+            orphans: List[str] = []
+            async for batch in self.rag.vector_store.scan():
+                for doc in batch:
+                    report.scanned += 1
+                    metadata = doc.get("metadata") or {}
+                    page_id = metadata.get("page_id")
+                    if page_id is None:
+                        continue
+                    if spaces is not None and metadata.get("space_key") not in spaces:
+                        continue
+                    if str(page_id) not in live:
+                        orphans.append(doc["id"])
+
+            if orphans and not dry_run:
+                await self.rag.delete_documents(orphans)
+                MAINTENANCE_REMOVED.inc(len(orphans))
+            report.removed = len(orphans)
+            report.seconds = time.perf_counter() - start
+            MAINTENANCE_RUNS.inc(operation="gc")
+            logger.info(
+                f"Garbage collection {'found' if dry_run else 'removed'} {report.removed} orphaned chunks "
+                f"out of {report.scanned} in {report.seconds:.1f}s"
+            )
+            return report
+
+    async def compact(self) -> MaintenanceReport:
+        """Copy live chunks into fresh stores, dropping tombstones and rebuilding the ANN graph"""
+        async with self._lock:
+            report = MaintenanceReport("compact")
+            start = time.perf_counter()
+            store = self.rag.vector_store
+
+            if isinstance(store, ShardedVectorStore):
+                for space in store.spaces():
+                    name, shadow = await store.create_shadow(space)
+                    report.written += await self._copy(store.shard(space), shadow)
+                    old = await store.swap(space, name, shadow)
+                    # Read-only workers reopen the registry before the old shard is dropped
+                    self.rag.record_generation()
+                    await store.retire(old)
+            else:
+                name, shadow = await self._create_shadow()
+                report.written = await self._copy(store, shadow)
+                await self._swap(name, shadow)
+
+            report.scanned = report.written
+            report.seconds = time.perf_counter() - start
+            MAINTENANCE_RUNS.inc(operation="compact")
+            logger.info(f"Compacted index to {report.written} chunks in {report.seconds:.1f}s")
+            return report
+
+    async def rebuild(self, documents: List[Dict[str, Any]]) -> MaintenanceReport:
+        """Re-ingest every document into a shadow index and swap it in when complete"""
+        async with self._lock:
+            report = MaintenanceReport("rebuild")
+            start = time.perf_counter()
+            store = self.rag.vector_store
+
+            if isinstance(store, ShardedVectorStore):
+                spaces = {doc.get("space_key", "") for doc in documents}
+                for space in sorted(spaces):
+                    await self.rag.rebuild_space(space, documents)
+                for space in set(store.spaces()) - spaces:
+                    removed = self.rag.metadata_index.resolve({"space_key": space}) or set()
+                    old = await store.drop_space(space)
+                    self._forget(list(removed))
+                    self.rag.record_generation()
+                    await store.retire(old)
+                report.written = await store.count()
+            else:
+                name, store = await self._create_shadow()
+                shadow = self.rag.shadow(store)
+                try:
+                    async with BulkWriter(store, self.settings, on_flush=shadow._index_chunks) as writer:
+                        await shadow.write_documents(writer, documents)
+                except (Exception, asyncio.CancelledError):
+                    await store.drop()
+                    raise
+                report.written = len(shadow.metadata_index)
+                await self._swap(name, store, shadow)
+
+            self.rag.record_generation()
+            report.scanned = len(documents)
+            report.seconds = time.perf_counter() - start
+            MAINTENANCE_RUNS.inc(operation="rebuild")
+            logger.info(f"Rebuilt index from {len(documents)} documents in {report.seconds:.1f}s")
+            return report
+
+    async def _create_shadow(self) -> Tuple[str, VectorStore]:
+        name = uuid.uuid4().hex[:8]
+        shadow = create_backend(self.settings, name)
+        await shadow.clear()
+        return name, shadow
+
+    async def _copy(self, source: VectorStore, target: VectorStore) -> int:
+        """Stream every chunk with its stored embedding from source into target"""
+        async with BulkWriter(target, self.settings) as writer:
+            async for batch in source.scan(include_embeddings=True):
+                await writer.put_many(
+                    [doc["id"] for doc in batch],
+                    [doc["content"] for doc in batch],
+                    [doc["embedding"] for doc in batch],
+                    [doc["metadata"] for doc in batch]
+                )
+        return writer.stats.rows
+
+    async def _swap(self, name: str, shadow: VectorStore, indexes: Optional[RAGService] = None) -> None:
+        """Point new and existing readers at the shadow store, then drop the old one.
+
+        ``indexes`` is the shadow service a rebuild wrote through; its side
+        indexes replace the live ones, and their files, in the same step.
+        """
+        write_active_index(self.settings, name)
+        old = self.rag.vector_store
+        if indexes is None:
+            self.rag.vector_store = shadow
+        else:
+            for attr in ("metadata_index", "lexical", "dedup", "pages"):
+                index = getattr(indexes, attr)
+                if index is not None:
+                    index.path = getattr(self.rag, attr).path
+            self.rag.switch_index(indexes)
+            self.rag.save_indexes()
+        # Read-only workers switch at their next poll, within the grace period
+        self.rag.record_generation()
+        logger.info(f"Swapped in index {name}")
+
+        # Searches that started before the swap may still be reading the old store
+        await asyncio.sleep(self.settings.INDEX_SWAP_GRACE_SECONDS)
+        await old.drop()
+
+    def _forget(self, ids: List[str]) -> None:
+        pages = self.rag.metadata_index.page_ids(ids)
+        self.rag.metadata_index.remove(ids)
+        self.rag.metadata_index.save()
+        if self.rag.lexical is not None:
+            self.rag.lexical.remove(ids)
+            self.rag.lexical.save()
+        if self.rag.dedup is not None:
+            self.rag.dedup.remove(ids)
+            self.rag.dedup.save()
+        self.rag.prune_pages(pages)
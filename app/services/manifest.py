@@ -0,0 +1,62 @@
+"""Manifest describing how the persisted index was built."""
+from typing import Optional
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+import json
+import os
+
+from loguru import logger
+
+from app.utils.persistence import atomic_write_bytes
+
+MANIFEST_FILE = "index_manifest.json"
+
+
+class IndexMismatchError(ValueError):
+    """The persisted index was built with a different embedding model or dimension"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class IndexManifest:
+    """Embedding model, dimension and generation of the persisted index"""
+    embedding_model: str
+    dimension: int
+    backend: str
+    generation: int = 0
+    created_at: str = field(default_factory=_now)
+    updated_at: str = field(default_factory=_now)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["IndexManifest"]:
+        path = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(**{key: data[key] for key in cls.__dataclass_fields__ if key in data})
+
+    def save(self, directory: str) -> None:
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        self.updated_at = _now()
+        data = json.dumps(asdict(self), indent=2).encode("utf-8")
+        atomic_write_bytes(os.path.join(directory, MANIFEST_FILE), data)
+
+    def check(self, embedding_model: str, dimension: int) -> None:
+        """Raise IndexMismatchError unless the index matches the configured model"""
+        if self.embedding_model != embedding_model:
+            raise IndexMismatchError(
+                f"Index was built with {self.embedding_model} but EMBEDDING_MODEL is {embedding_model}; "
+                "rebuild the index or restore the original model setting"
+            )
+        if self.dimension != dimension:
+            raise IndexMismatchError(
+                f"Index has {self.dimension}-dimensional embeddings but {embedding_model} "
+                f"produces {dimension}; rebuild the index"
+            )
+        logger.info(
+            f"Index manifest OK: {self.embedding_model} ({self.dimension} dims), generation {self.generation}"
+        )
@@ -0,0 +1,272 @@
+"""Normalised chunk metadata and a secondary index for filtered search."""
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterable
+from datetime import datetime, timezone
+import os
+import threading
+
+import numpy as np
+from loguru import logger
+
+from app.utils.persistence import SnapshotLog
+
+LABEL_PREFIX = "label:"
+TIMESTAMP_FIELD = "last_modified_ts"
+
+# Equality fields resolved through the secondary index
+INDEXED_FIELDS = ("space_key", "author", "page_id")
+
+# Filter keys understood by the index in addition to INDEXED_FIELDS
+LABEL_KEYS = ("label", "labels")
+RANGE_KEYS = ("last_modified_after", "last_modified_before")
+
+_FORMAT_VERSION = 2
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Convert an ISO 8601 string or epoch number to epoch seconds"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def normalize_metadata(metadata: Dict[str, Any], labels: Iterable[str] = ()) -> Dict[str, Any]:
+    """Add filterable fields: one boolean per label and a numeric timestamp"""
+    normalized = dict(metadata)
+    labels = [label for label in labels if label]
+    normalized["labels"] = ",".join(labels)
+    for label in labels:
+        normalized[f"{LABEL_PREFIX}{label}"] = True
+    timestamp = parse_timestamp(metadata.get("last_modified"))
+    if timestamp is not None:
+        normalized[TIMESTAMP_FIELD] = timestamp
+    return normalized
+
+
+def split_filter(metadata_filter: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """Split a filter into the part the index resolves and a plain ChromaDB where clause.
+
+    Raises ValueError for a date bound that is neither ISO 8601 nor epoch
+    seconds; an empty bound leaves that side of the range open.
+    """
+    if not metadata_filter:
+        return {}, None
+    structured, remaining = {}, {}
+    for key, value in metadata_filter.items():
+        if key in INDEXED_FIELDS and not isinstance(value, dict):
+            structured[key] = value
+        elif key in RANGE_KEYS:
+            if value not in (None, "") and parse_timestamp(value) is None:
+                raise ValueError(f"Invalid {key} date {value!r}: expected ISO 8601 or epoch seconds")
+            structured[key] = value
+        elif key in LABEL_KEYS:
+            structured[key] = value
+        else:
+            remaining[key] = value
+    return structured, remaining or None
+
+
+def to_where(structured: Dict[str, Any], remaining: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Translate a structured filter into an equivalent ChromaDB where clause"""
+    clauses = []
+    for key, value in structured.items():
+        if key in INDEXED_FIELDS:
+            if isinstance(value, (list, tuple, set)):
+                clauses.append({key: {"$in": list(value)}})
+            else:
+                clauses.append({key: value})
+        elif key in LABEL_KEYS:
+            for label in _as_list(value):
+                clauses.append({f"{LABEL_PREFIX}{label}": True})
+        elif key in RANGE_KEYS:
+            # An open bound matches everything, as in MetadataIndex.resolve
+            timestamp = parse_timestamp(value)
+            if timestamp is not None:
+                op = "$gte" if key == "last_modified_after" else "$lte"
+                clauses.append({TIMESTAMP_FIELD: {op: timestamp}})
+
+    if remaining:
+        clauses.extend({key: value} for key, value in remaining.items())
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+class MetadataIndex:
+    """Secondary index resolving metadata filters to candidate chunk IDs"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in INDEXED_FIELDS}
+        self._labels: Dict[str, Set[str]] = {}
+        self._timestamps: Dict[str, float] = {}
+        self._entries: Dict[str, Tuple[Tuple[str, Any], ...]] = {}
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        # Changes since the last save, recorded once there is a file to log them against
+        self._log: Optional[SnapshotLog] = None
+        self._changes: Optional[List[Any]] = None
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Index or re-index chunks by their normalised metadata"""
+        with self._lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                entry = [
+                    (field, metadata[field]) for field in INDEXED_FIELDS
+                    if metadata.get(field) not in (None, "")
+                ]
+                entry.extend(("label", key[len(LABEL_PREFIX):]) for key in metadata if key.startswith(LABEL_PREFIX))
+                timestamp = metadata.get(TIMESTAMP_FIELD)
+                if timestamp is not None:
+                    timestamp = float(timestamp)
+                self._add_one(doc_id, entry, timestamp)
+                if self._changes is not None:
+                    self._changes.append(["add", doc_id, entry, timestamp])
+
+    def _add_one(self, doc_id: str, entry: List[Tuple[str, Any]], timestamp: Optional[float]) -> None:
+        if doc_id in self._entries:
+            self._remove_one(doc_id)
+        for field, value in entry:
+            postings = self._labels if field == "label" else self._postings[field]
+            postings.setdefault(value, set()).add(doc_id)
+        if timestamp is not None:
+            self._timestamps[doc_id] = timestamp
+            self._sorted = None
+        self._entries[doc_id] = tuple((field, value) for field, value in entry)
+
+    def remove(self, ids: List[str]) -> None:
+        """Drop chunks from the index, ignoring unknown IDs"""
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._entries:
+                    self._remove_one(doc_id)
+                    if self._changes is not None:
+                        self._changes.append(["remove", doc_id])
+
+    def page_ids(self, ids: Iterable[str]) -> Set[str]:
+        """Pages the given chunks belong to"""
+        with self._lock:
+            return {
+                value
+                for doc_id in ids
+                for field, value in self._entries.get(doc_id, ())
+                if field == "page_id"
+            }
+
+    def _remove_one(self, doc_id: str) -> None:
+        for field, value in self._entries.pop(doc_id):
+            postings = self._labels if field == "label" else self._postings[field]
+            ids = postings.get(value)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del postings[value]
+        if self._timestamps.pop(doc_id, None) is not None:
+            self._sorted = None
+
+    def resolve(self, structured: Dict[str, Any]) -> Optional[Set[str]]:
+        """Return the chunk IDs matching every structured condition, or None if unconstrained"""
+        if not structured:
+            return None
+
+        with self._lock:
+            sets: List[Set[str]] = []
+            for key, value in structured.items():
+                if key in INDEXED_FIELDS:
+                    postings = self._postings[key]
+                    matched: Set[str] = set()
+                    for item in _as_list(value):
+                        matched |= postings.get(item, set())
+                    sets.append(matched)
+                elif key in LABEL_KEYS:
+                    for label in _as_list(value):
+                        sets.append(self._labels.get(label, set()))
+            if any(key in RANGE_KEYS for key in structured):
+                sets.append(self._time_range(
+                    parse_timestamp(structured.get("last_modified_after")),
+                    parse_timestamp(structured.get("last_modified_before"))
+                ))
+
+            # Intersect smallest first so narrow filters stay cheap
+            sets.sort(key=len)
+            result = set(sets[0])
+            for other in sets[1:]:
+                if not result:
+                    break
+                result &= other
+            return result
+
+    def _time_range(self, start: Optional[float], end: Optional[float]) -> Set[str]:
+        if self._sorted is None:
+            ids = np.array(list(self._timestamps.keys()), dtype=object)
+            values = np.fromiter(self._timestamps.values(), dtype=np.float64, count=len(ids))
+            order = np.argsort(values, kind="stable")
+            self._sorted = (values[order], ids[order])
+        values, ids = self._sorted
+        lo = 0 if start is None else int(np.searchsorted(values, start, side="left"))
+        hi = len(values) if end is None else int(np.searchsorted(values, end, side="right"))
+        return set(ids[lo:hi].tolist())
+
+    def save(self) -> None:
+        """Persist the changes since the last save, or a full snapshot when one is due"""
+        if not self.path:
+            return
+        with self._lock:
+            if self._log is None or self._log.path != self.path or self._changes is None or self._log.compaction_due:
+                self._log = SnapshotLog(self.path)
+                self._log.write({
+                    "version": _FORMAT_VERSION,
+                    "entries": self._entries,
+                    "timestamps": self._timestamps,
+                })
+                logger.debug(f"Saved metadata index with {len(self)} chunks to {self.path}")
+            elif self._changes:
+                self._log.append(self._changes)
+                logger.debug(f"Logged {len(self._changes)} metadata index changes to {self._log.log_path}")
+            self._changes = []
+
+    def load(self) -> None:
+        """Load a previously persisted index and replay the changes logged since"""
+        log = SnapshotLog(self.path)
+        try:
+            state, changes = log.read()
+        except ValueError:
+            logger.warning(f"Ignoring metadata index at {self.path} with unsupported format")
+            return
+        if state.get("version") != _FORMAT_VERSION:
+            logger.warning(f"Ignoring metadata index at {self.path} with unsupported format")
+            return
+        with self._lock:
+            self._postings = {field: {} for field in INDEXED_FIELDS}
+            self._labels, self._timestamps, self._entries = {}, {}, {}
+            timestamps = state["timestamps"]
+            for doc_id, entry in state["entries"].items():
+                self._add_one(doc_id, entry, timestamps.get(doc_id))
+            for change in changes:
+                if change[0] == "add":
+                    self._add_one(*change[1:])
+                elif change[1] in self._entries:
+                    self._remove_one(change[1])
+            self._log, self._changes = log, []
+        logger.info(f"Loaded metadata index with {len(self)} chunks from {self.path}")
@@ -0,0 +1,536 @@
+"""In-process vector store over a memory-mapped float32 matrix."""
+from typing import List, Dict, Any, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import pickle
+import shutil
+import threading
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import Settings
+from app.services.vector_store import VectorStore, matches_where
+from app.utils.persistence import atomic_write_bytes
+
+try:
+    import hnswlib
+except ImportError:  # the HNSW layer is optional
+    hnswlib = None
+
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.bin"
+OFFSETS_FILE = "offsets.i64"
+METADATA_FILE = "metadata.jsonl"
+DELETED_FILE = "deleted.i64"
+STATE_FILE = "state.json"
+HNSW_FILE = "hnsw.bin"
+
+# State of indexes written before IDs and metadata became append-only
+LEGACY_STATE_FILE = "state.pkl"
+
+_FORMAT_VERSION = 2
+
+# Rows scored per matrix multiplication, bounding temporary memory
+_SEARCH_BLOCK_ROWS = 65536
+
+
+class MmapVectorStore(VectorStore):
+    """Exact NumPy search over embeddings kept in a memory-mapped matrix"""
+
+    # Vectors, chunk texts and text offsets live in append-only files mapped
+    # read-only, so worker processes opening the same directory share one copy
+    # of the pages through the OS page cache; only IDs and metadata are held per
+    # process. IDs and metadata are appended to a JSON lines log and upserts
+    # and deletes append tombstoned rows, so a write costs the size of its
+    # batch. A small state file replaced atomically after each write marks
+    # which prefix of every file is committed.
+
+    def __init__(self, settings: Settings, path: Optional[str] = None, read_only: bool = False):
+        self.settings = settings
+        self.path = path or settings.MMAP_INDEX_DIR
+        self.read_only = read_only
+        self._lock = threading.RLock()
+
+        self.dim: Optional[int] = None
+        self._count = 0
+        self._ids: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._deleted = np.zeros(0, dtype=bool)
+        self._metadata_size = 0
+        self._tombstones = 0
+        self._unsaved_tombstones: List[int] = []
+        self._vectors: Optional[np.memmap] = None
+        self._offsets: Optional[np.memmap] = None
+        self._documents: Optional[np.memmap] = None
+        self._hnsw = None
+        self._hnsw_saved = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._file(STATE_FILE)):
+            self._load()
+        elif os.path.exists(self._file(LEGACY_STATE_FILE)):
+            self._load_legacy()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    # Loading and mapping
+
+    def _load(self) -> None:
+        with open(self._file(STATE_FILE), "rb") as f:
+            state = json.loads(f.read())
+        if state.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported mmap index format in {self.path}")
+
+        with self._lock:
+            self.dim = state["dim"]
+            self._count = state["count"]
+            self._metadata_size = state["metadata_size"]
+            self._tombstones = state["tombstones"]
+            self._ids, self._metadatas = [], []
+            if self._metadata_size:
+                with open(self._file(METADATA_FILE), "rb") as f:
+                    log = f.read(self._metadata_size)
+                for line in log.splitlines():
+                    doc_id, metadata = json.loads(line)
+                    self._ids.append(doc_id)
+                    self._metadatas.append(metadata)
+            deleted = (
+                np.fromfile(self._file(DELETED_FILE), dtype=np.int64, count=self._tombstones)
+                if self._tombstones else np.zeros(0, dtype=np.int64)
+            )
+            self._open_rows(deleted)
+        logger.info(f"Opened mmap index with {len(self._rows)} chunks at {self.path}")
+
+    def _load_legacy(self) -> None:
+        """Open an index whose IDs and metadata were pickled whole, converting it unless read-only"""
+        with open(self._file(LEGACY_STATE_FILE), "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != 1:
+            raise ValueError(f"Unsupported mmap index format in {self.path}")
+
+        with self._lock:
+            self.dim = state["dim"]
+            self._count = state["count"]
+            self._ids = state["ids"]
+            self._metadatas = state["metadatas"]
+            self._open_rows(state["deleted"])
+            if not self.read_only:
+                self._unsaved_tombstones = [int(row) for row in state["deleted"]]
+                self._commit(_encode_records(self._ids, self._metadatas))
+                os.remove(self._file(LEGACY_STATE_FILE))
+                logger.info(f"Converted mmap index at {self.path} to format {_FORMAT_VERSION}")
+        logger.info(f"Opened mmap index with {len(self._rows)} chunks at {self.path}")
+
+    def _open_rows(self, deleted: Any) -> None:
+        self._deleted = np.zeros(self._count, dtype=bool)
+        self._deleted[deleted] = True
+        for row in np.flatnonzero(self._deleted):
+            self._ids[row] = None
+            self._metadatas[row] = None
+        self._rows = {
+            doc_id: row for row, doc_id in enumerate(self._ids)
+            if doc_id is not None
+        }
+        self._remap()
+        self._load_hnsw()
+
+    def _remap(self) -> None:
+        """Map the committed prefix of every data file read-only"""
+        if self._count == 0 or self.dim is None:
+            self._vectors = self._offsets = self._documents = None
+            return
+        self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r",
+                                  shape=(self._count, self.dim))
+        self._offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.int64, mode="r",
+                                  shape=(self._count + 1,))
+        text_size = int(self._offsets[-1])
+        self._documents = (
+            np.memmap(self._file(DOCUMENTS_FILE), dtype=np.uint8, mode="r", shape=(text_size,))
+            if text_size else np.zeros(0, dtype=np.uint8)
+        )
+
+    def _load_hnsw(self) -> None:
+        if not self.settings.MMAP_HNSW or hnswlib is None or self.dim is None:
+            return
+        if not os.path.exists(self._file(HNSW_FILE)):
+            self._build_hnsw()
+            return
+
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.load_index(self._file(HNSW_FILE), max_elements=max(self._count, 1))
+        saved = index.get_current_count()
+        self._hnsw_saved = min(saved, self._count)
+        # The graph is saved as the index doubles, so rows committed since
+        # are added here; rows past the committed state are a later write's
+        if saved < self._count:
+            index.resize_index(self._count)
+            index.add_items(np.asarray(self._vectors[saved:]), np.arange(saved, self._count))
+        hidden = np.concatenate([np.flatnonzero(self._deleted), np.arange(self._count, saved)])
+        for row in hidden:
+            try:
+                index.mark_deleted(int(row))
+            except RuntimeError:
+                pass  # tombstoned before the graph was saved
+        self._hnsw = index
+
+    def _build_hnsw(self) -> None:
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(
+            max_elements=max(self._count, 1),
+            ef_construction=self.settings.HNSW_EF_CONSTRUCTION,
+            M=self.settings.HNSW_M
+        )
+        live = np.flatnonzero(~self._deleted)
+        if len(live):
+            index.add_items(np.asarray(self._vectors[live]), live)
+        self._hnsw = index
+        self._hnsw_saved = 0
+
+    def _save_hnsw(self) -> None:
+        # Written beside the live graph and renamed, so readers never load half a file
+        tmp = self._file(f"{HNSW_FILE}.tmp")
+        self._hnsw.save_index(tmp)
+        os.replace(tmp, self._file(HNSW_FILE))
+        self._hnsw_saved = self._count
+
+    def _document(self, row: int) -> str:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return bytes(self._documents[start:end]).decode("utf-8")
+
+    # Writes
+
+    async def add_documents(
+        self,
+        documents: List[str],
+        ids: List[str],
+        embeddings: Any,
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Append chunks, tombstoning any previous rows with the same IDs"""
+        try:
+            await asyncio.to_thread(self._append, documents, ids, embeddings, metadatas)
+            logger.info(f"Added {len(ids)} documents to mmap index")
+        except Exception as e:
+            logger.error(f"Error adding documents to mmap index: {str(e)}")
+            raise
+
+    def _append(self, documents, ids, embeddings, metadatas) -> None:
+        self._check_writable()
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        encoded = [text.encode("utf-8") for text in documents]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            if self._hnsw is None and self.settings.MMAP_HNSW and hnswlib is not None:
+                self._build_hnsw()
+
+            start_row = self._count
+            text_start = int(self._offsets[-1]) if self._offsets is not None else 0
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            offsets = text_start + np.cumsum(lengths)
+
+            # Data files are appended past the committed prefix, so a crash
+            # before the state file is replaced leaves the index unchanged.
+            _write_at(self._file(VECTORS_FILE), start_row * self.dim * 4, vectors.tobytes())
+            _write_at(self._file(DOCUMENTS_FILE), text_start, b"".join(encoded))
+            if start_row == 0:
+                _write_at(self._file(OFFSETS_FILE), 0, np.zeros(1, dtype=np.int64).tobytes())
+            _write_at(self._file(OFFSETS_FILE), (start_row + 1) * 8, offsets.tobytes())
+
+            records = _encode_records(ids, metadatas)
+            self._ids.extend(ids)
+            self._metadatas.extend(metadatas)
+            self._deleted = np.concatenate([self._deleted, np.zeros(len(ids), dtype=bool)])
+            self._count = start_row + len(ids)
+            if self._hnsw is not None:
+                self._hnsw.resize_index(max(self._count, self._hnsw.get_max_elements()))
+                self._hnsw.add_items(vectors, np.arange(start_row, self._count))
+
+            for row, doc_id in enumerate(ids, start=start_row):
+                previous = self._rows.get(doc_id)
+                if previous is not None:
+                    self._tombstone(previous)
+                self._rows[doc_id] = row
+
+            self._commit(records)
+            self._remap()
+
+    async def delete_documents(self, ids: List[str]) -> None:
+        """Tombstone chunks by ID"""
+        try:
+            await asyncio.to_thread(self._delete, ids)
+            logger.info(f"Deleted {len(ids)} documents from mmap index")
+        except Exception as e:
+            logger.error(f"Error deleting documents from mmap index: {str(e)}")
+            raise
+
+    def _delete(self, ids: List[str]) -> None:
+        self._check_writable()
+        with self._lock:
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is not None:
+                    self._tombstone(row)
+            self._commit()
+
+    def _tombstone(self, row: int) -> None:
+        self._deleted[row] = True
+        self._unsaved_tombstones.append(row)
+        self._ids[row] = None
+        self._metadatas[row] = None
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(row)
+
+    async def clear(self) -> None:
+        """Remove every chunk and its data files"""
+        self._check_writable()
+        with self._lock:
+            for name in (STATE_FILE, VECTORS_FILE, DOCUMENTS_FILE, OFFSETS_FILE, METADATA_FILE, DELETED_FILE,
+                         HNSW_FILE, LEGACY_STATE_FILE):
+                if os.path.exists(self._file(name)):
+                    os.remove(self._file(name))
+            self.dim = None
+            self._count = 0
+            self._ids, self._metadatas, self._rows = [], [], {}
+            self._deleted = np.zeros(0, dtype=bool)
+            self._metadata_size = self._tombstones = 0
+            self._unsaved_tombstones = []
+            self._hnsw = None
+            self._hnsw_saved = 0
+            self._remap()
+        logger.info("Cleared mmap index")
+
+    async def drop(self) -> None:
+        """Unmap the index and delete its directory"""
+        self._check_writable()
+        with self._lock:
+            self._vectors = self._offsets = self._documents = None
+            self._hnsw = None
+            shutil.rmtree(self.path, ignore_errors=True)
+        logger.info(f"Dropped mmap index at {self.path}")
+
+    def _commit(self, records: bytes = b"") -> None:
+        """Append new rows' records and tombstones, then atomically publish the committed prefixes"""
+        if records:
+            _write_at(self._file(METADATA_FILE), self._metadata_size, records)
+            self._metadata_size += len(records)
+        if self._unsaved_tombstones:
+            rows = np.asarray(self._unsaved_tombstones, dtype=np.int64)
+            _write_at(self._file(DELETED_FILE), self._tombstones * 8, rows.tobytes())
+            self._tombstones += len(rows)
+            self._unsaved_tombstones = []
+        state = {
+            "version": _FORMAT_VERSION,
+            "dim": self.dim,
+            "count": self._count,
+            "metadata_size": self._metadata_size,
+            "tombstones": self._tombstones,
+        }
+        atomic_write_bytes(self._file(STATE_FILE), json.dumps(state).encode("utf-8"))
+        # Saving the graph rewrites all of it, so it is saved each time the
+        # index doubles and loading adds the rows committed since
+        if self._hnsw is not None and self._count >= 2 * self._hnsw_saved:
+            self._save_hnsw()
+
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError(f"mmap index at {self.path} is opened read-only")
+
+    # Reads
+
+    async def search_batch(
+        self,
+        query_embeddings: List[Any],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        candidates: Optional[Set[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Return the nearest chunks for each query by cosine distance.
+
+        With ``candidates`` only their rows are scored, and ``where`` is
+        checked on those rows alone rather than on every chunk.
+        """
+        try:
+            if len(query_embeddings) == 0:
+                return []
+            return await asyncio.to_thread(self._search, query_embeddings, n_results, where, candidates)
+        except Exception as e:
+            logger.error(f"Error searching mmap index: {str(e)}")
+            raise
+
+    def _search(self, query_embeddings, n_results, where, candidates=None) -> List[List[Dict[str, Any]]]:
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+        with self._lock:
+            count, vectors, deleted = self._count, self._vectors, self._deleted
+            if count == 0 or not self._rows:
+                return [[] for _ in range(len(queries))]
+
+            if candidates is not None:
+                rows = np.fromiter(
+                    (row for row in map(self._rows.get, candidates) if row is not None), dtype=np.int64
+                )
+                if where:
+                    rows = rows[np.fromiter(
+                        (matches_where(self._metadatas[row], where) for row in rows), dtype=bool, count=len(rows)
+                    )]
+                hits = _top_k_rows(queries, vectors, np.sort(rows), n_results)
+            elif where:
+                excluded = deleted | ~np.fromiter(
+                    (meta is not None and matches_where(meta, where) for meta in self._metadatas),
+                    dtype=bool, count=count
+                )
+                hits = _exact_top_k(queries, vectors, excluded, n_results)
+            elif self._hnsw is not None:
+                hits = self._search_hnsw(queries, n_results)
+            else:
+                hits = _exact_top_k(queries, vectors, deleted, n_results)
+
+            return [
+                [self._result(row, 1.0 - score) for row, score in query_hits]
+                for query_hits in hits
+            ]
+
+    def _search_hnsw(self, queries: np.ndarray, n_results: int) -> List[List[Tuple[int, float]]]:
+        k = min(n_results, len(self._rows))
+        self._hnsw.set_ef(max(self.settings.HNSW_EF_SEARCH, k))
+        labels, distances = self._hnsw.knn_query(queries, k=k)
+        # hnswlib's inner-product distance is 1 - dot product
+        return [
+            [(int(row), 1.0 - float(distance)) for row, distance in zip(label_row, distance_row)]
+            for label_row, distance_row in zip(labels, distances)
+        ]
+
+    def _result(self, row: int, distance: float) -> Dict[str, Any]:
+        return {
+            "id": self._ids[row],
+            "content": self._document(row),
+            "metadata": self._metadatas[row],
+            "distance": float(distance),
+        }
+
+    async def get_documents(
+        self,
+        ids: List[str],
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get chunks by ID, optionally restricted by a metadata filter"""
+        with self._lock:
+            documents = []
+            for doc_id in ids:
+                row = self._rows.get(doc_id)
+                if row is None or not matches_where(self._metadatas[row], where):
+                    continue
+                doc = {
+                    "id": doc_id,
+                    "content": self._document(row),
+                    "metadata": self._metadatas[row],
+                }
+                if include_embeddings:
+                    doc["embedding"] = np.array(self._vectors[row])
+                documents.append(doc)
+            return documents
+
+    async def count(self) -> int:
+        return len(self._rows)
+
+    async def list_ids(self) -> List[str]:
+        with self._lock:
+            return sorted(self._rows, key=self._rows.get)
+
+    def live_ids(self) -> Set[str]:
+        with self._lock:
+            return set(self._rows)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _encode_records(ids: List[Optional[str]], metadatas: List[Optional[Dict[str, Any]]]) -> bytes:
+    """One JSON line of ID and metadata per row, for the metadata log"""
+    return b"".join(
+        json.dumps([doc_id, metadata], separators=(",", ":")).encode("utf-8") + b"\n"
+        for doc_id, metadata in zip(ids, metadatas)
+    )
+
+
+def _exact_top_k(
+    queries: np.ndarray,
+    vectors: np.ndarray,
+    excluded: np.ndarray,
+    k: int
+) -> List[List[Tuple[int, float]]]:
+    """Blocked brute-force inner-product search, skipping excluded rows"""
+    n_queries = len(queries)
+    best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+
+    for start in range(0, len(vectors), _SEARCH_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _SEARCH_BLOCK_ROWS])
+        scores = queries @ block.T
+        scores[:, excluded[start:start + len(block)]] = -np.inf
+        rows = np.broadcast_to(np.arange(start, start + len(block)), (n_queries, len(block)))
+        best_scores, best_rows = _keep_top_k(best_scores, best_rows, scores, rows, k)
+
+    return _ranked(best_scores, best_rows)
+
+
+def _top_k_rows(queries: np.ndarray, vectors: np.ndarray, rows: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+    """Blocked brute-force inner-product search over the given rows only"""
+    n_queries = len(queries)
+    best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((n_queries, 0), dtype=np.int64)
+
+    for start in range(0, len(rows), _SEARCH_BLOCK_ROWS):
+        block_rows = rows[start:start + _SEARCH_BLOCK_ROWS]
+        scores = queries @ np.asarray(vectors[block_rows]).T
+        best_scores, best_rows = _keep_top_k(
+            best_scores, best_rows, scores, np.broadcast_to(block_rows, (n_queries, len(block_rows))), k
+        )
+
+    return _ranked(best_scores, best_rows)
+
+
+def _keep_top_k(
+    best_scores: np.ndarray,
+    best_rows: np.ndarray,
+    scores: np.ndarray,
+    rows: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    scores = np.concatenate([best_scores, scores], axis=1)
+    rows = np.concatenate([best_rows, rows], axis=1)
+    keep = min(k, scores.shape[1])
+    if keep == 0:
+        return scores, rows
+    top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+    return np.take_along_axis(scores, top, axis=1), np.take_along_axis(rows, top, axis=1)
+
+
+def _ranked(best_scores: np.ndarray, best_rows: np.ndarray) -> List[List[Tuple[int, float]]]:
+    order = np.argsort(-best_scores, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    return [
+        [(int(row), float(score)) for row, score in zip(row_ids, row_scores) if score != -np.inf]
+        for row_ids, row_scores in zip(best_rows, best_scores)
+    ]
+
+
+def _write_at(path: str, offset: int, data: bytes) -> None:
+    """Write bytes at an offset, creating the file if needed, and flush to disk"""
+    mode = "r+b" if os.path.exists(path) else "w+b"
+    with open(path, mode) as f:
+        f.seek(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,148 @@
+"""Page-level vector index for the coarse stage of two-stage retrieval."""
+from typing import List, Dict, Any, Optional
+import os
+import pickle
+import threading
+
+import numpy as np
+from loguru import logger
+
+from app.utils.persistence import atomic_write_bytes
+
+_FORMAT_VERSION = 1
+
+_INITIAL_CAPACITY = 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def page_vector(chunk_embeddings: Any, title_embedding: Any = None, title_weight: float = 0.3) -> np.ndarray:
+    """Mean of the page's normalised chunk embeddings, blended with its title embedding"""
+    pooled = _normalize(_normalize(np.asarray(chunk_embeddings, dtype=np.float32)).mean(axis=0))
+    if title_embedding is None or not title_weight:
+        return pooled
+    title = _normalize(np.asarray(title_embedding, dtype=np.float32))
+    return _normalize((1.0 - title_weight) * pooled + title_weight * title)
+
+
+class PageIndex:
+    """One normalised vector per page, searched exactly with a matrix product.
+
+    Rows live in one float32 matrix that grows by doubling; removed pages
+    leave a free row that the next new page reuses. Page count is small
+    next to chunk count, so scoring every page per query stays cheap.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, page_id: str) -> bool:
+        return page_id in self._rows
+
+    def add(self, page_id: str, vector: Any) -> None:
+        """Insert or replace the vector of a page"""
+        vector = _normalize(np.asarray(vector, dtype=np.float32).reshape(-1))
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                if self._rows:
+                    raise ValueError(f"Page vector has {len(vector)} dimensions, index has {self._vectors.shape[1]}")
+                self._vectors = np.zeros((_INITIAL_CAPACITY, len(vector)), dtype=np.float32)
+
+            row = self._rows.get(page_id)
+            if row is None:
+                row = self._free.pop() if self._free else len(self._ids)
+                if row == len(self._ids):
+                    self._ids.append(page_id)
+                    if row >= len(self._vectors):
+                        grown = np.zeros((len(self._vectors) * 2, self._vectors.shape[1]), dtype=np.float32)
+                        grown[:len(self._vectors)] = self._vectors
+                        self._vectors = grown
+                else:
+                    self._ids[row] = page_id
+                self._rows[page_id] = row
+            self._vectors[row] = vector
+
+    def remove(self, page_ids: List[str]) -> None:
+        """Drop pages, ignoring unknown IDs"""
+        with self._lock:
+            for page_id in page_ids:
+                row = self._rows.pop(page_id, None)
+                if row is not None:
+                    self._ids[row] = None
+                    self._vectors[row] = 0.0
+                    self._free.append(row)
+
+    def merge(self, other: "PageIndex") -> None:
+        """Add or replace every page of another index"""
+        with self._lock, other._lock:
+            for page_id, row in other._rows.items():
+                self.add(page_id, other._vectors[row])
+
+    def page_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._rows)
+
+    def search(self, query_embeddings: List[Any], k: int) -> List[List[str]]:
+        """IDs of the k most similar pages for each query, best first"""
+        with self._lock:
+            if not self._rows:
+                return [[] for _ in query_embeddings]
+            count = len(self._ids)
+            matrix = self._vectors[:count]
+            queries = _normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1))
+            scores = queries @ matrix.T
+            if self._free:
+                scores[:, self._free] = -np.inf
+
+            k = min(k, len(self._rows))
+            results = []
+            for row in scores:
+                top = np.argpartition(-row, k - 1)[:k]
+                top = top[np.argsort(-row[top])]
+                results.append([self._ids[i] for i in top])
+            return results
+
+    def save(self) -> None:
+        """Persist the index atomically to its path"""
+        if not self.path:
+            return
+        with self._lock:
+            state = {
+                "version": _FORMAT_VERSION,
+                "ids": self._ids,
+                "free": self._free,
+                "vectors": self._vectors[:len(self._ids)] if self._vectors is not None else None,
+            }
+            data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        atomic_write_bytes(self.path, data)
+        logger.debug(f"Saved page index with {len(self)} pages to {self.path}")
+
+    def load(self) -> None:
+        """Load a previously persisted index from its path"""
+        with open(self.path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != _FORMAT_VERSION:
+            logger.warning(f"Ignoring page index at {self.path} with unsupported format")
+            return
+        with self._lock:
+            self._ids = state["ids"]
+            self._free = state["free"]
+            vectors = state["vectors"]
+            if vectors is not None:
+                self._vectors = np.zeros((max(_INITIAL_CAPACITY, len(vectors)), vectors.shape[1]), dtype=np.float32)
+                self._vectors[:len(vectors)] = vectors
+            self._rows = {page_id: row for row, page_id in enumerate(self._ids) if page_id is not None}
+        logger.info(f"Loaded page index with {len(self)} pages from {self.path}")
@@ -0,0 +1,114 @@
+"""Progress reporting and cancellation for long-running crawl and ingest work."""
+from typing import Dict, Any, Optional
+from contextlib import contextmanager
+import threading
+import time
+
+from app.core.metrics import registry
+
+INGEST_STAGE = registry.histogram(
+    "ingest_stage_seconds", "Time per page or document in each crawl and ingest stage (fetch, clean, chunk, embed)"
+)
+
+
+class JobCancelled(Exception):
+    """Raised inside a crawl when its job has been cancelled"""
+
+
+class CrawlProgress:
+    """Per-stage counters and timings for one crawl-and-ingest run.
+
+    The crawl updates it from a worker thread and the ingest from the event
+    loop; each counter has a single writer, so readers only ever see a value
+    that is slightly stale. ``timed`` accumulates the time spent in a stage
+    across calls, so interleaved stages (fetching and cleaning, embedding and
+    writing) each get their own total.
+    """
+
+    def __init__(self):
+        self.stage = "pending"
+        self.pages_total = 0
+        self.pages_fetched = 0
+        self.pages_cleaned = 0
+        self.documents_total = 0
+        self.documents_embedded = 0
+        self.chunks_embedded = 0
+        self.chunks_deduplicated = 0
+        self.rows_written = 0
+        self.timings: Dict[str, float] = {}
+        self._stage_started: Dict[str, float] = {}
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check_cancelled(self) -> None:
+        """Stop the calling crawl or ingest loop if the job was cancelled"""
+        if self._cancelled.is_set():
+            raise JobCancelled("Crawl job cancelled")
+
+    def enter(self, stage: str) -> None:
+        """Move to the next stage, closing the wall-clock timing of the current one"""
+        now = time.perf_counter()
+        if self.stage in self._stage_started:
+            self.timings[self.stage] = now - self._stage_started[self.stage]
+        self.stage = stage
+        self._stage_started[stage] = now
+
+    @contextmanager
+    def timed(self, name: str):
+        """Add the time spent in the block to the named timing and the stage histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            INGEST_STAGE.observe(elapsed, stage=name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "pages_total": self.pages_total,
+            "pages_fetched": self.pages_fetched,
+            "pages_cleaned": self.pages_cleaned,
+            "documents_total": self.documents_total,
+            "documents_embedded": self.documents_embedded,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_deduplicated": self.chunks_deduplicated,
+            "rows_written": self.rows_written,
+            "throughput": self._throughput(),
+            "eta_seconds": self._eta(),
+            "timings": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+        }
+
+    def _elapsed(self, stage: str) -> float:
+        if stage in self.timings:
+            return self.timings[stage]
+        started = self._stage_started.get(stage)
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def _throughput(self) -> Dict[str, float]:
+        crawl_seconds = self._elapsed("crawl")
+        ingest_seconds = self._elapsed("ingest")
+        return {
+            "pages_per_sec": self.pages_cleaned / crawl_seconds if crawl_seconds else 0.0,
+            "chunks_per_sec": self.chunks_embedded / ingest_seconds if ingest_seconds else 0.0,
+            "rows_per_sec": self.rows_written / ingest_seconds if ingest_seconds else 0.0,
+        }
+
+    def _eta(self) -> Optional[float]:
+        """Seconds left in the current stage at its rate so far; None until there is a rate"""
+        if self.stage == "crawl":
+            done, total = self.pages_cleaned, self.pages_total
+        elif self.stage == "ingest":
+            done, total = self.documents_embedded, self.documents_total
+        else:
+            return 0.0 if self.stage == "done" else None
+        if not done or not total:
+            return None
+        return self._elapsed(self.stage) / done * (total - done)
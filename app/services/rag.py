@@ -1,56 +1,418 @@
-"""RAG Service for integrating ChromaDB and document processing."""
-from typing import List, Dict, Any, Optional
+"""RAG Service for integrating the vector store and document processing."""
+from typing import List, Dict, Any, Optional, Set, Tuple
+import asyncio
+import copy
+import json
+import os
 import uuid
 from datetime import datetime
 from loguru import logger
 
-from sentence_transformers import SentenceTransformer
-from app.services.chromadb import ChromaDBService
+import numpy as np
+from app.services.vector_store import VectorStore, distances
+from app.services.dedup import DuplicateIndex, collapse_duplicates
+from app.services.lexical import LexicalIndex, reciprocal_rank_fusion
+from app.services.metadata_index import MetadataIndex, normalize_metadata, split_filter, to_where
+from app.services.page_index import PageIndex, page_vector
+from app.services.manifest import IndexManifest
+from app.services.writer import BulkWriter
+from app.services.progress import CrawlProgress
+from app.services.sharding import ShardedVectorStore
 from app.core.config import Settings
+from app.core.metrics import registry
+from app.core.tracing import stage
+
+SEARCH_STAGE = registry.histogram("search_stage_seconds", "Time spent in each stage of a context request")
+EMBED_BATCH_SIZE = registry.histogram(
+    "embedding_batch_size", "Texts per embedding model call", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+DUPLICATE_CHUNKS = registry.counter(
+    "ingest_duplicate_chunks_total", "Chunks stored with a near-duplicate's vector instead of being embedded"
+)
 
 class RAGService:
     """Retrieval Augmented Generation Service"""
 
-    def __init__(self, chromadb: ChromaDBService, settings: Optional[Settings] = None):
-        """Initialize RAG service"""
-        self.chromadb = chromadb
+    def __init__(self, vector_store: VectorStore, settings: Optional[Settings] = None, model: Any = None):
+        """Initialize RAG service, loading the embedding model unless one is passed in"""
+        self.vector_store = vector_store
         self.settings = settings or Settings()
-        self.model = SentenceTransformer(self.settings.EMBEDDING_MODEL)
+        if model is None:
+            # Imported here so starting the server does not wait on torch
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.settings.EMBEDDING_MODEL)
+        self.model = model
+        self.lexical = None
+        if self.settings.HYBRID_SEARCH:
+            self.lexical = LexicalIndex(
+                os.path.join(self.settings.CHROMA_PERSIST_DIR, self.settings.LEXICAL_INDEX_FILE)
+            )
+        self.metadata_index = MetadataIndex(
+            os.path.join(self.settings.CHROMA_PERSIST_DIR, self.settings.METADATA_INDEX_FILE)
+        )
+        self.dedup = None
+        if self.settings.DEDUP_ENABLED:
+            self.dedup = DuplicateIndex(
+                os.path.join(self.settings.CHROMA_PERSIST_DIR, self.settings.DEDUP_INDEX_FILE),
+                threshold=self.settings.DEDUP_THRESHOLD,
+                num_perm=self.settings.DEDUP_NUM_PERM,
+                shingle_size=self.settings.DEDUP_SHINGLE_SIZE
+            )
+        self.pages = None
+        if self.settings.HIERARCHICAL_SEARCH:
+            self.pages = PageIndex(os.path.join(self.settings.CHROMA_PERSIST_DIR, self.settings.PAGE_INDEX_FILE))
+        self.manifest: Optional[IndexManifest] = None
+
+    async def warm_up(self) -> None:
+        """Run a dummy encode so the first query does not pay for lazy model initialisation"""
+        await asyncio.to_thread(self.model.encode, ["warm up"])
 
-    async def ingest_documents(self, documents: List[Dict[str, Any]]) -> None:
-        """Process and ingest documents into ChromaDB"""
+    async def open_index(self) -> int:
+        """Check the persisted index against the configured model and return its chunk count"""
         try:
-            for doc in documents:
-                # Generate unique ID for document
-                doc_id = str(uuid.uuid4())
-                
-                # Process document content
-                chunks = self._chunk_text(doc["content"])
-                embeddings = self.model.encode(chunks)
-                
-                # Prepare metadata
-                metadata = {
-                    "title": doc.get("title", ""),
-                    "url": doc.get("url", ""),
-                    "space_key": doc.get("space_key", ""),
-                    "last_modified": doc.get("last_modified", datetime.now().isoformat()),
-                    "source": "confluence"
-                }
-                
-                # Store in ChromaDB
-                await self.chromadb.add_documents(
-                    ids=[f"{doc_id}_{i}" for i in range(len(chunks))],
-                    documents=chunks,
-                    embeddings=embeddings,
-                    metadatas=[metadata] * len(chunks)
+            dimension = self.model.get_sentence_embedding_dimension()
+            count = await self.vector_store.count()
+
+            manifest = IndexManifest.load(self.settings.CHROMA_PERSIST_DIR)
+            if manifest is None:
+                if count:
+                    logger.warning(f"Index has {count} chunks but no manifest; assuming it matches the configured model")
+                manifest = IndexManifest(
+                    embedding_model=self.settings.EMBEDDING_MODEL,
+                    dimension=dimension,
+                    backend=self.settings.VECTOR_BACKEND
                 )
-                
+                # A read-only process leaves the manifest to the writer
+                if not self.settings.READ_ONLY:
+                    manifest.save(self.settings.CHROMA_PERSIST_DIR)
+            else:
+                manifest.check(self.settings.EMBEDDING_MODEL, dimension)
+            self.manifest = manifest
+
+            if count and (not len(self.metadata_index) or (self.lexical is not None and not len(self.lexical))):
+                await self._reindex()
+            if self.lexical is not None and len(self.lexical) != count:
+                logger.warning(f"Lexical index has {len(self.lexical)} chunks but the vector store has {count}")
+            if len(self.metadata_index) != count:
+                logger.warning(f"Metadata index has {len(self.metadata_index)} chunks but the vector store has {count}")
+
+            logger.info(f"Opened index with {count} chunks")
+            return count
+
+        except Exception as e:
+            logger.error(f"Error opening index: {str(e)}")
+            raise
+
+    async def _reindex(self) -> None:
+        """Rebuild empty metadata and lexical indexes from the stored chunks, e.g. when their file format changed"""
+        indexes = [index for index in (self.metadata_index, self.lexical) if index is not None and not len(index)]
+        logger.warning(f"{len(indexes)} side indexes are empty but the vector store is not; rebuilding them from the store")
+        async for batch in self.vector_store.scan():
+            ids = [doc["id"] for doc in batch]
+            if self.metadata_index in indexes:
+                self.metadata_index.add(ids, [doc["metadata"] or {} for doc in batch])
+            if self.lexical in indexes:
+                self.lexical.add(ids, [doc["content"] for doc in batch])
+        # A read-only process leaves the files to the writer
+        if not self.settings.READ_ONLY:
+            for index in indexes:
+                index.save()
+
+    async def ingest_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        progress: Optional[CrawlProgress] = None
+    ) -> None:
+        """Process and ingest documents into the vector store"""
+        def on_flush(ids: List[str], chunks: List[str], metadatas: List[Dict[str, Any]]) -> None:
+            self._index_chunks(ids, chunks, metadatas)
+            if progress is not None:
+                progress.rows_written += len(ids)
+
+        try:
+            try:
+                # Chunks stream into the writer, which flushes full batches in the
+                # background while the next document is being embedded
+                async with BulkWriter(self.vector_store, self.settings, on_flush=on_flush) as writer:
+                    stale_ids = await self.write_documents(writer, documents, progress)
+
+                # Pages that shrank leave chunks past their new last index behind
+                if stale_ids:
+                    await self.vector_store.delete_documents(stale_ids)
+                    self.metadata_index.remove(stale_ids)
+                    if self.lexical is not None:
+                        self.lexical.remove(stale_ids)
+                    if self.dedup is not None:
+                        self.dedup.remove(stale_ids)
+            finally:
+                # Batches flushed before a failure or cancellation stay in the
+                # store, so their index entries must survive a restart too
+                self.save_indexes()
+                self.record_generation()
             logger.info(f"Successfully ingested {len(documents)} documents")
             
         except Exception as e:
             logger.error(f"Error ingesting documents: {str(e)}")
             raise
 
+    async def rebuild_space(self, space_key: str, documents: List[Dict[str, Any]]) -> None:
+        """Re-ingest one space into a shadow shard and swap it in without touching other spaces"""
+        if not isinstance(self.vector_store, ShardedVectorStore):
+            raise ValueError("Rebuilding a single space requires SHARD_BY_SPACE")
+
+        documents = [doc for doc in documents if doc.get("space_key", "") == space_key]
+        name, store = await self.vector_store.create_shadow(space_key)
+        shadow = self.shadow(store)
+        written: List[Tuple[List[str], List[str], List[Dict[str, Any]]]] = []
+        try:
+            async with BulkWriter(store, self.settings, on_flush=lambda *batch: written.append(batch)) as writer:
+                await shadow.write_documents(writer, documents)
+        except Exception as e:
+            logger.error(f"Error rebuilding space {space_key}: {str(e)}")
+            await store.drop()
+            raise
+
+        old_ids = self.metadata_index.resolve({"space_key": space_key}) if space_key else set()
+        old_pages = self.metadata_index.page_ids(old_ids)
+        old = await self.vector_store.swap(space_key, name, store)
+
+        # The side indexes follow the swap: forget the old shard's chunks, add the new ones
+        self.metadata_index.remove(list(old_ids))
+        if self.lexical is not None:
+            self.lexical.remove(list(old_ids))
+        if self.dedup is not None:
+            self.dedup.remove(list(old_ids))
+            self.dedup.merge(shadow.dedup)
+        if self.pages is not None:
+            self.pages.merge(shadow.pages)
+        for batch in written:
+            self._index_chunks(*batch)
+        self.metadata_index.save()
+        if self.lexical is not None:
+            self.lexical.save()
+        if self.dedup is not None:
+            self.dedup.save()
+        # Pages no longer in the space go
+        self.prune_pages(old_pages)
+        self.record_generation()
+        logger.info(f"Rebuilt space {space_key} from {len(documents)} documents")
+        # Searches that started before the swap may still be reading the old shard
+        await self.vector_store.retire(old)
+
+    def shadow(self, vector_store: VectorStore) -> "RAGService":
+        """A service writing into a shadow store, with fresh side indexes that are not saved.
+
+        Rebuilds embed through it, so the live duplicate and page indexes stay
+        as they are until the shadow is swapped in, and near-duplicates reuse
+        canonical vectors from the shadow store only.
+        """
+        shadow = copy.copy(self)
+        shadow.vector_store = vector_store
+        shadow.metadata_index = MetadataIndex()
+        if self.lexical is not None:
+            shadow.lexical = LexicalIndex(k1=self.lexical.k1, b=self.lexical.b)
+        if self.dedup is not None:
+            shadow.dedup = DuplicateIndex(
+                threshold=self.dedup.threshold,
+                num_perm=self.dedup.num_perm,
+                shingle_size=self.dedup.shingle_size,
+                seed=self.dedup.seed
+            )
+        if self.pages is not None:
+            shadow.pages = PageIndex()
+        return shadow
+
+    async def write_documents(
+        self,
+        writer: BulkWriter,
+        documents: List[Dict[str, Any]],
+        progress: Optional[CrawlProgress] = None
+    ) -> List[str]:
+        """Chunk, embed and queue documents on a bulk writer, returning chunk IDs they no longer have"""
+        progress = progress or CrawlProgress()
+        progress.documents_total = len(documents)
+        stale_ids: List[str] = []
+        # Vectors embedded in this run, for near-duplicates that reuse them
+        embedded: Dict[str, Any] = {}
+        # Near-duplicates of canonical chunks whose content changed in this run
+        realias: Set[str] = set()
+        for doc in documents:
+            progress.check_cancelled()
+
+            # Chunk IDs derive from the page ID so re-ingesting a page replaces its chunks
+            page_id = str(doc.get("id") or uuid.uuid4())
+            
+            # Process document content
+            with progress.timed("chunk"):
+                chunks = self._chunk_text(doc["content"])
+            chunk_ids = [f"{page_id}_{i}" for i in range(len(chunks))]
+
+            with progress.timed("dedup"):
+                canonicals, groups = await self._find_duplicates(chunk_ids, chunks, embedded, realias)
+            unique = [i for i, canonical in enumerate(canonicals) if canonical is None]
+            embeddings: List[Any] = [None] * len(chunks)
+            title = doc.get("title") or ""
+            title_embedding = None
+            if unique:
+                # The title rides along in the chunks' model call for the page vector
+                texts = [chunks[i] for i in unique]
+                if self.pages is not None and title:
+                    texts.append(title)
+                with progress.timed("embed"):
+                    vectors = await asyncio.to_thread(self.model.encode, texts)
+                EMBED_BATCH_SIZE.observe(len(texts), operation="ingest")
+                if len(texts) > len(unique):
+                    title_embedding = vectors[-1]
+                for i, vector in zip(unique, vectors):
+                    embeddings[i] = vector
+                    if self.dedup is not None:
+                        embedded[chunk_ids[i]] = vector
+            for i, canonical in enumerate(canonicals):
+                if canonical is not None:
+                    embeddings[i] = embedded[canonical]
+            duplicates = len(chunks) - len(unique)
+            if duplicates:
+                DUPLICATE_CHUNKS.inc(duplicates)
+            progress.documents_embedded += 1
+            progress.chunks_embedded += len(unique)
+            progress.chunks_deduplicated += duplicates
+            
+            # Prepare metadata
+            metadata = normalize_metadata({
+                "title": doc.get("title", ""),
+                "url": doc.get("url", ""),
+                "space_key": doc.get("space_key", ""),
+                "author": doc.get("author", ""),
+                "last_modified": doc.get("last_modified", datetime.now().isoformat()),
+                "page_id": page_id,
+                "source": "confluence"
+            }, labels=doc.get("labels", []))
+            metadatas = [{**metadata, "chunk_index": i} for i in range(len(chunks))]
+            for i, (canonical, group) in enumerate(zip(canonicals, groups)):
+                if group is not None:
+                    metadatas[i]["dedup_group"] = group
+                if canonical is not None:
+                    metadatas[i]["duplicate_of"] = canonical
+            
+            # Queue for the vector store
+            await writer.put_many(chunk_ids, chunks, embeddings, metadatas)
+
+            if self.pages is not None:
+                if chunks:
+                    # Pages made only of copied chunks are pooled without their title rather than embedding it alone
+                    self.pages.add(page_id, page_vector(embeddings, title_embedding, self.settings.PAGE_TITLE_WEIGHT))
+                else:
+                    self.pages.remove([page_id])
+
+            previous = self.metadata_index.resolve({"page_id": page_id}) or set()
+            stale_ids.extend(sorted(previous - set(chunk_ids)))
+
+        if realias:
+            await self._rewrite_aliases(writer, sorted(realias), embedded, progress)
+        return stale_ids
+
+    async def _rewrite_aliases(
+        self,
+        writer: BulkWriter,
+        alias_ids: List[str],
+        embedded: Dict[str, Any],
+        progress: CrawlProgress
+    ) -> None:
+        """Re-resolve near-duplicates whose canonical chunk changed.
+
+        They still carry the vector and duplicate group of the canonical's old
+        content. Each is matched again against the current canonical chunks:
+        it reuses the vector of the one it now duplicates, or is embedded
+        itself and becomes canonical.
+        """
+        # Aliases written earlier in this run may still be buffered
+        await writer.flush()
+        stored = await writer.store.get_documents(alias_ids)
+        ids = [doc["id"] for doc in stored]
+        chunks = [doc["content"] for doc in stored]
+        canonicals, groups = await self._find_duplicates(ids, chunks, embedded, set())
+
+        unique = [i for i, canonical in enumerate(canonicals) if canonical is None]
+        embeddings: List[Any] = [None] * len(ids)
+        if unique:
+            with progress.timed("embed"):
+                vectors = await asyncio.to_thread(self.model.encode, [chunks[i] for i in unique])
+            EMBED_BATCH_SIZE.observe(len(unique), operation="ingest")
+            for i, vector in zip(unique, vectors):
+                embeddings[i] = embedded[ids[i]] = vector
+        for i, canonical in enumerate(canonicals):
+            if canonical is not None:
+                embeddings[i] = embedded[canonical]
+        progress.chunks_embedded += len(unique)
+
+        metadatas = []
+        for doc, canonical, group in zip(stored, canonicals, groups):
+            metadata = {k: v for k, v in (doc.get("metadata") or {}).items() if k not in ("duplicate_of", "dedup_group")}
+            if group is not None:
+                metadata["dedup_group"] = group
+            if canonical is not None:
+                metadata["duplicate_of"] = canonical
+            metadatas.append(metadata)
+        await writer.put_many(ids, chunks, embeddings, metadatas)
+        logger.info(f"Re-resolved {len(ids)} near-duplicates of changed chunks, embedding {len(unique)}")
+
+    async def _find_duplicates(
+        self,
+        chunk_ids: List[str],
+        chunks: List[str],
+        embedded: Dict[str, Any],
+        realias: Set[str]
+    ) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+        """Canonical chunk each chunk duplicates (None to embed it) and its duplicate group.
+
+        Chunks without a near-duplicate become canonical themselves. The
+        vectors of canonical chunks embedded in an earlier run are fetched
+        from the vector store into ``embedded``; a chunk whose canonical is
+        no longer stored is embedded after all. Near-duplicates of a chunk
+        whose group changed, because its content did, are added to
+        ``realias``.
+        """
+        if self.dedup is None:
+            return [None] * len(chunks), [None] * len(chunks)
+
+        # These chunks are written with the current canonicals; others keep their old group until re-resolved
+        realias.difference_update(chunk_ids)
+        previous = {chunk_id: self.dedup.group(chunk_id) for chunk_id in chunk_ids if self.dedup.aliases_of(chunk_id)}
+        signatures = [self.dedup.signature(chunk) for chunk in chunks]
+        canonicals: List[Optional[str]] = []
+        for chunk_id, signature in zip(chunk_ids, signatures):
+            canonical = self.dedup.find(signature, exclude=chunk_id)
+            if canonical is None:
+                self.dedup.add(chunk_id, signature)
+            canonicals.append(canonical)
+
+        own = set(chunk_ids)
+        missing = sorted({c for c in canonicals if c is not None and c not in embedded and c not in own})
+        if missing:
+            for stored in await self.vector_store.get_documents(missing, include_embeddings=True):
+                embedded[stored["id"]] = stored["embedding"]
+
+        groups: List[Optional[str]] = []
+        for i, (chunk_id, signature) in enumerate(zip(chunk_ids, signatures)):
+            canonical = canonicals[i]
+            if canonical is not None and canonical not in embedded and canonical not in own:
+                canonical = canonicals[i] = None
+                self.dedup.add(chunk_id, signature)
+            if canonical is not None:
+                self.dedup.alias(chunk_id, canonical)
+            groups.append(self.dedup.group(canonical or chunk_id))
+
+        for chunk_id, group in zip(chunk_ids, groups):
+            if chunk_id in previous and previous[chunk_id] != group:
+                realias.update(self.dedup.aliases_of(chunk_id) - own)
+        return canonicals, groups
+
+    def _index_chunks(self, ids: List[str], chunks: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Add a written batch to the metadata and lexical indexes"""
+        self.metadata_index.add(ids, metadatas)
+        if self.lexical is not None:
+            self.lexical.add(ids, chunks)
+
     async def search(
         self,
         query: str,
@@ -59,23 +421,286 @@ class RAGService:
     ) -> List[Dict[str, Any]]:
         """Search for relevant documents based on query"""
         try:
+            requested, n_results = n_results, self._fetch_count(n_results)
+
             # Generate query embedding
-            query_embedding = self.model.encode([query])[0]
+            with stage(SEARCH_STAGE, "search.encode", stage="encode"):
+                query_embedding = (await asyncio.to_thread(self.model.encode, [query]))[0]
+            EMBED_BATCH_SIZE.observe(1, operation="query")
 
-            # Search in ChromaDB
-            results = await self.chromadb.search(
-                query_embedding=query_embedding,
-                n_results=n_results,
-                where=metadata_filter
-            )
+            with stage(SEARCH_STAGE, "search.filter", stage="filter"):
+                where, candidates, remaining = self._resolve_filter(metadata_filter)
+            if self._use_exact_search(candidates):
+                with stage(SEARCH_STAGE, "search.exact", stage="exact_search"):
+                    results = (await self._exact_search(
+                        [query_embedding], candidates, remaining, n_results
+                    ))[0]
+            else:
+                scope_where, scope = where, candidates
+                if self._use_page_search(candidates):
+                    with stage(SEARCH_STAGE, "search.pages", stage="page_search"):
+                        scope_where, scope = self._page_scope([query_embedding], where)
+                # Search the vector store
+                with stage(SEARCH_STAGE, "search.vector", stage="vector_search"):
+                    results = await self.vector_store.search(
+                        query_embedding=query_embedding,
+                        n_results=n_results,
+                        where=scope_where,
+                        candidates=scope
+                    )
+
+            if self.lexical is not None:
+                with stage(SEARCH_STAGE, "search.lexical", stage="lexical"):
+                    results = await self._fuse_lexical(
+                        query, query_embedding, results, n_results, where, candidates
+                    )
 
-            # ChromaDB results are already in the correct format
+            if self.dedup is not None:
+                results = collapse_duplicates(results, requested)
             return results
 
         except Exception as e:
             logger.error(f"Error searching documents: {str(e)}")
             raise
 
+    async def search_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        metadata_filters: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search for several queries with one encode call, returning results in query order"""
+        try:
+            if not queries:
+                return []
+            requested, n_results = n_results, self._fetch_count(n_results)
+            if metadata_filters is None:
+                metadata_filters = [None] * len(queries)
+
+            # Encode every query in a single model call
+            with stage(SEARCH_STAGE, "search.encode", stage="encode"):
+                query_embeddings = await asyncio.to_thread(self.model.encode, queries)
+            EMBED_BATCH_SIZE.observe(len(queries), operation="query")
+
+            # Queries sharing a filter go to the vector store as one multi-query search
+            groups: Dict[str, List[int]] = {}
+            for i, metadata_filter in enumerate(metadata_filters):
+                key = json.dumps(metadata_filter, sort_keys=True, default=str)
+                groups.setdefault(key, []).append(i)
+
+            results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+            for indices in groups.values():
+                metadata_filter = metadata_filters[indices[0]]
+                with stage(SEARCH_STAGE, "search.filter", stage="filter"):
+                    where, candidates, remaining = self._resolve_filter(metadata_filter)
+                group_embeddings = [query_embeddings[i] for i in indices]
+                if self._use_exact_search(candidates):
+                    with stage(SEARCH_STAGE, "search.exact", stage="exact_search"):
+                        batch = await self._exact_search(group_embeddings, candidates, remaining, n_results)
+                else:
+                    scope_where, scope = where, candidates
+                    if self._use_page_search(candidates):
+                        # The group ranks the chunks of every page any of its queries is close to
+                        with stage(SEARCH_STAGE, "search.pages", stage="page_search"):
+                            scope_where, scope = self._page_scope(group_embeddings, where)
+                    with stage(SEARCH_STAGE, "search.vector", stage="vector_search"):
+                        batch = await self.vector_store.search_batch(
+                            query_embeddings=group_embeddings,
+                            n_results=n_results,
+                            where=scope_where,
+                            candidates=scope
+                        )
+                for i, query_results in zip(indices, batch):
+                    results[i] = query_results
+                    if self.lexical is not None:
+                        with stage(SEARCH_STAGE, "search.lexical", stage="lexical"):
+                            results[i] = await self._fuse_lexical(
+                                queries[i], query_embeddings[i], query_results, n_results, where, candidates
+                            )
+
+            if self.dedup is not None:
+                results = [collapse_duplicates(query_results, requested) for query_results in results]
+            return results
+
+        except Exception as e:
+            logger.error(f"Error searching documents in batch: {str(e)}")
+            raise
+
+    async def delete_documents(self, ids: List[str]) -> None:
+        """Delete chunks from the vector store and the side indexes"""
+        try:
+            batch_size = self.vector_store.max_batch_size()
+            for start in range(0, len(ids), batch_size):
+                await self.vector_store.delete_documents(ids[start:start + batch_size])
+            pages = self.metadata_index.page_ids(ids)
+            self.metadata_index.remove(ids)
+            self.metadata_index.save()
+            if self.lexical is not None:
+                self.lexical.remove(ids)
+                self.lexical.save()
+            if self.dedup is not None:
+                self.dedup.remove(ids)
+                self.dedup.save()
+            self.prune_pages(pages)
+            self.record_generation()
+        except Exception as e:
+            logger.error(f"Error deleting documents: {str(e)}")
+            raise
+
+    async def _fuse_lexical(
+        self,
+        query: str,
+        query_embedding: Any,
+        results: List[Dict[str, Any]],
+        n_results: int,
+        where: Optional[Dict[str, Any]],
+        candidates: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Merge BM25 hits into the vector results with reciprocal-rank fusion"""
+        lexical_hits = self.lexical.search(query, k=n_results, allowed_ids=candidates)
+        if not lexical_hits or any("id" not in doc for doc in results):
+            return results
+
+        by_id = {doc["id"]: doc for doc in results}
+        missing = [doc_id for doc_id, _ in lexical_hits if doc_id not in by_id]
+        if missing:
+            # Fetching through the vector store also applies the metadata filter
+            fetched = await self.vector_store.get_documents(
+                missing, where=where, include_embeddings=True
+            )
+            if fetched:
+                # Scored in the store's own metric so they rank against its vector hits
+                scores = distances(
+                    [query_embedding], [doc.pop("embedding") for doc in fetched], self.vector_store.distance_space()
+                )[0]
+                for doc, distance in zip(fetched, scores):
+                    doc["distance"] = float(distance)
+                    by_id[doc["id"]] = doc
+
+        vector_ranking = [doc["id"] for doc in results]
+        lexical_ranking = [doc_id for doc_id, _ in lexical_hits if doc_id in by_id]
+        fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=self.settings.RRF_K)
+
+        return [
+            {**by_id[doc_id], "score": score}
+            for doc_id, score in fused[:n_results]
+        ]
+
+    def save_indexes(self) -> None:
+        """Persist the metadata, lexical, duplicate and page indexes"""
+        self.metadata_index.save()
+        if self.lexical is not None:
+            self.lexical.save()
+        if self.dedup is not None:
+            self.dedup.save()
+        if self.pages is not None:
+            self.pages.save()
+
+    def switch_index(self, other: "RAGService") -> None:
+        """Serve from another instance's vector store and side indexes, switching them in one step"""
+        self.vector_store = other.vector_store
+        self.metadata_index = other.metadata_index
+        self.lexical = other.lexical
+        self.dedup = other.dedup
+        self.pages = other.pages
+        self.manifest = other.manifest
+
+    def record_generation(self) -> None:
+        """Bump the index generation in the manifest after a completed write"""
+        if self.manifest is None:
+            self.manifest = IndexManifest.load(self.settings.CHROMA_PERSIST_DIR) or IndexManifest(
+                embedding_model=self.settings.EMBEDDING_MODEL,
+                dimension=self.model.get_sentence_embedding_dimension(),
+                backend=self.settings.VECTOR_BACKEND
+            )
+        self.manifest.generation += 1
+        self.manifest.save(self.settings.CHROMA_PERSIST_DIR)
+
+    def _resolve_filter(
+        self,
+        metadata_filter: Optional[Dict[str, Any]]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Set[str]], Optional[Dict[str, Any]]]:
+        """Resolve a filter to (ChromaDB where, candidate chunk IDs, residual where)"""
+        structured, remaining = split_filter(metadata_filter)
+        candidates = None
+        if structured and len(self.metadata_index):
+            candidates = self.metadata_index.resolve(structured)
+        return to_where(structured, remaining), candidates, remaining
+
+    def _fetch_count(self, n_results: int) -> int:
+        """Results to retrieve so that collapsing near-duplicates still leaves n_results"""
+        if self.dedup is None:
+            return n_results
+        return n_results * max(1, self.settings.DEDUP_SEARCH_FACTOR)
+
+    def _use_page_search(self, candidates: Optional[Set[str]]) -> bool:
+        """Whether to narrow a search to its closest pages first.
+
+        Structured filters already narrow the search through the metadata
+        index, and an index with few pages gains nothing from the extra stage.
+        """
+        return (
+            candidates is None
+            and self.pages is not None
+            and len(self.pages) > self.settings.HIERARCHICAL_TOP_PAGES
+        )
+
+    def _page_scope(
+        self,
+        query_embeddings: List[Any],
+        where: Optional[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], Set[str]]:
+        """The where clause narrowed to the pages closest to any of the queries, and their chunk IDs.
+
+        The chunk IDs come from the metadata index's page postings, so a
+        backend that cannot filter metadata itself scores only those rows.
+        """
+        top_pages: Set[str] = set()
+        for pages in self.pages.search(query_embeddings, self.settings.HIERARCHICAL_TOP_PAGES):
+            top_pages.update(pages)
+        page_clause = {"page_id": {"$in": sorted(top_pages)}}
+        scope = self.metadata_index.resolve({"page_id": sorted(top_pages)}) or set()
+        return ({"$and": [where, page_clause]} if where else page_clause), scope
+
+    def prune_pages(self, page_ids: Set[str]) -> None:
+        """Drop the vectors of pages none of whose chunks are indexed any more"""
+        if self.pages is None:
+            return
+        self.pages.remove([page_id for page_id in page_ids if not self.metadata_index.resolve({"page_id": page_id})])
+        self.pages.save()
+
+    def _use_exact_search(self, candidates: Optional[Set[str]]) -> bool:
+        return candidates is not None and len(candidates) <= self.settings.EXACT_SEARCH_MAX_CANDIDATES
+
+    async def _exact_search(
+        self,
+        query_embeddings: List[Any],
+        candidates: Set[str],
+        where: Optional[Dict[str, Any]],
+        n_results: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Brute-force search over a small candidate set resolved from the metadata index"""
+        docs = []
+        if candidates:
+            docs = await self.vector_store.get_documents(
+                sorted(candidates), where=where, include_embeddings=True
+            )
+        if not docs:
+            return [[] for _ in query_embeddings]
+
+        # Same metric as the store's search, so similarity does not change scale with the path taken
+        scores = distances(
+            query_embeddings, [doc.pop("embedding") for doc in docs], self.vector_store.distance_space()
+        )
+
+        k = min(n_results, len(docs))
+        batches = []
+        for row in scores:
+            top = np.argpartition(row, k - 1)[:k]
+            top = top[np.argsort(row[top])]
+            batches.append([{**docs[j], "distance": float(row[j])} for j in top])
+        return batches
+
     def _chunk_text(self, text: str) -> List[str]:
         """Split text into chunks with overlap"""
         chunks = []
@@ -98,3 +723,4 @@ class RAGService:
             start = end - self.settings.CHUNK_OVERLAP
             
         return chunks
+
@@ -0,0 +1,85 @@
+"""Index generation pick-up for read-only serving processes."""
+from typing import Callable, Optional
+import asyncio
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core.metrics import registry
+from app.services.manifest import IndexManifest
+from app.services.rag import RAGService
+from app.services.vector_store import create_vector_store
+
+INDEX_RELOADS = registry.counter("index_reloads_total", "Index generations reopened by a read-only process, by outcome")
+
+
+class IndexReloader:
+    """Reopen the index in a read-only process whenever the writer publishes a new generation.
+
+    The writer bumps the manifest generation after the vector store and
+    every side index of a write have been saved. The reloader polls the
+    manifest, opens the store and side indexes in a worker thread, and then
+    switches the RAG service over in one step, so a query never sees a
+    half-loaded index. Rows the writer commits after the generation it
+    published may already be visible; the next generation brings the side
+    indexes up to date with them.
+    """
+
+    def __init__(
+        self,
+        rag: RAGService,
+        settings: Optional[Settings] = None,
+        on_reload: Optional[Callable[[], None]] = None
+    ):
+        self.rag = rag
+        self.settings = settings or rag.settings
+        self.on_reload = on_reload
+
+    @property
+    def generation(self) -> Optional[int]:
+        """Generation currently served"""
+        return self.rag.manifest.generation if self.rag.manifest else None
+
+    def published_generation(self) -> Optional[int]:
+        """Generation last published by the writer"""
+        manifest = IndexManifest.load(self.settings.CHROMA_PERSIST_DIR)
+        return manifest.generation if manifest else None
+
+    async def reload(self) -> bool:
+        """Switch to the published generation if it changed, returning whether it did"""
+        published = self.published_generation()
+        if published is None or published == self.generation:
+            return False
+        try:
+            reopened = await asyncio.to_thread(self._open)
+        except Exception as e:
+            INDEX_RELOADS.inc(outcome="error")
+            logger.error(f"Error reopening index generation {published}: {str(e)}")
+            raise
+
+        previous = self.generation
+        self.rag.switch_index(reopened)
+        if self.on_reload is not None:
+            self.on_reload()
+        INDEX_RELOADS.inc(outcome="ok")
+        logger.info(f"Switched from index generation {previous} to {self.generation}")
+        return True
+
+    def _open(self) -> RAGService:
+        # The manifest is read first: side indexes saved after it belong to a
+        # later generation, which the next poll switches to
+        manifest = IndexManifest.load(self.settings.CHROMA_PERSIST_DIR)
+        manifest.check(self.settings.EMBEDDING_MODEL, self.rag.model.get_sentence_embedding_dimension())
+        reopened = RAGService(create_vector_store(self.settings), self.settings, model=self.rag.model)
+        reopened.manifest = manifest
+        return reopened
+
+    async def run(self) -> None:
+        """Poll for new generations until cancelled; a failed reload keeps serving the current one"""
+        while True:
+            await asyncio.sleep(self.settings.INDEX_RELOAD_SECONDS)
+            try:
+                await self.reload()
+            except Exception:
+                # Already logged; retried on the next poll
+                pass
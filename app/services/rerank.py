@@ -0,0 +1,124 @@
+"""Cross-encoder reranking of retrieved candidates."""
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import threading
+import time
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core.metrics import registry
+
+RERANK_LATENCY = registry.histogram(
+    "rerank_latency_seconds", "Time spent reranking candidates for one request"
+)
+RERANK_REQUESTS = registry.counter(
+    "rerank_requests_total", "Rerank requests by outcome (reranked, timeout, error)"
+)
+RERANK_ORDER_CHANGED = registry.counter(
+    "rerank_order_changed_total", "Reranked requests whose top-k differs from the vector order"
+)
+RERANK_CANDIDATES = registry.histogram(
+    "rerank_candidates", "Number of candidates scored per request",
+    buckets=(1, 5, 10, 20, 50, 100, 200)
+)
+RERANK_CACHE = registry.counter(
+    "rerank_cache_total", "Cross-encoder score cache lookups by result (hit, miss)"
+)
+
+
+class RerankService:
+    """Reranks vector candidates with a CPU cross-encoder under a latency budget"""
+
+    def __init__(self, settings: Settings):
+        # Imported here so starting the server does not wait on torch
+        from sentence_transformers import CrossEncoder
+
+        self.settings = settings
+        self.model = CrossEncoder(settings.RERANK_MODEL, device="cpu")
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    async def warm_up(self) -> None:
+        """Score one dummy pair so the first rerank does not pay for lazy model initialisation"""
+        await asyncio.to_thread(self.model.predict, [("warm up", "warm up")], show_progress_bar=False)
+
+    async def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Return the top_k documents by cross-encoder score, or the vector order if over budget"""
+        if len(documents) <= 1:
+            return documents[:top_k]
+
+        budget = self.settings.RERANK_TIMEOUT_MS / 1000.0
+        start = time.perf_counter()
+        try:
+            scores = await asyncio.wait_for(
+                asyncio.to_thread(self._score, query, documents, start + budget),
+                timeout=budget
+            )
+        except asyncio.TimeoutError:
+            scores = None
+        except Exception as e:
+            logger.error(f"Error reranking documents: {str(e)}")
+            RERANK_REQUESTS.inc(outcome="error")
+            return documents[:top_k]
+        finally:
+            RERANK_LATENCY.observe(time.perf_counter() - start)
+
+        if scores is None:
+            logger.warning(f"Rerank exceeded {self.settings.RERANK_TIMEOUT_MS}ms budget, using vector order")
+            RERANK_REQUESTS.inc(outcome="timeout")
+            return documents[:top_k]
+
+        RERANK_REQUESTS.inc(outcome="reranked")
+        RERANK_CANDIDATES.observe(len(documents))
+
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:top_k]
+        if order != list(range(min(top_k, len(documents)))):
+            RERANK_ORDER_CHANGED.inc()
+
+        return [{**documents[i], "rerank_score": scores[i]} for i in order]
+
+    def _score(self, query: str, documents: List[Dict[str, Any]], deadline: float) -> Optional[List[float]]:
+        """Score (query, chunk) pairs in batches, returning None once past the deadline"""
+        keys = [(query, self._chunk_key(doc)) for doc in documents]
+        scores: List[Optional[float]] = [self._cache_get(key) for key in keys]
+        pending = [i for i, score in enumerate(scores) if score is None]
+        RERANK_CACHE.inc(len(documents) - len(pending), result="hit")
+        RERANK_CACHE.inc(len(pending), result="miss")
+
+        batch_size = self.settings.RERANK_BATCH_SIZE
+        for offset in range(0, len(pending), batch_size):
+            if time.perf_counter() >= deadline:
+                return None
+            batch = pending[offset:offset + batch_size]
+            predictions = self.model.predict(
+                [(query, documents[i]["content"]) for i in batch],
+                batch_size=batch_size,
+                show_progress_bar=False
+            )
+            for i, score in zip(batch, predictions):
+                scores[i] = float(score)
+                self._cache_put(keys[i], scores[i])
+
+        return scores
+
+    @staticmethod
+    def _chunk_key(doc: Dict[str, Any]) -> str:
+        # Keyed by content, not chunk ID: IDs are reused when a page is edited
+        return hashlib.sha1(doc["content"].encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float) -> None:
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.settings.RERANK_CACHE_SIZE:
+                self._cache.popitem(last=False)
@@ -0,0 +1,263 @@
+"""Vector store split into one shard per Confluence space."""
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable
+from itertools import islice
+import asyncio
+import heapq
+import json
+import os
+import re
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.services.vector_store import VectorStore, DEFAULT_MAX_BATCH_SIZE
+from app.utils.persistence import atomic_write_bytes
+
+SHARD_REGISTRY_FILE = "shards.json"
+
+# Shard for chunks without a space key
+DEFAULT_SHARD = "_default"
+
+ShardFactory = Callable[[str], VectorStore]
+
+
+def shard_spaces(where: Optional[Dict[str, Any]]) -> Optional[Set[str]]:
+    """Spaces a where clause restricts results to, or None if it may match any space"""
+    if not where:
+        return None
+    if "$and" in where:
+        spaces = None
+        for clause in where["$and"]:
+            clause_spaces = shard_spaces(clause)
+            if clause_spaces is not None:
+                spaces = clause_spaces if spaces is None else spaces & clause_spaces
+        return spaces
+    if "$or" in where:
+        spaces = set()
+        for clause in where["$or"]:
+            clause_spaces = shard_spaces(clause)
+            if clause_spaces is None:
+                return None
+            spaces |= clause_spaces
+        return spaces
+
+    value = where.get("space_key")
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        if "$eq" in value:
+            return {value["$eq"]}
+        if "$in" in value:
+            return set(value["$in"])
+        return None
+    return {value}
+
+
+def _space(metadata: Optional[Dict[str, Any]]) -> str:
+    return (metadata or {}).get("space_key") or DEFAULT_SHARD
+
+
+def _safe_name(space: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", space)
+
+
+class ShardedVectorStore(VectorStore):
+    """Routes chunks to one backend store per space and fans searches out in parallel"""
+
+    # A JSON registry maps each space to the name of its live shard. Rebuilding
+    # a space fills a shadow shard under a fresh name, then replaces the registry
+    # atomically and drops the old shard after a grace period, so other spaces are
+    # never touched and searches see either the old or the new shard, never a
+    # partial one.
+
+    def __init__(self, settings: Settings, factory: ShardFactory, registry_dir: Optional[str] = None):
+        self.settings = settings
+        self._factory = factory
+        self._registry_path = os.path.join(registry_dir or settings.CHROMA_PERSIST_DIR, SHARD_REGISTRY_FILE)
+        self._names: Dict[str, str] = {}
+        self._generation = 0
+        self._shards: Dict[str, VectorStore] = {}
+        self._lock = asyncio.Lock()
+
+        if os.path.exists(self._registry_path):
+            with open(self._registry_path, "r", encoding="utf-8") as f:
+                registry = json.load(f)
+            self._names = registry["shards"]
+            self._generation = registry["generation"]
+        for space, name in self._names.items():
+            self._shards[space] = factory(name)
+        logger.info(f"Opened {len(self._shards)} space shards")
+
+    def spaces(self) -> List[str]:
+        return sorted(self._shards)
+
+    def shard(self, space: str) -> Optional[VectorStore]:
+        return self._shards.get(space or DEFAULT_SHARD)
+
+    def _save_registry(self) -> None:
+        data = json.dumps({"generation": self._generation, "shards": self._names}, indent=2)
+        atomic_write_bytes(self._registry_path, data.encode("utf-8"))
+
+    def _next_name(self, space: str) -> str:
+        self._generation += 1
+        return f"{_safe_name(space)}-g{self._generation}"
+
+    async def _get_or_create(self, space: str) -> VectorStore:
+        async with self._lock:
+            store = self._shards.get(space)
+            if store is None:
+                name = self._next_name(space)
+                store = self._shards[space] = self._factory(name)
+                self._names[space] = name
+                self._save_registry()
+                logger.info(f"Created shard {name} for space {space}")
+            return store
+
+    def _targets(self, where: Optional[Dict[str, Any]]) -> List[VectorStore]:
+        spaces = shard_spaces(where)
+        if spaces is None:
+            return list(self._shards.values())
+        return [self._shards[space or DEFAULT_SHARD] for space in spaces if (space or DEFAULT_SHARD) in self._shards]
+
+    # Writes
+
+    async def add_documents(
+        self,
+        documents: List[str],
+        ids: List[str],
+        embeddings: Any,
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Split a batch by space and write each part to its shard concurrently"""
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(_space(metadata), []).append(i)
+
+        writes = []
+        for space, rows in groups.items():
+            store = await self._get_or_create(space)
+            writes.append(store.add_documents(
+                documents=[documents[i] for i in rows],
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows]
+            ))
+        await asyncio.gather(*writes)
+
+    async def delete_documents(self, ids: List[str]) -> None:
+        """Delete chunks from every shard; IDs do not say which space they belong to"""
+        await asyncio.gather(*(store.delete_documents(ids) for store in self._shards.values()))
+
+    async def clear(self) -> None:
+        """Drop every shard"""
+        async with self._lock:
+            await asyncio.gather(*(store.drop() for store in self._shards.values()))
+            self._shards, self._names = {}, {}
+            self._save_registry()
+        logger.info("Cleared all space shards")
+
+    # Rebuild and swap
+
+    async def create_shadow(self, space: str) -> Tuple[str, VectorStore]:
+        """Create an empty shard for space that searches will not see until swapped in"""
+        async with self._lock:
+            name = self._next_name(space or DEFAULT_SHARD)
+            self._save_registry()
+        store = self._factory(name)
+        await store.clear()
+        return name, store
+
+    async def swap(self, space: str, name: str, store: VectorStore) -> Optional[VectorStore]:
+        """Atomically make a shadow shard the live shard for space, returning the replaced one.
+
+        The caller switches its side indexes over and then passes the old
+        shard to ``retire``, so searches still reading it can finish.
+        """
+        space = space or DEFAULT_SHARD
+        async with self._lock:
+            old = self._shards.get(space)
+            self._names[space] = name
+            self._shards[space] = store
+            self._save_registry()
+        logger.info(f"Swapped in shard {name} for space {space}")
+        return old
+
+    async def retire(self, store: Optional[VectorStore]) -> None:
+        """Drop a replaced shard once in-flight searches had INDEX_SWAP_GRACE_SECONDS to finish"""
+        if store is None:
+            return
+        await asyncio.sleep(self.settings.INDEX_SWAP_GRACE_SECONDS)
+        await store.drop()
+
+    async def drop_space(self, space: str) -> Optional[VectorStore]:
+        """Remove a space from the registry, returning its shard for ``retire``"""
+        space = space or DEFAULT_SHARD
+        async with self._lock:
+            old = self._shards.pop(space, None)
+            self._names.pop(space, None)
+            self._save_registry()
+        return old
+
+    # Reads
+
+    async def search_batch(
+        self,
+        query_embeddings: List[Any],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        candidates: Optional[Set[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search only the shards the filter can match and merge their top-k lists"""
+        if len(query_embeddings) == 0:
+            return []
+        targets = self._targets(where)
+        if not targets:
+            return [[] for _ in query_embeddings]
+        if len(targets) == 1:
+            return await targets[0].search_batch(
+                query_embeddings, n_results=n_results, where=where, candidates=candidates
+            )
+
+        per_shard = await asyncio.gather(*(
+            store.search_batch(query_embeddings, n_results=n_results, where=where, candidates=candidates)
+            for store in targets
+        ))
+        # Each shard returns its hits sorted by distance, so a k-way merge of
+        # the sorted lists yields the global top-k without a full sort
+        return [
+            list(islice(heapq.merge(*(shard[q] for shard in per_shard), key=lambda doc: doc["distance"]), n_results))
+            for q in range(len(query_embeddings))
+        ]
+
+    async def get_documents(
+        self,
+        ids: List[str],
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get chunks by ID from the shards the filter can match"""
+        if not ids:
+            return []
+        per_shard = await asyncio.gather(*(
+            store.get_documents(ids, where=where, include_embeddings=include_embeddings)
+            for store in self._targets(where)
+        ))
+        order = {doc_id: i for i, doc_id in enumerate(ids)}
+        documents = [doc for shard in per_shard for doc in shard]
+        return sorted(documents, key=lambda doc: order.get(doc["id"], len(order)))
+
+    async def list_ids(self) -> List[str]:
+        per_shard = await asyncio.gather(*(store.list_ids() for store in self._shards.values()))
+        return [doc_id for shard in per_shard for doc_id in shard]
+
+    async def count(self) -> int:
+        counts = await asyncio.gather(*(store.count() for store in self._shards.values()))
+        return sum(counts)
+
+    def distance_space(self) -> str:
+        for shard in self._shards.values():
+            return shard.distance_space()
+        return self.settings.HNSW_SPACE if self.settings.VECTOR_BACKEND.lower() == "chroma" else "cosine"
+
+    def max_batch_size(self) -> int:
+        return min((store.max_batch_size() for store in self._shards.values()), default=DEFAULT_MAX_BATCH_SIZE)
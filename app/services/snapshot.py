@@ -0,0 +1,236 @@
+"""Portable index snapshots for bootstrapping query nodes without a crawl."""
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+from loguru import logger
+
+from app.core.config import Settings
+from app.services.dedup import DuplicateIndex
+from app.services.lexical import LexicalIndex
+from app.services.manifest import IndexManifest, IndexMismatchError
+from app.services.metadata_index import MetadataIndex
+from app.services.page_index import PageIndex
+from app.services.vector_store import VectorStore
+from app.services.writer import BulkWriter
+from app.utils.persistence import atomic_write_bytes
+
+SNAPSHOT_MANIFEST = "snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class SnapshotManifest:
+    """What a snapshot holds and how its index was built"""
+    embedding_model: str
+    dimension: int
+    generation: int
+    rows: int = 0
+    parts: List[Dict[str, Any]] = field(default_factory=list)
+    format: int = SNAPSHOT_FORMAT
+    created_at: str = field(default_factory=_now)
+
+    @classmethod
+    def load(cls, directory: str) -> "SnapshotManifest":
+        path = os.path.join(directory, SNAPSHOT_MANIFEST)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No snapshot at {directory}: {SNAPSHOT_MANIFEST} is missing")
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {data.get('format')} in {directory}")
+        return cls(**{key: data[key] for key in cls.__dataclass_fields__ if key in data})
+
+    def save(self, directory: str) -> None:
+        data = json.dumps(asdict(self), indent=2).encode("utf-8")
+        atomic_write_bytes(os.path.join(directory, SNAPSHOT_MANIFEST), data)
+
+
+def _pack(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate strings as UTF-8 bytes with an offsets column, like the mmap store's text file"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _write_part(path: str, batch: List[Dict[str, Any]], dimension: int) -> None:
+    ids, ids_offsets = _pack([doc["id"] for doc in batch])
+    texts, texts_offsets = _pack([doc["content"] or "" for doc in batch])
+    metadata, metadata_offsets = _pack([json.dumps(doc["metadata"] or {}) for doc in batch])
+    embeddings = np.asarray([doc["embedding"] for doc in batch], dtype=np.float32).reshape(len(batch), dimension)
+    with open(path, "wb") as f:
+        np.savez(
+            f, ids=ids, ids_offsets=ids_offsets, texts=texts, texts_offsets=texts_offsets,
+            metadata=metadata, metadata_offsets=metadata_offsets, embeddings=embeddings
+        )
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_part(path: str) -> Tuple[List[str], List[str], np.ndarray, List[Dict[str, Any]]]:
+    with np.load(path, allow_pickle=False) as part:
+        ids = _unpack(part["ids"], part["ids_offsets"])
+        texts = _unpack(part["texts"], part["texts_offsets"])
+        metadatas = [json.loads(value) for value in _unpack(part["metadata"], part["metadata_offsets"])]
+        embeddings = part["embeddings"]
+    return ids, texts, embeddings, metadatas
+
+
+async def export_snapshot(
+    vector_store: VectorStore,
+    settings: Settings,
+    path: str,
+    batch_size: Optional[int] = None
+) -> SnapshotManifest:
+    """Stream the index into a snapshot directory, one columnar npz part per scanned batch.
+
+    Each part holds the chunk IDs, texts and JSON metadata as UTF-8 bytes
+    with offset columns, plus a float32 embedding matrix, so only one batch
+    is in memory at a time. The manifest is written last: a directory
+    without one is an incomplete export and cannot be imported.
+    """
+    if os.path.isdir(path) and os.listdir(path):
+        raise FileExistsError(f"Snapshot directory {path} is not empty")
+    os.makedirs(path, exist_ok=True)
+
+    try:
+        start = time.perf_counter()
+        index_manifest = IndexManifest.load(settings.CHROMA_PERSIST_DIR)
+        snapshot = SnapshotManifest(
+            embedding_model=index_manifest.embedding_model if index_manifest else settings.EMBEDDING_MODEL,
+            dimension=index_manifest.dimension if index_manifest else 0,
+            generation=index_manifest.generation if index_manifest else 0
+        )
+
+        async for batch in vector_store.scan(batch_size, include_embeddings=True):
+            dimension = len(batch[0]["embedding"])
+            if snapshot.dimension and dimension != snapshot.dimension:
+                raise IndexMismatchError(
+                    f"Index has {dimension}-dimensional embeddings but its manifest says {snapshot.dimension}"
+                )
+            snapshot.dimension = dimension
+
+            name = f"part-{len(snapshot.parts):05d}.npz"
+            await asyncio.to_thread(_write_part, os.path.join(path, name), batch, dimension)
+            snapshot.parts.append({"file": name, "rows": len(batch)})
+            snapshot.rows += len(batch)
+
+        snapshot.save(path)
+        logger.info(
+            f"Exported snapshot of {snapshot.rows} chunks in {len(snapshot.parts)} parts to {path} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return snapshot
+
+    except Exception as e:
+        logger.error(f"Error exporting snapshot: {str(e)}")
+        raise
+
+
+async def import_snapshot(vector_store: VectorStore, settings: Settings, path: str) -> SnapshotManifest:
+    """Replace the index with a snapshot and rebuild the side indexes from it.
+
+    Embeddings are written as stored, so neither Confluence nor the
+    embedding model is needed. The next part is read in a worker thread
+    while the current one is written. Meant for nodes that are not serving
+    yet; searches running during an import see a partial index. Page
+    vectors are pooled from the chunk embeddings alone, as titles were
+    never embedded on their own.
+    """
+    try:
+        start = time.perf_counter()
+        snapshot = SnapshotManifest.load(path)
+        if snapshot.embedding_model != settings.EMBEDDING_MODEL:
+            raise IndexMismatchError(
+                f"Snapshot was built with {snapshot.embedding_model} but EMBEDDING_MODEL is "
+                f"{settings.EMBEDDING_MODEL}; set EMBEDDING_MODEL to match or export a new snapshot"
+            )
+
+        metadata_index = MetadataIndex()
+        metadata_index.path = os.path.join(settings.CHROMA_PERSIST_DIR, settings.METADATA_INDEX_FILE)
+        lexical = None
+        if settings.HYBRID_SEARCH:
+            lexical = LexicalIndex()
+            lexical.path = os.path.join(settings.CHROMA_PERSIST_DIR, settings.LEXICAL_INDEX_FILE)
+        dedup = None
+        if settings.DEDUP_ENABLED:
+            # Signatures are not part of a snapshot: the imported rows keep their duplicate
+            # groups for collapsing results, and new copies of them are embedded again
+            dedup = DuplicateIndex(
+                threshold=settings.DEDUP_THRESHOLD,
+                num_perm=settings.DEDUP_NUM_PERM,
+                shingle_size=settings.DEDUP_SHINGLE_SIZE
+            )
+            dedup.path = os.path.join(settings.CHROMA_PERSIST_DIR, settings.DEDUP_INDEX_FILE)
+        pages = None
+        page_sums: Dict[str, np.ndarray] = {}
+        if settings.HIERARCHICAL_SEARCH:
+            pages = PageIndex()
+            pages.path = os.path.join(settings.CHROMA_PERSIST_DIR, settings.PAGE_INDEX_FILE)
+
+        def on_flush(ids: List[str], chunks: List[str], metadatas: List[Dict[str, Any]]) -> None:
+            metadata_index.add(ids, metadatas)
+            if lexical is not None:
+                lexical.add(ids, chunks)
+
+        await vector_store.clear()
+        files = [os.path.join(path, part["file"]) for part in snapshot.parts]
+        pending = asyncio.ensure_future(asyncio.to_thread(_read_part, files[0])) if files else None
+        async with BulkWriter(vector_store, settings, on_flush=on_flush) as writer:
+            for i, part in enumerate(snapshot.parts):
+                ids, texts, embeddings, metadatas = await pending
+                if i + 1 < len(files):
+                    pending = asyncio.ensure_future(asyncio.to_thread(_read_part, files[i + 1]))
+                if len(ids) != part["rows"] or embeddings.shape[1:] != (snapshot.dimension,):
+                    raise ValueError(f"Snapshot part {part['file']} does not match the manifest")
+                await writer.put_many(ids, texts, embeddings, metadatas)
+                if pages is not None:
+                    # Sum of normalised chunk vectors per page; PageIndex normalises it into their mean direction
+                    normalized = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+                    for vector, metadata in zip(normalized, metadatas):
+                        page_id = metadata.get("page_id")
+                        if page_id:
+                            page_sums[page_id] = page_sums.get(page_id, 0.0) + vector
+
+        metadata_index.save()
+        if lexical is not None:
+            lexical.save()
+        if dedup is not None:
+            dedup.save()
+        if pages is not None:
+            for page_id, total in page_sums.items():
+                pages.add(page_id, total)
+            pages.save()
+        # An empty snapshot has no dimension; open_index writes the manifest from the model instead
+        if snapshot.dimension:
+            IndexManifest(
+                embedding_model=snapshot.embedding_model,
+                dimension=snapshot.dimension,
+                backend=settings.VECTOR_BACKEND,
+                generation=snapshot.generation
+            ).save(settings.CHROMA_PERSIST_DIR)
+
+        logger.info(
+            f"Imported snapshot of {snapshot.rows} chunks (generation {snapshot.generation}) from {path} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return snapshot
+
+    except Exception as e:
+        logger.error(f"Error importing snapshot: {str(e)}")
+        raise
@@ -0,0 +1,206 @@
+"""Vector store interface shared by the ChromaDB and memory-mapped backends."""
+from abc import ABC, abstractmethod
+import json
+import os
+from typing import List, Dict, Any, Optional, Set, AsyncIterator
+
+import numpy as np
+
+from app.core.config import Settings
+from app.utils.persistence import atomic_write_bytes
+
+DEFAULT_MAX_BATCH_SIZE = 4096
+
+# Names the live collection or index directory after a blue/green rebuild
+ACTIVE_INDEX_FILE = "active_index.json"
+
+
+class VectorStore(ABC):
+    """Stores chunk embeddings with their text and metadata and searches them"""
+
+    @abstractmethod
+    async def add_documents(
+        self,
+        documents: List[str],
+        ids: List[str],
+        embeddings: Any,
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Insert or replace chunks with precomputed embeddings"""
+
+    @abstractmethod
+    async def search_batch(
+        self,
+        query_embeddings: List[Any],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        candidates: Optional[Set[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Return the nearest chunks for each query embedding, in query order.
+
+        ``candidates``, resolved from the metadata index, holds every chunk
+        ``where`` matches; backends that cannot filter metadata themselves
+        search only those.
+        """
+
+    async def search(
+        self,
+        query_embedding: Any,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        candidates: Optional[Set[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the nearest chunks for one query embedding"""
+        results = await self.search_batch(
+            [query_embedding], n_results=n_results, where=where, candidates=candidates
+        )
+        return results[0]
+
+    @abstractmethod
+    async def get_documents(
+        self,
+        ids: List[str],
+        where: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get chunks by ID, optionally restricted by a metadata filter"""
+
+    async def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single chunk by ID"""
+        documents = await self.get_documents([doc_id])
+        return documents[0] if documents else None
+
+    @abstractmethod
+    async def list_ids(self) -> List[str]:
+        """IDs of every stored chunk"""
+
+    async def scan(self, batch_size: Optional[int] = None, include_embeddings: bool = False) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield every stored chunk in batches, skipping chunks deleted while scanning"""
+        batch_size = batch_size or self.max_batch_size()
+        ids = await self.list_ids()
+        for start in range(0, len(ids), batch_size):
+            documents = await self.get_documents(ids[start:start + batch_size], include_embeddings=include_embeddings)
+            if documents:
+                yield documents
+
+    @abstractmethod
+    async def delete_documents(self, ids: List[str]) -> None:
+        """Delete chunks by ID"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of stored chunks"""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Remove every chunk"""
+
+    async def drop(self) -> None:
+        """Remove the store and its storage entirely"""
+        await self.clear()
+
+    def max_batch_size(self) -> int:
+        """Largest number of rows the backend accepts in one add_documents call"""
+        return DEFAULT_MAX_BATCH_SIZE
+
+    def distance_space(self) -> str:
+        """Metric of the distances search returns: cosine, l2 (squared) or ip"""
+        return "cosine"
+
+
+def create_vector_store(settings: Settings) -> VectorStore:
+    """Create the vector store selected by VECTOR_BACKEND, split per space if SHARD_BY_SPACE"""
+    if settings.SHARD_BY_SPACE:
+        from app.services.sharding import ShardedVectorStore
+        return ShardedVectorStore(settings, lambda name: create_backend(settings, name))
+    return create_backend(settings, read_active_index(settings))
+
+
+def create_backend(settings: Settings, name: Optional[str] = None) -> VectorStore:
+    """Create one backend store, optionally a named collection or index directory beside the default"""
+    backend = settings.VECTOR_BACKEND.lower()
+    if backend == "chroma":
+        from app.services.chromadb import ChromaDBService
+        collection_name = settings.CHROMA_COLLECTION_NAME if name is None else f"{settings.CHROMA_COLLECTION_NAME}-{name}"
+        return ChromaDBService(settings, collection_name=collection_name)
+    if backend == "mmap":
+        from app.services.mmap_store import MmapVectorStore
+        path = settings.MMAP_INDEX_DIR if name is None else f"{settings.MMAP_INDEX_DIR.rstrip(os.sep)}-{name}"
+        return MmapVectorStore(settings, path=path, read_only=settings.READ_ONLY)
+    raise ValueError(f"Unknown vector backend: {settings.VECTOR_BACKEND}")
+
+
+def read_active_index(settings: Settings) -> Optional[str]:
+    """Name of the live backend store, or None for the default collection"""
+    path = os.path.join(settings.CHROMA_PERSIST_DIR, ACTIVE_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("name")
+
+
+def write_active_index(settings: Settings, name: Optional[str]) -> None:
+    """Atomically point new vector store instances at another backend store"""
+    data = json.dumps({"name": name}).encode("utf-8")
+    atomic_write_bytes(os.path.join(settings.CHROMA_PERSIST_DIR, ACTIVE_INDEX_FILE), data)
+
+
+def distances(query_embeddings: Any, embeddings: Any, space: str = "cosine") -> np.ndarray:
+    """Distance of each embedding to each query in a store's metric, as its search reports them"""
+    queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    if space == "l2":
+        # ChromaDB's l2 is the squared Euclidean distance
+        return np.maximum(
+            (queries ** 2).sum(axis=1)[:, None] + (matrix ** 2).sum(axis=1)[None, :] - 2.0 * queries @ matrix.T, 0.0
+        )
+    if space == "ip":
+        return 1.0 - queries @ matrix.T
+    if space != "cosine":
+        raise ValueError(f"Unknown distance space: {space}")
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return 1.0 - queries @ matrix.T
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a ChromaDB-style where clause against one metadata dict"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if not _compare(op, value, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(op: str, value: Any, operand: Any) -> bool:
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported where operator: {op}")
@@ -0,0 +1,190 @@
+"""Batched, pipelined writes of embedded chunks into a vector store."""
+from typing import List, Dict, Any, Optional, Callable, Set
+from dataclasses import dataclass, field
+import asyncio
+import time
+
+from loguru import logger
+
+from app.core.config import Settings
+from app.core.metrics import registry
+from app.services.vector_store import VectorStore
+
+WRITE_ROWS = registry.counter("ingest_rows_written_total", "Chunks written to the vector store")
+WRITE_BATCHES = registry.counter("ingest_write_batches_total", "Vector store write batches by outcome")
+WRITE_LATENCY = registry.histogram("ingest_write_batch_seconds", "Time to write one batch to the vector store")
+WRITE_THROUGHPUT = registry.gauge("ingest_rows_per_second", "Write throughput of the last completed bulk write")
+WRITE_IN_FLIGHT = registry.gauge("ingest_write_batches_in_flight", "Vector store write batches queued or being written")
+
+FlushCallback = Callable[[List[str], List[str], List[Dict[str, Any]]], None]
+
+
+class BulkWriteError(RuntimeError):
+    """One or more batches could not be written after retrying"""
+
+    def __init__(self, message: str, failed_ids: List[str]):
+        super().__init__(message)
+        self.failed_ids = failed_ids
+
+
+@dataclass
+class WriteStats:
+    """Counters for one bulk write"""
+    rows: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class _Batch:
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    embeddings: List[Any] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class BulkWriter:
+    """Buffers chunk records and flushes them in backend-sized batches.
+
+    Up to ``max_in_flight`` batches are written concurrently while the caller
+    keeps producing records, so embedding and writing overlap. Each batch is
+    retried on its own with exponential backoff; batches that still fail are
+    reported together when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        settings: Optional[Settings] = None,
+        on_flush: Optional[FlushCallback] = None,
+        retry_backoff: float = 0.5
+    ):
+        settings = settings or Settings()
+        self.store = store
+        self.batch_size = store.max_batch_size()
+        if settings.WRITE_BATCH_SIZE > 0:
+            self.batch_size = min(settings.WRITE_BATCH_SIZE, self.batch_size)
+        self.max_retries = max(1, settings.WRITE_MAX_RETRIES)
+        self.retry_backoff = retry_backoff
+        self.on_flush = on_flush
+        self.stats = WriteStats()
+
+        self._buffer = _Batch()
+        self._slots = asyncio.Semaphore(max(1, settings.WRITE_MAX_IN_FLIGHT))
+        self._tasks: Set[asyncio.Task] = set()
+        self._failed_ids: List[str] = []
+        self._started = time.perf_counter()
+
+    async def __aenter__(self) -> "BulkWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.close()
+        else:
+            # Let batches already handed to the store finish, but keep the original error
+            await self._drain()
+
+    async def put(self, chunk_id: str, document: str, embedding: Any, metadata: Dict[str, Any]) -> None:
+        """Queue one record, flushing when a full batch is buffered"""
+        self._buffer.ids.append(chunk_id)
+        self._buffer.documents.append(document)
+        self._buffer.embeddings.append(embedding)
+        self._buffer.metadatas.append(metadata)
+        if len(self._buffer) >= self.batch_size:
+            await self._schedule()
+
+    async def put_many(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Any,
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        """Queue several records"""
+        for record in zip(ids, documents, embeddings, metadatas):
+            await self.put(*record)
+
+    async def flush(self) -> None:
+        """Write everything buffered so far and wait for in-flight batches"""
+        if len(self._buffer):
+            await self._schedule()
+        await self._drain()
+
+    async def close(self) -> WriteStats:
+        """Flush remaining records and raise BulkWriteError if any batch was lost"""
+        await self.flush()
+        self.stats.seconds = time.perf_counter() - self._started
+        WRITE_THROUGHPUT.set(self.stats.rows_per_sec)
+        logger.info(
+            f"Wrote {self.stats.rows} chunks in {self.stats.batches} batches "
+            f"({self.stats.rows_per_sec:.0f} rows/sec, {self.stats.retries} retries)"
+        )
+        if self._failed_ids:
+            raise BulkWriteError(
+                f"{self.stats.failed_batches} batches ({len(self._failed_ids)} chunks) failed after "
+                f"{self.max_retries} attempts",
+                self._failed_ids
+            )
+        return self.stats
+
+    async def _schedule(self) -> None:
+        """Hand the buffer to a background write, waiting while too many are in flight"""
+        batch, self._buffer = self._buffer, _Batch()
+        WRITE_IN_FLIGHT.inc()
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            WRITE_IN_FLIGHT.dec()
+            raise
+        task = asyncio.create_task(self._write(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    async def _write(self, batch: _Batch) -> None:
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    with WRITE_LATENCY.time():
+                        await self.store.add_documents(
+                            ids=batch.ids,
+                            documents=batch.documents,
+                            embeddings=batch.embeddings,
+                            metadatas=batch.metadatas
+                        )
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Giving up on batch of {len(batch)} chunks: {str(e)}")
+                        self.stats.failed_batches += 1
+                        self._failed_ids.extend(batch.ids)
+                        WRITE_BATCHES.inc(outcome="failed")
+                        return
+                    self.stats.retries += 1
+                    WRITE_BATCHES.inc(outcome="retried")
+                    delay = self.retry_backoff * 2 ** (attempt - 1)
+                    logger.warning(f"Batch write failed ({str(e)}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+            self.stats.rows += len(batch)
+            self.stats.batches += 1
+            WRITE_ROWS.inc(len(batch))
+            WRITE_BATCHES.inc(outcome="written")
+            if self.on_flush is not None:
+                self.on_flush(batch.ids, batch.documents, batch.metadatas)
+        finally:
+            WRITE_IN_FLIGHT.dec()
+            self._slots.release()
@@ -0,0 +1,106 @@
+"""Helpers for persisting index files next to the vector store."""
+from typing import Any, Dict, List, Tuple
+import json
+import os
+import tempfile
+
+# Times a reader retries when the writer replaces a snapshot under it
+_READ_ATTEMPTS = 5
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Write data to path so readers only ever see the old or the new file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SnapshotLog:
+    """A JSON snapshot of an index plus a JSON lines log of the changes made since.
+
+    A save appends only the changes since the previous one; once the log
+    has outgrown the snapshot, the next save writes a fresh snapshot and
+    starts an empty log. Both carry an epoch, so a log left behind by an
+    older snapshot is never replayed over a newer one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.epoch = 0
+        self._snapshot_size = 0
+        self._log_size = 0
+
+    @property
+    def compaction_due(self) -> bool:
+        return self._log_size > self._snapshot_size
+
+    def read(self) -> Tuple[Dict[str, Any], List[Any]]:
+        """The snapshot state and the changes logged after it"""
+        for _ in range(_READ_ATTEMPTS):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            state = json.loads(data)
+            epoch = state.get("epoch", 0)
+            log_epoch, changes, log_size = self._read_log()
+            if log_epoch > epoch:
+                # The writer replaced the snapshot while it was being read
+                continue
+            self.epoch, self._snapshot_size = epoch, len(data)
+            if log_epoch < epoch:
+                # Left behind by a writer stopped between the snapshot and its new log
+                changes, log_size = [], 0
+            self._log_size = log_size
+            return state, changes
+        raise RuntimeError(f"{self.path} kept changing while it was read")
+
+    def _read_log(self) -> Tuple[int, List[Any], int]:
+        if not os.path.exists(self.log_path):
+            return -1, [], 0
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        # Only newline-terminated lines are complete; a write in progress may follow
+        lines = data.split(b"\n")[:-1]
+        if not lines:
+            return -1, [], len(data)
+        return json.loads(lines[0])["epoch"], [json.loads(line) for line in lines[1:]], len(data)
+
+    def append(self, changes: List[Any]) -> None:
+        """Log changes made since the last save"""
+        data = b"".join(_json_line(change) for change in changes)
+        with open(self.log_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_size += len(data)
+
+    def write(self, state: Dict[str, Any]) -> None:
+        """Replace the snapshot and start an empty log"""
+        self.epoch = max(self.epoch, self._read_log_epoch()) + 1
+        data = json.dumps({**state, "epoch": self.epoch}, separators=(",", ":")).encode("utf-8")
+        atomic_write_bytes(self.path, data)
+        header = _json_line({"epoch": self.epoch})
+        atomic_write_bytes(self.log_path, header)
+        self._snapshot_size, self._log_size = len(data), len(header)
+
+    def _read_log_epoch(self) -> int:
+        if not os.path.exists(self.log_path):
+            return 0
+        with open(self.log_path, "rb") as f:
+            line = f.readline()
+        return json.loads(line)["epoch"] if line.endswith(b"\n") else 0
+
+
+def _json_line(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8") + b"\n"
@@ -0,0 +1,188 @@
+"""Cold-start benchmarks for the stdio MCP server.
+
+Measures, each in a fresh interpreter:
+
+- import: ``import app.main``, and which heavy modules it pulled in
+- initialize: spawn ``python -m app.main`` and time the first answer to an
+  ``initialize`` request, which must not wait for the models
+- first_context: time from spawn to the first answer to a ``context``
+  request, which waits for the models to load and warm up
+
+The server runs against an empty temporary index in a temporary working
+directory, with the initial crawl off and Hugging Face offline. Without the
+embedding model in the cache the first context request reports the load
+error instead, which is still timed. Results are printed (and written with
+--output) as JSON; --baseline compares against an earlier result file.
+
+    python -m benchmarks.bench_cold_start --runs 5 --output cold.json
+"""
+import argparse
+import json
+import os
+import platform
+import selectors
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.bench_pipeline import compare, _git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "chromadb", "atlassian", "bs4")
+
+
+def _env(workdir: str, backend: str):
+    env = dict(os.environ)
+    env.update(
+        PYTHONPATH=os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")])),
+        HF_HUB_OFFLINE="1",
+        INITIAL_CRAWL="false",
+        RERANK_ENABLED="false",
+        VECTOR_BACKEND=backend,
+        CHROMA_PERSIST_DIR=os.path.join(workdir, "chroma"),
+        MMAP_INDEX_DIR=os.path.join(workdir, "mmap"),
+    )
+    return env
+
+
+def bench_import(workdir: str, backend: str):
+    code = (
+        "import sys, time, json; start = time.perf_counter(); import app.main; "
+        "print(json.dumps({'seconds': time.perf_counter() - start, "
+        f"'heavy_modules': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=workdir, env=_env(workdir, backend),
+        capture_output=True, text=True, check=True
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    measured["process_seconds"] = time.perf_counter() - start
+    return measured
+
+
+def _read_response(process, request_id, deadline: float):
+    """Next JSON-RPC response with the given id from the server's stdout"""
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ)
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not selector.select(remaining):
+                raise TimeoutError(f"No response to request {request_id}")
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("Server exited before answering")
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("id") == request_id:
+                return message
+    finally:
+        selector.close()
+
+
+def bench_first_response(workdir: str, backend: str, timeout: float):
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.main"], cwd=workdir, env=_env(workdir, backend),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1
+    )
+    deadline = start + timeout
+    try:
+        process.stdin.write(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "initialize"}) + "\n")
+        process.stdin.write(json.dumps({
+            "jsonrpc": "2.0", "id": 2, "method": "context",
+            "params": {"messages": [], "query": "how do I deploy a release"}
+        }) + "\n")
+        process.stdin.flush()
+
+        initialize = _read_response(process, 1, deadline)
+        initialize_seconds = time.perf_counter() - start
+        context = _read_response(process, 2, deadline)
+        context_seconds = time.perf_counter() - start
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return {
+        "initialize_seconds": initialize_seconds,
+        "ready_at_initialize": initialize["result"]["ready"],
+        "first_context_seconds": context_seconds,
+        "first_context_error": context.get("error", {}).get("message"),
+    }
+
+
+def _summary(values):
+    values = np.asarray(values, dtype=float)
+    return {"min": float(values.min()), "p50": float(np.percentile(values, 50)), "max": float(values.max())}
+
+
+def run(args):
+    imports, responses = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            imports.append(bench_import(workdir, args.backend))
+        with tempfile.TemporaryDirectory() as workdir:
+            responses.append(bench_first_response(workdir, args.backend, args.timeout))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "import": {
+            "seconds": _summary([run["seconds"] for run in imports]),
+            "process_seconds": _summary([run["process_seconds"] for run in imports]),
+            "heavy_modules": imports[-1]["heavy_modules"],
+        },
+        "initialize": {
+            "seconds": _summary([run["initialize_seconds"] for run in responses]),
+            "ready": responses[-1]["ready_at_initialize"],
+        },
+        "first_context": {
+            "seconds": _summary([run["first_context_seconds"] for run in responses]),
+            "error": responses[-1]["first_context_error"],
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes timed for each measurement")
+    parser.add_argument("--backend", choices=("chroma", "mmap"), default="chroma")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for the first context answer")
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["change_vs_baseline"] = {
+            name: round(change, 4)
+            for name, change in compare(baseline, report).items()
+            if not name.startswith("meta.")
+        }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
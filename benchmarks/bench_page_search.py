@@ -0,0 +1,137 @@
+"""Compare hierarchical (page first) search with flat chunk search.
+
+Generates a seeded synthetic corpus of pages whose chunk embeddings cluster
+around a per-page topic, loads it into each backend with the application's
+page and metadata indexes, and times RAGService.search with the page stage
+on and off. Reports single-query p50/p99 latency and recall@k against exact
+search over every chunk.
+
+    python -m benchmarks.bench_page_search --pages 2000 --backends chroma,mmap
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import Settings
+
+
+class QueryModel:
+    """Encoder returning the preset embedding of queries named ``q<index>``"""
+
+    def __init__(self, queries: np.ndarray):
+        self.queries = queries
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.queries.shape[1]
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        return self.queries[[int(text[1:]) for text in texts]]
+
+
+def make_corpus(pages: int, chunks_per_page: float, dim: int, queries: int, seed: int):
+    """Chunks scattered around their page's topic, topics around a few shared themes"""
+    rng = np.random.default_rng(seed)
+    themes = rng.normal(size=(max(pages // 20, 1), dim)).astype(np.float32)
+    topics = themes[rng.integers(0, len(themes), size=pages)] + 0.5 * rng.normal(size=(pages, dim)).astype(np.float32)
+    sizes = np.maximum(rng.poisson(chunks_per_page, size=pages), 1)
+    page_of = np.repeat(np.arange(pages), sizes)
+    vectors = topics[page_of] + 0.4 * rng.normal(size=(len(page_of), dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = vectors[rng.integers(0, len(vectors), size=queries)] + 0.1 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, page_of, query_vectors.astype(np.float32)
+
+
+async def load(rag, vectors: np.ndarray, page_of: np.ndarray, write_batch: int) -> None:
+    """Write chunks to the store and fill the side indexes the way ingest does"""
+    from app.services.metadata_index import normalize_metadata
+    from app.services.page_index import page_vector
+
+    ids = [f"{page}_{i}" for i, page in enumerate(page_of)]
+    metadatas = [normalize_metadata({"page_id": str(page), "space_key": "BENCH"}) for page in page_of]
+    for start in range(0, len(ids), write_batch):
+        end = start + write_batch
+        await rag.vector_store.add_documents(
+            [f"chunk {doc_id}" for doc_id in ids[start:end]], ids[start:end], vectors[start:end], metadatas[start:end]
+        )
+        rag.metadata_index.add(ids[start:end], metadatas[start:end])
+    bounds = np.flatnonzero(np.diff(page_of)) + 1
+    for page, rows in enumerate(np.split(np.arange(len(page_of)), bounds)):
+        rag.pages.add(str(page), page_vector(vectors[rows]))
+
+
+async def run_mode(rag, queries: int, truth: np.ndarray, ids: np.ndarray, k: int):
+    await rag.search("q0", n_results=k)
+    latencies, hits = [], 0
+    for q in range(queries):
+        start = time.perf_counter()
+        results = await rag.search(f"q{q}", n_results=k)
+        latencies.append(time.perf_counter() - start)
+        hits += len({doc["id"] for doc in results} & set(ids[truth[q]]))
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        f"recall@{k}": round(hits / (queries * k), 4),
+    }
+
+
+async def run_backend(backend: str, args, vectors, page_of, query_vectors, truth):
+    from app.services.rag import RAGService
+    from app.services.vector_store import create_vector_store
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(
+            VECTOR_BACKEND=backend,
+            CHROMA_PERSIST_DIR=f"{tmp}/state",
+            MMAP_INDEX_DIR=f"{tmp}/mmap",
+            HYBRID_SEARCH=False,
+            DEDUP_ENABLED=False,
+            HIERARCHICAL_SEARCH=True,
+            HIERARCHICAL_TOP_PAGES=args.top_pages,
+            _env_file=None
+        )
+        rag = RAGService(create_vector_store(settings), settings, model=QueryModel(query_vectors))
+        start = time.perf_counter()
+        await load(rag, vectors, page_of, args.write_batch)
+        load_seconds = time.perf_counter() - start
+
+        ids = np.array([f"{page}_{i}" for i, page in enumerate(page_of)], dtype=object)
+        pages = rag.pages
+        result = {"load_seconds": round(load_seconds, 2), "pages": await run_mode(rag, args.queries, truth, ids, args.k)}
+        rag.pages = None
+        result["flat"] = await run_mode(rag, args.queries, truth, ids, args.k)
+        rag.pages = pages
+        return result
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--chunks-per-page", type=float, default=10.0)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--top-pages", type=int, default=50)
+    parser.add_argument("--write-batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", default="chroma,mmap")
+    args = parser.parse_args(argv)
+
+    vectors, page_of, query_vectors = make_corpus(args.pages, args.chunks_per_page, args.dim, args.queries, args.seed)
+    truth = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :args.k]
+
+    report = {"pages": args.pages, "chunks": len(vectors), "dim": args.dim, "top_pages": args.top_pages}
+    for backend in args.backends.split(","):
+        report[backend] = await run_backend(backend, args, vectors, page_of, query_vectors, truth)
+        print(f"{backend}: {json.dumps(report[backend])}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
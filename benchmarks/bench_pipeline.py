@@ -0,0 +1,329 @@
+"""End-to-end pipeline benchmarks against the fake Confluence server.
+
+Generates a seeded corpus, serves it from benchmarks.fake_confluence and
+measures each stage of the pipeline with the application's own code:
+
+- crawl: ConfluenceService.crawl over HTTP, pages/sec
+- clean_html: ConfluenceService._clean_html over every page body, MB/s
+- chunk_text: RAGService._chunk_text over the cleaned text, MB/s and chunks/sec
+- embedding: model.encode over every chunk, chunks/sec
+- ingest: RAGService.ingest_documents into a fresh index, end to end
+- context: POST /mcp/context through the ASGI app in-process, p50/p99
+
+Results are printed (and written with --output) as JSON; pass --baseline
+with an earlier result file to print the relative change of every metric.
+Everything runs offline on CPU. The embedding model must already be in the
+Hugging Face cache; --hash-embedder swaps in a deterministic hashing
+embedder to benchmark the rest of the pipeline on machines without it.
+
+    python -m benchmarks.bench_pipeline --pages 1000 --latency-ms 5 --output results.json
+    python -m benchmarks.bench_pipeline --hash-embedder --baseline results.json
+"""
+import os
+
+# Never reach for the network, even to check for model updates
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.core.config import Settings
+from benchmarks.fake_confluence import CorpusConfig, FakeConfluence, generate_corpus
+
+SECTIONS = ("crawl", "clean_html", "chunk_text", "embedding", "ingest", "context")
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words embedder with the SentenceTransformer encode interface"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        vectors = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            for token in text.lower().split():
+                bucket = zlib.crc32(token.encode())
+                vectors[row, bucket % self.dim] += 1.0 if bucket & 1 << 31 else -1.0
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+
+def _rate(amount: float, seconds: float) -> float:
+    return amount / seconds if seconds else 0.0
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _best_of(repeat: int, fn):
+    """Fastest of several runs, with the result of the last one"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+async def bench_crawl(settings: Settings, fake: FakeConfluence):
+    from app.services.confluence import ConfluenceService
+
+    confluence = ConfluenceService(settings)
+    fake.requests.clear()
+    start = time.perf_counter()
+    documents = await confluence.crawl()
+    seconds = time.perf_counter() - start
+    return documents, {
+        "pages": len(documents),
+        "seconds": seconds,
+        "pages_per_sec": _rate(len(documents), seconds),
+        "requests": sum(fake.requests.values()),
+        "requests_per_sec": _rate(sum(fake.requests.values()), seconds),
+    }
+
+
+def bench_clean_html(settings: Settings, corpus, repeat: int):
+    from app.services.confluence import ConfluenceService
+
+    confluence = ConfluenceService(settings)
+    bodies = [page["body"]["storage"]["value"] for page in corpus.pages.values()]
+    megabytes = sum(len(body.encode()) for body in bodies) / 1e6
+    seconds, _ = _best_of(repeat, lambda: [confluence._clean_html(body) for body in bodies])
+    return {"pages": len(bodies), "mb": megabytes, "seconds": seconds, "mb_per_sec": _rate(megabytes, seconds)}
+
+
+def bench_chunk_text(rag, documents, repeat: int):
+    texts = [doc["content"] for doc in documents]
+    megabytes = sum(len(text.encode()) for text in texts) / 1e6
+    seconds, chunked = _best_of(repeat, lambda: [rag._chunk_text(text) for text in texts])
+    chunks = [chunk for doc_chunks in chunked for chunk in doc_chunks]
+    return chunks, {
+        "mb": megabytes,
+        "chunks": len(chunks),
+        "seconds": seconds,
+        "mb_per_sec": _rate(megabytes, seconds),
+        "chunks_per_sec": _rate(len(chunks), seconds),
+    }
+
+
+def bench_embedding(model, chunks, batch_size: int):
+    model.encode(chunks[:batch_size], batch_size=batch_size)  # warm up
+    start = time.perf_counter()
+    model.encode(chunks, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    return {"chunks": len(chunks), "batch_size": batch_size, "seconds": seconds, "chunks_per_sec": _rate(len(chunks), seconds)}
+
+
+async def bench_ingest(rag, documents):
+    from app.services.progress import CrawlProgress
+
+    progress = CrawlProgress()
+    start = time.perf_counter()
+    await rag.ingest_documents(documents, progress)
+    seconds = time.perf_counter() - start
+    return {
+        "documents": len(documents),
+        "chunks": progress.rows_written,
+        "seconds": seconds,
+        "chunks_per_sec": _rate(progress.rows_written, seconds),
+        "embed_seconds": progress.timings.get("embed", 0.0),
+        "chunk_seconds": progress.timings.get("chunk", 0.0),
+    }
+
+
+async def bench_context(services, corpus, requests: int, seed: int):
+    import httpx
+    from app.main import app, install_services
+
+    install_services(services)
+    rng = np.random.default_rng(seed)
+    titles = [page["title"] for page in corpus.pages.values()]
+    queries = [titles[i] for i in rng.integers(0, len(titles), size=requests)]
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for query in queries[:min(10, requests)]:
+            await client.post("/mcp/context", json={"messages": [], "query": query})
+        start = time.perf_counter()
+        for query in queries:
+            request_start = time.perf_counter()
+            response = await client.post("/mcp/context", json={"messages": [], "query": query})
+            latencies.append(time.perf_counter() - request_start)
+            response.raise_for_status()
+        seconds = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "mean_ms": float(latencies_ms.mean()),
+        "requests_per_sec": _rate(requests, seconds),
+    }
+
+
+def compare(baseline, current, prefix=""):
+    """Relative change of every numeric metric present in both result sets"""
+    changes = {}
+    for key, value in current.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            changes.update(compare(old or {}, value, f"{name}."))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            changes[name] = (value - old) / old
+    return changes
+
+
+async def run(args):
+    from app.services.container import Services
+    from app.services.context import ContextPacker
+    from app.services.confluence import ConfluenceService
+    from app.services.jobs import JobManager
+    from app.services.maintenance import IndexMaintenance
+    from app.services.rag import RAGService
+    from app.services.vector_store import create_vector_store
+
+    sections = set(args.sections.split(",")) if args.sections else set(SECTIONS)
+    config = CorpusConfig(
+        spaces=args.spaces, pages=args.pages, median_words=args.median_words,
+        comments_per_page=args.comments, attachments_per_page=args.attachments, seed=args.seed
+    )
+    corpus = generate_corpus(config)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedder": "hash" if args.hash_embedder else None,
+            "args": vars(args),
+        },
+        "corpus": {
+            "pages": len(corpus.pages),
+            "spaces": len(corpus.spaces),
+            "html_mb": corpus.html_bytes / 1e6,
+            "comments": sum(len(c) for c in corpus.comments.values()),
+            "attachments": sum(len(a) for a in corpus.attachments.values()),
+        },
+    }
+
+    with tempfile.TemporaryDirectory() as index_dir, FakeConfluence(
+        corpus, args.latency_ms / 1000, args.jitter_ms / 1000, seed=args.seed
+    ) as fake:
+        settings = Settings(
+            _env_file=None,
+            CONFLUENCE_BASE_URL=fake.url,
+            CONFLUENCE_TOKEN="bench",
+            CONFLUENCE_SPACE_KEY=None,
+            MAX_PAGES=args.pages,
+            CHROMA_PERSIST_DIR=index_dir,
+            MMAP_INDEX_DIR=os.path.join(index_dir, "mmap"),
+            VECTOR_BACKEND=args.backend,
+            INITIAL_CRAWL=False,
+            RERANK_ENABLED=False,
+        )
+        model = HashEmbedder() if args.hash_embedder else None
+        vector_store = create_vector_store(settings)
+        rag = RAGService(vector_store, settings, model=model)
+        if report["meta"]["embedder"] is None:
+            report["meta"]["embedder"] = settings.EMBEDDING_MODEL
+
+        # The crawl always runs: later stages work on its documents
+        documents, crawl = await bench_crawl(settings, fake)
+        if "crawl" in sections:
+            report["crawl"] = crawl
+        if "clean_html" in sections:
+            report["clean_html"] = bench_clean_html(settings, corpus, args.repeat)
+        chunks, chunk_text = bench_chunk_text(rag, documents, args.repeat)
+        if "chunk_text" in sections:
+            report["chunk_text"] = chunk_text
+        if "embedding" in sections:
+            report["embedding"] = bench_embedding(rag.model, chunks, args.batch_size)
+        if "ingest" in sections or "context" in sections:
+            ingest = await bench_ingest(rag, documents)
+            if "ingest" in sections:
+                report["ingest"] = ingest
+        if "context" in sections:
+            confluence = ConfluenceService(settings)
+            services = Services(
+                settings=settings,
+                confluence=confluence,
+                vector_store=vector_store,
+                rag=rag,
+                rerank=None,
+                maintenance=IndexMaintenance(rag, settings),
+                packer=ContextPacker(settings),
+                jobs=JobManager(confluence, rag, settings),
+            )
+            report["context"] = await bench_context(services, corpus, args.requests, args.seed)
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--spaces", type=int, default=2)
+    parser.add_argument("--median-words", type=int, default=400)
+    parser.add_argument("--comments", type=float, default=1.5, help="Mean comments per page")
+    parser.add_argument("--attachments", type=float, default=0.5, help="Mean attachments per page")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every fake Confluence response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--backend", choices=("chroma", "mmap"), default="chroma")
+    parser.add_argument("--batch-size", type=int, default=32, help="Embedding batch size")
+    parser.add_argument("--requests", type=int, default=200, help="Context requests timed")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the CPU-bound stages; the fastest counts")
+    parser.add_argument("--sections", help=f"Comma-separated subset of {','.join(SECTIONS)}")
+    parser.add_argument("--hash-embedder", action="store_true", help="Use a hashing embedder instead of the model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this file")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    from loguru import logger
+    report = asyncio.run(run(args))
+    # Application logs would drown the report
+    logger.remove()
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["change_vs_baseline"] = {
+            name: round(change, 4)
+            for name, change in compare(baseline, report).items()
+            if not name.startswith(("meta.", "corpus."))
+        }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
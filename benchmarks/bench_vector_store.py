@@ -0,0 +1,121 @@
+"""Compare the ChromaDB and memory-mapped vector store backends.
+
+Generates a seeded synthetic corpus of normalised embeddings, loads it into
+each backend and reports ingest throughput, single-query p50/p99 latency,
+batched query throughput and recall@k against exact search.
+
+    python -m benchmarks.bench_vector_store --rows 20000 --dim 384
+"""
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.config import Settings
+
+
+def make_corpus(rows: int, dim: int, queries: int, seed: int):
+    """Clustered random embeddings so nearest neighbours are meaningful"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(rows // 100, 1), dim)).astype(np.float32)
+    assignment = rng.integers(0, len(centers), size=rows)
+    vectors = centers[assignment] + 0.3 * rng.normal(size=(rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    query_vectors = vectors[rng.integers(0, rows, size=queries)] + 0.1 * rng.normal(size=(queries, dim)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return vectors, query_vectors.astype(np.float32)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+async def run_backend(name, store, vectors, queries, truth, k, batch_size, write_batch):
+    ids = [f"chunk_{i}" for i in range(len(vectors))]
+
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), write_batch):
+        end = offset + write_batch
+        await store.add_documents(
+            ids=ids[offset:end],
+            documents=[f"text {i}" for i in range(offset, min(end, len(vectors)))],
+            embeddings=vectors[offset:end],
+            metadatas=[{"space_key": "BENCH"}] * len(ids[offset:end])
+        )
+    ingest_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        results = await store.search(query, n_results=k)
+        latencies.append(time.perf_counter() - start)
+        found.append([int(doc["id"].split("_")[1]) for doc in results])
+
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch_size):
+        await store.search_batch(list(queries[offset:offset + batch_size]), n_results=k)
+    batch_seconds = time.perf_counter() - start
+
+    recall = np.mean([
+        len(set(row) & set(expected)) / k
+        for row, expected in zip(found, truth.tolist())
+    ])
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": name,
+        "rows": len(vectors),
+        "ingest_rows_per_sec": len(vectors) / ingest_seconds,
+        "query_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "query_p99_ms": float(np.percentile(latencies_ms, 99)),
+        "batch_queries_per_sec": len(queries) / batch_seconds,
+        f"recall_at_{k}": float(recall),
+    }
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--write-batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", default="chroma,mmap")
+    args = parser.parse_args(argv)
+
+    vectors, queries = make_corpus(args.rows, args.dim, args.queries, args.seed)
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = Settings(
+            CHROMA_PERSIST_DIR=f"{tmp}/chroma",
+            CHROMA_COLLECTION_NAME="bench",
+            MMAP_INDEX_DIR=f"{tmp}/mmap",
+        )
+        for backend in args.backends.split(","):
+            if backend == "chroma":
+                from app.services.chromadb import ChromaDBService
+                store = ChromaDBService(settings)
+            elif backend == "mmap":
+                from app.services.mmap_store import MmapVectorStore
+                store = MmapVectorStore(settings)
+            else:
+                raise SystemExit(f"Unknown backend: {backend}")
+            results.append(await run_backend(
+                backend, store, vectors, queries, truth, args.k, args.batch_size, args.write_batch
+            ))
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
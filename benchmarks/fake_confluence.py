@@ -0,0 +1,270 @@
+"""A local fake Confluence REST server serving a seeded synthetic corpus.
+
+Implements the parts of the Confluence Server REST API the crawler uses:
+spaces, paged space content, pages with storage-format bodies and labels,
+and page comments and attachments. Page sizes follow a log-normal
+distribution and every response can be delayed to model network latency,
+so crawl benchmarks run offline and give the same corpus for the same seed.
+
+    python -m benchmarks.fake_confluence --pages 2000 --latency-ms 20 --port 8090
+"""
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+import argparse
+import json
+import re
+import threading
+import time
+
+import numpy as np
+
+WORDS = (
+    "deploy release pipeline service cluster config database migration schema index query cache "
+    "latency throughput incident runbook alert dashboard metric owner team review approval rollout "
+    "rollback feature flag environment staging production secret token certificate network proxy "
+    "gateway endpoint request response error retry timeout queue worker job schedule backup restore "
+    "storage bucket replica shard partition compaction upgrade version dependency build artifact test "
+    "coverage lint format onboarding access permission group policy audit compliance budget roadmap"
+).split()
+
+PAGE_PATH = re.compile(r"^content/(\d+)$")
+CHILD_PATH = re.compile(r"^content/(\d+)/child/(comment|attachment)$")
+
+
+@dataclass
+class CorpusConfig:
+    """Shape of the synthetic corpus"""
+    spaces: int = 2
+    pages: int = 500
+    median_words: int = 400
+    size_sigma: float = 0.8
+    max_words: int = 20000
+    comments_per_page: float = 1.5
+    attachments_per_page: float = 0.5
+    seed: int = 0
+
+
+@dataclass
+class Corpus:
+    spaces: List[Dict[str, Any]] = field(default_factory=list)
+    pages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    by_space: Dict[str, List[str]] = field(default_factory=dict)
+    comments: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    attachments: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+    @property
+    def html_bytes(self) -> int:
+        return sum(len(page["body"]["storage"]["value"].encode()) for page in self.pages.values())
+
+
+def _sentence(rng: np.random.Generator) -> str:
+    words = rng.choice(WORDS, size=int(rng.integers(6, 18)))
+    return " ".join(words).capitalize() + "."
+
+
+def _html(rng: np.random.Generator, words: int) -> str:
+    """Storage-format body mixing the markup real pages carry"""
+    parts, written = [], 0
+    while written < words:
+        kind = rng.random()
+        if kind < 0.1:
+            parts.append(f"<h2>{_sentence(rng)[:-1]}</h2>")
+        elif kind < 0.2:
+            items = "".join(f"<li>{_sentence(rng)}</li>" for _ in range(int(rng.integers(2, 6))))
+            parts.append(f"<ul>{items}</ul>")
+        elif kind < 0.25:
+            cells = "".join(f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.integers(0, 1000)}</td></tr>" for _ in range(4))
+            parts.append(f"<table><tbody>{cells}</tbody></table>")
+        elif kind < 0.3:
+            parts.append(
+                '<ac:structured-macro ac:name="code"><ac:plain-text-body><![CDATA['
+                f"kubectl rollout restart deployment/{rng.choice(WORDS)}]]></ac:plain-text-body></ac:structured-macro>"
+            )
+        elif kind < 0.32:
+            parts.append("<script>window.track && track('view');</script><style>p { margin: 0 }</style>")
+        else:
+            sentences = [_sentence(rng) for _ in range(int(rng.integers(2, 6)))]
+            parts.append(f"<p>{' '.join(sentences)}</p>")
+        written = sum(part.count(" ") for part in parts)
+    return "".join(parts)
+
+
+def generate_corpus(config: CorpusConfig) -> Corpus:
+    """Build the corpus deterministically from the config's seed"""
+    rng = np.random.default_rng(config.seed)
+    corpus = Corpus()
+    for s in range(config.spaces):
+        key = f"BENCH{s}"
+        corpus.spaces.append({"id": s + 1, "key": key, "name": f"Benchmark space {s}", "type": "global"})
+        corpus.by_space[key] = []
+
+    sizes = rng.lognormal(np.log(config.median_words), config.size_sigma, size=config.pages)
+    for i, size in enumerate(sizes):
+        page_id = str(100000 + i)
+        space = corpus.spaces[i % config.spaces]["key"]
+        title = _sentence(rng)[:-1][:60]
+        corpus.pages[page_id] = {
+            "id": page_id,
+            "type": "page",
+            "status": "current",
+            "title": title,
+            "space": {"key": space},
+            "history": {
+                "createdBy": {"displayName": f"User {int(rng.integers(0, 50))}"},
+                "lastUpdated": {"when": f"2025-{int(rng.integers(1, 13)):02d}-{int(rng.integers(1, 29)):02d}T10:00:00Z"},
+            },
+            "_links": {"webui": f"/display/{space}/{page_id}"},
+            "body": {"storage": {"value": _html(rng, int(min(max(size, 20), config.max_words))), "representation": "storage"}},
+            "metadata": {"labels": {"results": [{"name": str(label)} for label in rng.choice(WORDS, size=int(rng.integers(0, 4)), replace=False)]}},
+        }
+        corpus.by_space[space].append(page_id)
+        corpus.comments[page_id] = [
+            {"id": f"{page_id}-c{c}", "type": "comment", "body": {"storage": {"value": f"<p>{_sentence(rng)}</p>"}}}
+            for c in range(int(rng.poisson(config.comments_per_page)))
+        ]
+        corpus.attachments[page_id] = [
+            {"id": f"att{page_id}{a}", "type": "attachment", "title": f"{rng.choice(WORDS)}-{a}.pdf"}
+            for a in range(int(rng.poisson(config.attachments_per_page)))
+        ]
+    return corpus
+
+
+def _listing(page: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in page.items() if key not in ("body", "metadata")}
+
+
+class FakeConfluence:
+    """Serves a corpus over HTTP on localhost from a background thread.
+
+    Use as a context manager; ``url`` is the base URL to configure as
+    ``CONFLUENCE_BASE_URL``. ``latency`` (seconds, plus up to ``jitter``) is
+    added to every response. ``requests`` counts requests by endpoint.
+    """
+
+    def __init__(self, corpus: Corpus, latency: float = 0.0, jitter: float = 0.0, port: int = 0, seed: int = 0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.requests: Dict[str, int] = {}
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeConfluence":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _delay(self) -> float:
+        if not self.latency and not self.jitter:
+            return 0.0
+        with self._lock:
+            return self.latency + self.jitter * float(self._rng.random())
+
+    def route(self, path: str, query: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+        """Response body for an API path (without the rest/api prefix), or None for 404"""
+        start = int(query.get("start", ["0"])[0])
+        limit = int(query.get("limit", ["25"])[0])
+        if path == "space":
+            return self._paged(self.corpus.spaces, start, limit, path, query)
+        if path == "content":
+            space = query.get("spaceKey", [""])[0]
+            pages = [_listing(self.corpus.pages[page_id]) for page_id in self.corpus.by_space.get(space, [])]
+            return self._paged(pages, start, limit, path, query)
+        match = PAGE_PATH.match(path)
+        if match:
+            return self.corpus.pages.get(match.group(1))
+        match = CHILD_PATH.match(path)
+        if match and match.group(1) in self.corpus.pages:
+            children = self.corpus.comments if match.group(2) == "comment" else self.corpus.attachments
+            return self._paged(children[match.group(1)], start, limit, path, query)
+        return None
+
+    def _paged(self, items, start, limit, path, query) -> Dict[str, Any]:
+        results = items[start:start + limit]
+        links: Dict[str, Any] = {"base": self.url}
+        if start + limit < len(items):
+            params = {key: values[0] for key, values in query.items()}
+            params.update(start=start + limit, limit=limit)
+            links["next"] = f"/rest/api/{path}?{urlencode(params)}"
+        return {"results": results, "start": start, "limit": limit, "size": len(results), "_links": links}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this each response waits on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                path = re.sub(r"^/(rest/api/)?", "", parsed.path).rstrip("/")
+                endpoint = re.sub(r"\d+", "{id}", path)
+                with fake._lock:
+                    fake.requests[endpoint] = fake.requests.get(endpoint, 0) + 1
+
+                delay = fake._delay()
+                if delay:
+                    time.sleep(delay)
+                body = fake.route(path, parse_qs(parsed.query))
+                payload = json.dumps(body if body is not None else {"statusCode": 404, "message": "Not found"}).encode()
+                self.send_response(200 if body is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                return
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spaces", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--median-words", type=int, default=400)
+    parser.add_argument("--comments", type=float, default=1.5, help="Mean comments per page")
+    parser.add_argument("--attachments", type=float, default=0.5, help="Mean attachments per page")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(CorpusConfig(
+        spaces=args.spaces, pages=args.pages, median_words=args.median_words,
+        comments_per_page=args.comments, attachments_per_page=args.attachments, seed=args.seed
+    ))
+    server = FakeConfluence(corpus, args.latency_ms / 1000, args.jitter_ms / 1000, port=args.port, seed=args.seed)
+    print(f"Serving {len(corpus.pages)} pages in {len(corpus.spaces)} spaces at {server.url}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
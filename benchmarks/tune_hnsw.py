@@ -0,0 +1,190 @@
+"""Sweep HNSW parameters and recommend a configuration.
+
+Samples chunk embeddings from the configured index (or a seeded synthetic
+corpus with --synthetic), computes exact top-k neighbours by brute force and
+builds a throwaway in-memory ChromaDB collection for every (M,
+ef_construction, ef_search) combination, reporting recall@k, single-query
+p50/p99 latency, build time and estimated graph memory. The recommendation is the fastest configuration (by p99) that
+reaches --target-recall, printed as settings ready for .env.
+
+    python -m benchmarks.tune_hnsw --sample 20000 --queries queries.txt
+    python -m benchmarks.tune_hnsw --synthetic --sample 20000 --dim 384
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+import uuid
+
+import numpy as np
+
+from app.core.config import Settings
+
+DEFAULT_M = "8,16,32"
+DEFAULT_EF_CONSTRUCTION = "100,200"
+DEFAULT_EF_SEARCH = "10,20,40,80,160"
+
+
+def _ints(value: str):
+    return [int(part) for part in value.split(",") if part]
+
+
+async def sample_index(settings: Settings, sample: int, seed: int) -> np.ndarray:
+    """Embeddings of a random sample of the chunks in the configured index"""
+    from app.services.vector_store import create_vector_store
+
+    store = create_vector_store(settings)
+    ids = await store.list_ids()
+    if not ids:
+        raise SystemExit("The configured index is empty; crawl first or pass --synthetic")
+    rng = np.random.default_rng(seed)
+    chosen = [ids[i] for i in rng.choice(len(ids), size=min(sample, len(ids)), replace=False)]
+    vectors = []
+    for start in range(0, len(chosen), store.max_batch_size()):
+        docs = await store.get_documents(chosen[start:start + store.max_batch_size()], include_embeddings=True)
+        vectors.extend(doc["embedding"] for doc in docs)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def encode_queries(settings: Settings, path: str) -> np.ndarray:
+    """Embed one query per line with the configured model"""
+    from sentence_transformers import SentenceTransformer
+
+    with open(path, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    return np.asarray(model.encode(queries), dtype=np.float32)
+
+
+def ground_truth(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Exact top-k row indices under the given distance"""
+    if space == "l2":
+        scores = -(np.sum(queries ** 2, axis=1, keepdims=True) - 2 * queries @ vectors.T
+                   + np.sum(vectors ** 2, axis=1))
+    elif space == "cosine":
+        unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = queries @ unit.T
+    else:
+        scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def estimate_index_mb(rows: int, dim: int, m: int) -> float:
+    """Vectors plus HNSW links: 2M neighbours on layer 0 and ~M/(M-1) upper-layer links per node"""
+    links = 2 * m + m / max(m - 1, 1) * m
+    return rows * (dim * 4 + links * 4 + 16) / 1e6
+
+
+def sweep(vectors, queries, truth, k, space, m_values, efc_values, efs_values):
+    import chromadb
+
+    client = chromadb.EphemeralClient()
+    ids = [str(i) for i in range(len(vectors))]
+    batch = client.get_max_batch_size()
+    results = []
+    # ChromaDB fixes ef_search once a collection's index is loaded, so every
+    # combination gets its own freshly built collection
+    for m, ef_construction, ef_search in itertools.product(m_values, efc_values, efs_values):
+        name = f"tune-{uuid.uuid4().hex[:8]}"
+        collection = client.create_collection(name, configuration={"hnsw": {
+            "space": space, "max_neighbors": m, "ef_construction": ef_construction, "ef_search": ef_search,
+        }})
+        start = time.perf_counter()
+        for offset in range(0, len(vectors), batch):
+            collection.add(ids=ids[offset:offset + batch], embeddings=vectors[offset:offset + batch])
+        build_seconds = time.perf_counter() - start
+
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            hits = collection.query(query_embeddings=[query], n_results=k, include=[])
+            latencies.append(time.perf_counter() - start)
+            found.append([int(doc_id) for doc_id in hits["ids"][0]])
+        client.delete_collection(name)
+
+        recall = np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth.tolist())])
+        latencies_ms = np.array(latencies) * 1000
+        results.append({
+            "M": m,
+            "ef_construction": ef_construction,
+            "ef_search": ef_search,
+            f"recall_at_{k}": float(recall),
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p99_ms": float(np.percentile(latencies_ms, 99)),
+            "build_seconds": build_seconds,
+            "index_mb_est": estimate_index_mb(len(vectors), vectors.shape[1], m),
+        })
+        print(json.dumps(results[-1]), file=sys.stderr)
+    return results
+
+
+def recommend(results, k, target_recall, space):
+    """Lowest p99 meeting the recall target, breaking ties on memory; best recall otherwise"""
+    key = f"recall_at_{k}"
+    passing = [row for row in results if row[key] >= target_recall]
+    if passing:
+        best = min(passing, key=lambda row: (row["p99_ms"], row["index_mb_est"]))
+    else:
+        best = max(results, key=lambda row: (row[key], -row["p99_ms"]))
+    return {
+        "meets_target": bool(passing),
+        "settings": {
+            "HNSW_SPACE": space,
+            "HNSW_M": best["M"],
+            "HNSW_EF_CONSTRUCTION": best["ef_construction"],
+            "HNSW_EF_SEARCH": best["ef_search"],
+        },
+        "expected": {metric: best[metric] for metric in (key, "p50_ms", "p99_ms", "index_mb_est")},
+    }
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", type=int, default=20000, help="Chunks sampled from the index")
+    parser.add_argument("--queries", help="File with one query per line; defaults to held-out chunks")
+    parser.add_argument("--num-queries", type=int, default=200, help="Held-out chunks used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", choices=("l2", "cosine", "ip"))
+    parser.add_argument("--m", default=DEFAULT_M)
+    parser.add_argument("--ef-construction", default=DEFAULT_EF_CONSTRUCTION)
+    parser.add_argument("--ef-search", default=DEFAULT_EF_SEARCH)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--synthetic", action="store_true", help="Use a seeded synthetic corpus")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    settings = Settings()
+    space = args.space or settings.HNSW_SPACE
+
+    if args.synthetic:
+        from benchmarks.bench_vector_store import make_corpus
+        vectors, queries = make_corpus(args.sample, args.dim, args.num_queries, args.seed)
+    else:
+        vectors = await sample_index(settings, args.sample + (0 if args.queries else args.num_queries), args.seed)
+        if args.queries:
+            queries = encode_queries(settings, args.queries)
+        else:
+            # Hold chunks out of the indexed sample so queries are not exact matches
+            vectors, queries = vectors[args.num_queries:], vectors[:args.num_queries]
+
+    truth = ground_truth(vectors, queries, args.k, space)
+    results = sweep(
+        vectors, queries, truth, args.k, space,
+        _ints(args.m), _ints(args.ef_construction), _ints(args.ef_search)
+    )
+    report = {
+        "rows": len(vectors),
+        "queries": len(queries),
+        "space": space,
+        "results": results,
+        "recommended": recommend(results, args.k, args.target_recall, space),
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -15,9 +15,9 @@ class TestSettings(Settings):
     model_config["env_file"] = "tests/.env.test"
 
 @pytest.fixture
-def settings():
+def settings(tmp_path):
     """Fixture to provide test settings"""
-    return TestSettings()
+    return TestSettings(CHROMA_PERSIST_DIR=str(tmp_path / "chroma"))
 
 @pytest.fixture(autouse=True)
 def env_setup():
@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 from unittest.mock import Mock, patch, AsyncMock
 from app.core.config import Settings
 from app.main import app
+from app.api.mcp.router import get_rag_service
 
 @pytest.fixture
 def client(settings) -> TestClient:
@@ -12,10 +13,11 @@ def client(settings) -> TestClient:
 
 @pytest.fixture
 def mock_rag_service():
-    with patch("app.api.mcp.router.get_rag_service") as mock:
-        mock.return_value = AsyncMock()
-        mock.return_value.search.return_value = []
-        yield mock.return_value
+    mock = AsyncMock()
+    mock.search.return_value = []
+    app.dependency_overrides[get_rag_service] = lambda: mock
+    yield mock
+    app.dependency_overrides.pop(get_rag_service, None)
 
 def test_health(client):
     """Test health check endpoint"""
@@ -88,3 +90,154 @@ def test_get_context_no_results(client, mock_rag_service):
     data = response.json()
     assert data["context"] == ""
     assert data["sources"] == []
+
+def test_get_context_batch(client, mock_rag_service):
+    """Test batch context endpoint returns one response per request in order"""
+    def doc(title):
+        return {
+            "id": f"{title}_0",
+            "content": f"{title} content",
+            "metadata": {
+                "title": title,
+                "url": "http://test.com",
+                "last_modified": "2025-07-05T10:00:00Z"
+            },
+            "distance": 0.2
+        }
+
+    mock_rag_service.search_batch.return_value = [[doc("First")], [], [doc("Third")]]
+
+    request_data = {
+        "requests": [
+            {"messages": [], "query": "first query"},
+            {"messages": [], "query": "second query"},
+            {"messages": [], "query": "third query", "metadata_filter": {"space_key": "TEST"}}
+        ]
+    }
+
+    response = client.post("/mcp/context/batch", json=request_data)
+
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert len(responses) == 3
+    assert responses[0]["sources"][0]["title"] == "First"
+    assert responses[1]["sources"] == []
+    assert responses[2]["sources"][0]["title"] == "Third"
+
+    call_kwargs = mock_rag_service.search_batch.call_args.kwargs
+    assert call_kwargs["queries"] == ["first query", "second query", "third query"]
+    assert call_kwargs["metadata_filters"] == [None, None, {"space_key": "TEST"}]
+
+@pytest.fixture
+def mock_services():
+    services = Mock()
+    services.rag.vector_store.count = AsyncMock(return_value=0)
+    services.rag.manifest.generation = 2
+    services.jobs.current = None
+    app.state.services = services
+    yield services
+    del app.state.services
+
+def test_ready_while_initial_crawl_fills_empty_index(client, mock_services):
+    """Test readiness is withheld until an empty index has content, then granted"""
+    job = Mock(active=True)
+    job.to_dict.return_value = {"status": "running"}
+    mock_services.jobs.current = job
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["crawl"]["status"] == "running"
+
+    mock_services.rag.vector_store.count.return_value = 10
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["index_chunks"] == 10
+    assert response.json()["index_generation"] == 2
+
+def test_ready_without_crawl(client, mock_services):
+    """Test an empty index with no crawl running is still ready to serve"""
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["crawl"] is None
+
+def test_metrics_endpoint(client, mock_rag_service):
+    """Test /metrics exposes request and search stage metrics in Prometheus format"""
+    client.post("/mcp/context", json={"messages": [], "query": "test query"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'search_stage_seconds_count{stage="pack"}' in body
+    assert 'http_request_seconds_count{method="POST",route="/mcp/context",status="200"}' in body
+
+def test_metrics_route_label_uses_template(client, mock_services):
+    """Test path parameters are folded into the route label"""
+    mock_services.jobs.get.return_value = None
+    client.get("/crawl/jobs/abc123")
+    assert 'route="/crawl/jobs/{job_id}",status="404"' in client.get("/metrics").text
+
+def test_read_only_process_refuses_crawls(client, mock_services, monkeypatch):
+    """Test a read-only worker points crawl and maintenance requests at the writer"""
+    from app import main
+    monkeypatch.setattr(main.settings, "READ_ONLY", True)
+    for method, path in (("post", "/crawl"), ("get", "/crawl/jobs"), ("post", "/maintenance/compact")):
+        response = getattr(client, method)(path)
+        assert response.status_code == 409
+        assert "writer" in response.json()["detail"]
+    mock_services.jobs.submit.assert_not_called()
+
+def test_maintenance_refused_while_crawl_runs(client, mock_services):
+    """Test maintenance requests are refused while a crawl job could still be writing"""
+    mock_services.maintenance.running = False
+    mock_services.jobs.running = True
+    mock_services.jobs.current = Mock(kind="crawl")
+    for path in ("/maintenance/gc", "/maintenance/compact", "/maintenance/rebuild"):
+        response = client.post(path)
+        assert response.status_code == 409
+        assert "crawl job" in response.json()["detail"]
+    mock_services.maintenance.compact.assert_not_called()
+    mock_services.jobs.start_rebuild.assert_not_called()
+
+def test_rebuild_starts_job(client, mock_services):
+    """Test a rebuild request returns its background job at once"""
+    mock_services.maintenance.running = False
+    mock_services.jobs.running = False
+    mock_services.jobs.start_rebuild.return_value.to_dict.return_value = {"id": "abc", "kind": "rebuild"}
+    response = client.post("/maintenance/rebuild")
+    assert response.status_code == 202
+    assert response.json()["job"]["kind"] == "rebuild"
+
+@pytest.mark.asyncio
+async def test_initial_crawl_only_fills_an_empty_index(mock_services):
+    """Test startup crawls an empty index, serves an existing one as it is, and stdio sessions skip the crawl"""
+    from app.main import _start_services
+    mock_services.vector_store.count = AsyncMock(return_value=10)
+    with patch("app.main.install_services"):
+        await _start_services(initial_crawl=True)
+        mock_services.jobs.start_crawl.assert_not_called()
+
+        await _start_services(initial_crawl=False)
+        mock_services.jobs.start_crawl.assert_not_called()
+
+        mock_services.vector_store.count.return_value = 0
+        await _start_services(initial_crawl=True)
+    mock_services.jobs.start_crawl.assert_called_once_with(reason="initial")
+
+def test_invalid_date_filter_is_a_client_error(client, mock_rag_service):
+    """Test an unparseable date filter is answered with 400 rather than a server error"""
+    mock_rag_service.search.side_effect = ValueError("Invalid last_modified_after date 'soon'")
+    response = client.post("/mcp/context", json={
+        "messages": [], "query": "q", "metadata_filter": {"last_modified_after": "soon"}
+    })
+    assert response.status_code == 400
+    assert "last_modified_after" in response.json()["detail"]
+
+def test_import_does_not_load_heavy_dependencies():
+    """Test that importing the app leaves the models, vector store and crawler unloaded"""
+    import subprocess
+    import sys
+    heavy = ["torch", "sentence_transformers", "chromadb", "atlassian", "bs4"]
+    code = f"import sys, app.main; print([m for m in {heavy!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
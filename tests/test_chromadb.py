@@ -1,14 +1,14 @@
 """Tests for ChromaDB service"""
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
+from app.core.config import Settings
 from app.services.chromadb import ChromaDBService
+from app.services.vector_store import distances
 
 @pytest.fixture
 def mock_chroma_collection():
+    # ChromaDB's collection API is synchronous; the service runs it off the event loop
     collection = Mock()
-    collection.add = AsyncMock()
-    collection.query = AsyncMock()
-    collection.delete = AsyncMock()
     
     # Configure query response
     mock_response = {
@@ -21,16 +21,15 @@ def mock_chroma_collection():
         ]],
         "distances": [[0.1, 0.2]]
     }
-    # Set up async return value
     collection.query.return_value = mock_response
-    collection.query._mock_return_value = mock_response
     return collection
 
 @pytest.fixture
 def chromadb_service(settings, mock_chroma_collection):
-    with patch("chromadb.Client") as mock_client:
+    with patch("chromadb.PersistentClient") as mock_client:
         mock_client.return_value.get_or_create_collection.return_value = mock_chroma_collection
-        service = ChromaDBService(settings)
+        embedder = Mock(side_effect=lambda texts: [[0.1, 0.2, 0.3] for _ in texts])
+        service = ChromaDBService(settings, embedder=embedder)
         return service
 
 @pytest.mark.asyncio
@@ -104,3 +103,63 @@ async def test_delete_documents(chromadb_service, mock_chroma_collection):
     
     # Verify delete was called
     mock_chroma_collection.delete.assert_called_once_with(ids=ids)
+
+@pytest.mark.asyncio
+async def test_add_chunks_with_embeddings(chromadb_service, mock_chroma_collection):
+    """Test upserting chunks with precomputed embeddings"""
+    await chromadb_service.add_documents(
+        ids=["page1_0", "page1_1"],
+        documents=["chunk one", "chunk two"],
+        embeddings=[[0.1, 0.2], [0.3, 0.4]],
+        metadatas=[{"title": "Test"}, {"title": "Test"}]
+    )
+
+    mock_chroma_collection.upsert.assert_called_once()
+    call_args = mock_chroma_collection.upsert.call_args[1]
+    assert call_args["ids"] == ["page1_0", "page1_1"]
+    assert call_args["embeddings"] == [[0.1, 0.2], [0.3, 0.4]]
+
+@pytest.mark.asyncio
+async def test_search_batch(chromadb_service, mock_chroma_collection):
+    """Test that several query embeddings are sent as one query"""
+    mock_chroma_collection.query.return_value = {
+        "ids": [["doc1"], ["doc2"]],
+        "documents": [["content1"], ["content2"]],
+        "metadatas": [[{"title": "Test1"}], [{"title": "Test2"}]],
+        "distances": [[0.1], [0.2]]
+    }
+
+    results = await chromadb_service.search_batch([[0.1, 0.2], [0.3, 0.4]], n_results=1)
+
+    mock_chroma_collection.query.assert_called_once()
+    assert mock_chroma_collection.query.call_args[1]["query_embeddings"] == [[0.1, 0.2], [0.3, 0.4]]
+    assert [[doc["id"] for doc in batch] for batch in results] == [["doc1"], ["doc2"]]
+
+def test_collection_created_with_hnsw_settings(settings):
+    """Test that the HNSW settings are passed to the collection configuration"""
+    with patch("chromadb.PersistentClient") as mock_client:
+        collection = Mock()
+        collection.configuration = {"hnsw": {
+            "space": "l2", "max_neighbors": 16, "ef_construction": 100, "ef_search": 10
+        }}
+        mock_client.return_value.get_or_create_collection.return_value = collection
+        ChromaDBService(settings, embedder=Mock())
+
+    configuration = mock_client.return_value.get_or_create_collection.call_args.kwargs["configuration"]
+    assert configuration["hnsw"]["max_neighbors"] == settings.HNSW_M
+    collection.modify.assert_called_once_with(configuration={"hnsw": {"ef_search": settings.HNSW_EF_SEARCH}})
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+async def test_distances_match_collection_metric(tmp_path, space):
+    """Test that distances computed from stored embeddings match the collection's own search distances"""
+    settings = Settings(CHROMA_PERSIST_DIR=str(tmp_path / f"chroma-{space}"), HNSW_SPACE=space, _env_file=None)
+    service = ChromaDBService(settings, embedder=Mock())
+    assert service.distance_space() == space
+    embeddings = [[1.0, 0.0, 0.5], [0.2, 0.9, 0.1], [0.6, 0.6, 0.6]]
+    await service.add_documents(["a", "b", "c"], ["a", "b", "c"], embeddings, [{"n": i} for i in range(3)])
+
+    query = [0.8, 0.3, 0.2]
+    found = {doc["id"]: doc["distance"] for doc in await service.search(query, n_results=3)}
+    computed = distances([query], embeddings, space)[0]
+    assert [found[doc_id] for doc_id in ("a", "b", "c")] == pytest.approx(computed.tolist(), abs=1e-4)
@@ -85,3 +85,24 @@ def test_clean_html(confluence_service):
     assert "Test content" in clean_text
     assert "Footer" in clean_text
     assert "<" not in clean_text  # No HTML tags
+
+@pytest.mark.asyncio
+async def test_crawl_over_http(settings):
+    """Test a full crawl against the fake Confluence server through the real client"""
+    from benchmarks.fake_confluence import CorpusConfig, FakeConfluence, generate_corpus
+
+    corpus = generate_corpus(CorpusConfig(spaces=2, pages=30, median_words=50, seed=1))
+    with FakeConfluence(corpus) as fake:
+        service = ConfluenceService(settings.model_copy(update={
+            "CONFLUENCE_BASE_URL": fake.url,
+            "CONFLUENCE_SPACE_KEY": None,
+        }))
+        documents = await service.crawl()
+        page_ids = await service.list_page_ids()
+
+    assert len(documents) == 30 and page_ids == set(corpus.pages)
+    doc = next(doc for doc in documents if corpus.comments[doc["id"]])
+    assert len(doc["comments"]) == len(corpus.comments[doc["id"]])
+    assert "<" not in doc["content"]
+    with_attachments = [doc for doc in documents if corpus.attachments[doc["id"]]]
+    assert all(doc["attachments"][0]["url"].endswith(".pdf") for doc in with_attachments)
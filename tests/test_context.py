@@ -0,0 +1,89 @@
+"""Tests for context packing"""
+import pytest
+from app.services.context import ContextPacker, count_tokens, truncate_to_tokens
+
+def make_doc(page_id, index, content, distance, title="Page"):
+    return {
+        "id": f"{page_id}_{index}",
+        "content": content,
+        "metadata": {
+            "title": title,
+            "url": f"http://test.com/{page_id}",
+            "last_modified": "2025-07-05T10:00:00Z",
+            "page_id": page_id,
+            "chunk_index": index
+        },
+        "distance": distance
+    }
+
+@pytest.fixture
+def packer(settings):
+    return ContextPacker(settings)
+
+def test_merges_adjacent_chunks(packer):
+    """Test that consecutive chunks of a page are joined without their overlap"""
+    results = [
+        make_doc("p1", 1, "overlap text and the second part.", 0.3),
+        make_doc("p1", 0, "The first part with overlap text", 0.2),
+    ]
+
+    segments = packer.pack(results, max_tokens=1000)
+
+    assert len(segments) == 1
+    assert segments[0].content == "The first part with overlap text and the second part."
+    assert segments[0].chunk_indices == [0, 1]
+    assert segments[0].distance == 0.2
+
+def test_drops_near_duplicates(packer):
+    """Test that copies of the same text on other pages are not packed twice"""
+    text = "Deploy the service by running the release pipeline and checking the dashboard"
+    results = [
+        make_doc("p1", 0, text, 0.1, title="Original"),
+        make_doc("p2", 0, text + ".", 0.15, title="Copy"),
+        make_doc("p3", 0, "Completely different notes about onboarding", 0.4, title="Other"),
+    ]
+
+    segments = packer.pack(results, max_tokens=1000)
+
+    assert [s.title for s in segments] == ["Original", "Other"]
+
+def test_respects_token_budget(packer):
+    """Test that packing stops at the budget and truncates at word boundaries"""
+    long_text = " ".join(f"word{i}" for i in range(400))
+    results = [
+        make_doc("p1", 0, "Short relevant answer.", 0.1, title="First"),
+        make_doc("p2", 0, long_text, 0.2, title="Second"),
+    ]
+
+    segments = packer.pack(results, max_tokens=100)
+    context = "\n\n".join(s.render() for s in segments)
+
+    assert count_tokens(context) <= 100
+    assert [s.title for s in segments] == ["First", "Second"]
+    assert segments[1].content.split()[-1] in long_text.split()
+
+def test_small_budget_truncates_first_segment(packer):
+    """Test that a budget below the minimum segment size still returns the start of the best segment"""
+    long_text = " ".join(f"word{i}" for i in range(400))
+    max_tokens = packer.settings.CONTEXT_MIN_SEGMENT_TOKENS // 2
+    segments = packer.pack([make_doc("p1", 0, long_text, 0.1)], max_tokens=max_tokens)
+
+    assert len(segments) == 1 and segments[0].content.startswith("word0")
+    assert count_tokens(segments[0].render()) <= max_tokens
+
+def test_truncate_prefers_sentences():
+    """Test that truncation keeps whole sentences when possible"""
+    text = "First sentence here. Second sentence is a lot longer than the first one."
+    assert truncate_to_tokens(text, count_tokens("First sentence here.")) == "First sentence here."
+
+def test_keeps_search_order_over_distance(packer):
+    """Test that a reranked hit with a worse vector distance stays first and survives a tight budget"""
+    results = [
+        {**make_doc("p1", 0, "Set RELEASE_FREEZE=true to pause deploys.", 0.6, title="Exact"), "rerank_score": 8.2},
+        {**make_doc("p2", 0, " ".join(f"deploy{i}" for i in range(200)), 0.1, title="Close"), "rerank_score": -3.0},
+    ]
+
+    segments = packer.pack(results, max_tokens=30)
+
+    assert segments[0].title == "Exact"
+    assert segments[0].content == "Set RELEASE_FREEZE=true to pause deploys."
@@ -0,0 +1,107 @@
+"""Tests for near-duplicate chunk detection"""
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import Settings
+from app.services.dedup import DuplicateIndex, collapse_duplicates, lsh_bands
+from app.services.mmap_store import MmapVectorStore
+from app.services.rag import RAGService
+
+TEMPLATE = (
+    "Release checklist for the payments service. Confirm the change ticket is approved, "
+    "announce the window in the release channel, run the smoke tests against staging, "
+    "watch the error dashboards for thirty minutes and roll back if the error rate doubles. "
+)
+
+@pytest.fixture
+def rag_service(tmp_path):
+    settings = Settings(
+        CHROMA_PERSIST_DIR=str(tmp_path / "state"),
+        MMAP_INDEX_DIR=str(tmp_path / "mmap"),
+        VECTOR_BACKEND="mmap",
+        CHUNK_SIZE=1000,
+        HYBRID_SEARCH=False,
+        _env_file=None
+    )
+    model = Mock()
+    model.encode.side_effect = lambda chunks: [[1.0, float(len(chunk)), float(chunk.count("a"))] for chunk in chunks]
+    model.get_sentence_embedding_dimension.return_value = 3
+    with patch("sentence_transformers.SentenceTransformer", return_value=model):
+        return RAGService(MmapVectorStore(settings), settings)
+
+def _page(page_id, content, space="ENG"):
+    return {"id": page_id, "title": f"Page {page_id}", "content": content, "space_key": space, "url": f"http://wiki/{page_id}"}
+
+def test_signatures_find_near_duplicates_only():
+    """Test that a lightly edited copy is found and unrelated text is not"""
+    index = DuplicateIndex()
+    index.add("a", index.signature(TEMPLATE * 3))
+    assert index.find(index.signature(TEMPLATE * 3 + "Owner: team blue.")) == "a"
+    assert index.find(index.signature("Kubernetes upgrade notes for the search cluster and its node pools")) is None
+    assert index.find(index.signature(TEMPLATE * 3), exclude="a") is None
+    assert index.signature("") is None
+    assert lsh_bands(128, 0.9) == (8, 16)
+
+def test_collapse_keeps_best_hit_per_group():
+    """Test that results from one duplicate group collapse into the first, listing the copies"""
+    results = [
+        {"id": "1_0", "metadata": {"dedup_group": "g", "url": "u1"}, "distance": 0.1},
+        {"id": "2_0", "metadata": {"dedup_group": "g", "url": "u2"}, "distance": 0.1},
+        {"id": "3_0", "metadata": {"url": "u3"}, "distance": 0.2},
+    ]
+    collapsed = collapse_duplicates(results, 5)
+    assert [doc["id"] for doc in collapsed] == ["1_0", "3_0"]
+    assert collapsed[0]["duplicates"] == ["u2"]
+
+@pytest.mark.asyncio
+async def test_ingest_reuses_vectors_of_copies(rag_service):
+    """Test that copied pages are not embedded again, reuse the vector and collapse in search"""
+    await rag_service.ingest_documents([_page("1", TEMPLATE), _page("2", TEMPLATE + "Owner: payments.", "OPS")])
+    assert rag_service.model.encode.call_count == 1
+
+    # A copy ingested in a later run reuses the stored vector
+    await rag_service.ingest_documents([_page("3", TEMPLATE), _page("4", "Unrelated onboarding notes for new hires")])
+    assert rag_service.model.encode.call_count == 2
+    assert rag_service.model.encode.call_args.args[0] == ["Unrelated onboarding notes for new hires"]
+
+    stored = {doc["id"]: doc for doc in await rag_service.vector_store.get_documents(
+        ["1_0", "2_0", "3_0"], include_embeddings=True
+    )}
+    assert stored["2_0"]["metadata"]["duplicate_of"] == "1_0"
+    assert stored["3_0"]["metadata"]["dedup_group"] == stored["1_0"]["metadata"]["dedup_group"]
+    assert np.allclose(stored["3_0"]["embedding"], stored["1_0"]["embedding"])
+
+    results = await rag_service.search(TEMPLATE, n_results=2)
+    assert len(results) == 2
+    assert sorted(results[0]["duplicates"] + [results[0]["metadata"]["url"]]) == [
+        "http://wiki/1", "http://wiki/2", "http://wiki/3"
+    ]
+
+    # The copy in another space is still found by a space filter
+    results = await rag_service.search(TEMPLATE, n_results=2, metadata_filter={"space_key": "OPS"})
+    assert [doc["id"] for doc in results] == ["2_0"]
+
+@pytest.mark.asyncio
+async def test_edited_canonical_re_resolves_its_copies(rag_service):
+    """Test that copies stop reusing the vector and group of a canonical chunk once its page is edited"""
+    await rag_service.ingest_documents([
+        _page("1", TEMPLATE), _page("2", TEMPLATE + "Owner: payments.", "OPS"), _page("3", TEMPLATE)
+    ])
+    await rag_service.ingest_documents([_page("1", "Unrelated onboarding notes for new hires")])
+
+    stored = {doc["id"]: doc for doc in await rag_service.vector_store.get_documents(
+        ["1_0", "2_0", "3_0"], include_embeddings=True
+    )}
+    # The first copy is embedded and becomes canonical; the other now duplicates it
+    assert "duplicate_of" not in stored["2_0"]["metadata"]
+    assert rag_service.model.encode.call_args.args[0] == [stored["2_0"]["content"]]
+    assert stored["3_0"]["metadata"]["duplicate_of"] == "2_0"
+    assert np.allclose(stored["3_0"]["embedding"], stored["2_0"]["embedding"])
+    assert stored["3_0"]["metadata"]["dedup_group"] == stored["2_0"]["metadata"]["dedup_group"]
+    assert stored["1_0"]["metadata"]["dedup_group"] != stored["2_0"]["metadata"]["dedup_group"]
+
+    # The copies collapse into one hit again, and the edited page is no longer among them
+    results = await rag_service.search(TEMPLATE, n_results=2)
+    assert [doc["id"] for doc in results] == ["3_0", "1_0"]
+    assert results[0]["duplicates"] == ["http://wiki/2"]
+    assert DuplicateIndex(rag_service.dedup.path).aliases_of("2_0") == {"3_0"}
@@ -0,0 +1,168 @@
+"""Tests for background crawl jobs"""
+import asyncio
+import pytest
+import threading
+from unittest.mock import Mock, AsyncMock
+from app.core.config import Settings
+from app.services.jobs import JobConflict, JobManager, JobStatus
+
+@pytest.fixture
+def manager():
+    confluence = Mock()
+    confluence.crawl = AsyncMock(return_value=[{"id": "1"}, {"id": "2"}])
+    rag = Mock()
+    rag.ingest_documents = AsyncMock()
+    maintenance = Mock(running=False)
+    maintenance.rebuild = AsyncMock()
+    return JobManager(confluence, rag, Settings(_env_file=None, CRAWL_JOB_HISTORY=2), maintenance)
+
+@pytest.mark.asyncio
+async def test_crawl_runs_in_background(manager):
+    """Test starting a crawl returns at once and the job finishes later"""
+    job = manager.start_crawl(reason="initial")
+    assert job.status == JobStatus.PENDING
+
+    await manager.wait(job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.documents == 2
+    manager.rag.ingest_documents.assert_awaited_once()
+    assert job.to_dict()["finished_at"] is not None
+
+@pytest.mark.asyncio
+async def test_failed_crawl_is_recorded_not_raised(manager):
+    """Test a crawl failure is kept on the job instead of propagating"""
+    manager.confluence.crawl.side_effect = ConnectionError("Confluence unreachable")
+
+    job = manager.start_crawl()
+    await manager.wait(job.id)
+
+    assert job.status == JobStatus.FAILED
+    assert "unreachable" in job.error
+    assert manager.current is job
+
+@pytest.mark.asyncio
+async def test_running_crawl_is_reused(manager):
+    """Test a second start while a crawl runs returns the same job, and shutdown cancels it"""
+    gate = asyncio.Event()
+
+    async def crawl(progress):
+        await gate.wait()
+        return []
+    manager.confluence.crawl = crawl
+
+    first = manager.start_crawl()
+    await asyncio.sleep(0)
+    assert manager.submit() == (first, True)
+    assert first.status == JobStatus.RUNNING
+
+    await manager.shutdown()
+    assert first.status == JobStatus.CANCELLED
+
+@pytest.mark.asyncio
+async def test_progress_and_timings(manager):
+    """Test stage counters reported during the crawl and timings kept after it"""
+    async def crawl(progress):
+        progress.pages_total = 4
+        progress.pages_fetched = progress.pages_cleaned = 2
+        snapshot = progress.to_dict()
+        assert snapshot["stage"] == "crawl"
+        assert snapshot["throughput"]["pages_per_sec"] > 0
+        assert snapshot["eta_seconds"] is not None
+        progress.pages_fetched = progress.pages_cleaned = 4
+        return [{"id": "1"}]
+
+    async def ingest(documents, progress):
+        assert progress.stage == "ingest"
+        progress.documents_total = progress.documents_embedded = 1
+        progress.chunks_embedded = progress.rows_written = 3
+    manager.confluence.crawl = crawl
+    manager.rag.ingest_documents = ingest
+
+    job = manager.start_crawl()
+    await manager.wait(job.id)
+
+    summary = job.to_dict()["progress"]
+    assert summary["stage"] == "done"
+    assert summary["pages_cleaned"] == 4 and summary["rows_written"] == 3
+    assert summary["eta_seconds"] == 0.0
+    assert {"crawl", "ingest", "total"} <= set(summary["timings"])
+
+@pytest.mark.asyncio
+async def test_cancel_stops_crawl_thread(manager):
+    """Test cancelling a job stops the blocking crawl at its next page"""
+    started, pages = threading.Event(), []
+
+    def blocking_crawl(progress):
+        started.set()
+        while True:
+            progress.check_cancelled()
+            pages.append(1)
+            threading.Event().wait(0.01)
+
+    async def crawl(progress):
+        return await asyncio.to_thread(blocking_crawl, progress)
+    manager.confluence.crawl = crawl
+
+    job = manager.start_crawl()
+    await asyncio.to_thread(started.wait, 1)
+    manager.cancel(job.id)
+    await manager.wait(job.id)
+    assert job.status == JobStatus.CANCELLED
+
+    await asyncio.sleep(0.05)
+    crawled = len(pages)
+    await asyncio.sleep(0.05)
+    assert len(pages) == crawled
+    manager.rag.ingest_documents.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_history_is_bounded(manager):
+    """Test only the most recent finished jobs are kept"""
+    ids = []
+    for _ in range(4):
+        job = manager.start_crawl()
+        await manager.wait(job.id)
+        ids.append(job.id)
+    assert [job.id for job in manager.jobs()] == ids[:1:-1]
+    assert manager.get(ids[0]) is None
+
+@pytest.mark.asyncio
+async def test_rebuild_runs_as_job(manager):
+    """Test a rebuild crawls in the background and hands the pages to maintenance instead of ingesting them"""
+    job = manager.start_rebuild()
+    assert job.kind == "rebuild" and job.status == JobStatus.PENDING
+
+    await manager.wait(job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    manager.maintenance.rebuild.assert_awaited_once_with([{"id": "1"}, {"id": "2"}])
+    manager.rag.ingest_documents.assert_not_awaited()
+    assert job.to_dict()["kind"] == "rebuild"
+
+@pytest.mark.asyncio
+async def test_crawls_and_maintenance_exclude_each_other(manager):
+    """Test a rebuild is refused during a crawl, and crawls are refused during a rebuild or other maintenance"""
+    gate = asyncio.Event()
+
+    async def crawl(progress):
+        await gate.wait()
+        return []
+    manager.confluence.crawl = crawl
+
+    crawl_job = manager.start_crawl()
+    with pytest.raises(JobConflict):
+        manager.start_rebuild()
+    gate.set()
+    await manager.wait(crawl_job.id)
+
+    gate.clear()
+    rebuild_job = manager.start_rebuild()
+    assert manager.running
+    with pytest.raises(JobConflict):
+        manager.submit()
+    gate.set()
+    await manager.wait(rebuild_job.id)
+    assert not manager.running
+
+    manager.maintenance.running = True
+    with pytest.raises(JobConflict):
+        manager.start_crawl()
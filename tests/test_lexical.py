@@ -0,0 +1,98 @@
+"""Tests for the lexical BM25 index"""
+import os
+import pickle
+import pytest
+from app.services.lexical import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+@pytest.fixture
+def lexical_index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical_index.json"))
+    index.add(
+        ["a_0", "b_0", "c_0"],
+        [
+            "Deployment fails with ERR-1234 when the token expires",
+            "Use get_page_by_id to fetch a single Confluence page",
+            "General notes about deployment and release planning",
+        ]
+    )
+    return index
+
+def test_tokenize_keeps_compound_identifiers():
+    """Test that error codes and API names are indexed whole and in parts"""
+    terms = tokenize("See ERR-1234 and get_page_by_id")
+    assert "err-1234" in terms
+    assert "err" in terms
+    assert "get_page_by_id" in terms
+    assert "page" in terms
+
+def test_search_exact_match(lexical_index):
+    """Test that an exact identifier ranks its chunk first"""
+    results = lexical_index.search("ERR-1234", k=3)
+    assert results[0][0] == "a_0"
+
+    results = lexical_index.search("get_page_by_id", k=3)
+    assert results[0][0] == "b_0"
+
+def test_search_allowed_ids(lexical_index):
+    """Test restricting results to a candidate set"""
+    results = lexical_index.search("deployment", k=3, allowed_ids={"c_0"})
+    assert [doc_id for doc_id, _ in results] == ["c_0"]
+
+def test_upsert_and_remove(lexical_index):
+    """Test incremental updates replace and delete postings"""
+    lexical_index.add(["a_0"], ["Nothing to see here"])
+    assert lexical_index.search("ERR-1234") == []
+
+    lexical_index.remove(["b_0", "unknown"])
+    assert "b_0" not in lexical_index
+    assert lexical_index.search("get_page_by_id") == []
+    assert len(lexical_index) == 2
+
+    # Freed slots are reused
+    lexical_index.add(["d_0"], ["Runbook for ERR-9999"])
+    assert lexical_index.search("ERR-9999")[0][0] == "d_0"
+    assert len(lexical_index) == 3
+
+def test_persistence(lexical_index):
+    """Test the index reloads from disk"""
+    lexical_index.save()
+    reloaded = LexicalIndex(lexical_index.path)
+
+    assert len(reloaded) == 3
+    assert reloaded.search("ERR-1234")[0][0] == "a_0"
+
+def test_saves_log_changes_until_the_snapshot_is_due(lexical_index):
+    """Test that saves append the changes since the last one and replay on load"""
+    lexical_index.save()
+    snapshot = os.path.getmtime(lexical_index.path), os.path.getsize(lexical_index.path)
+    lexical_index.add(["d_0"], ["Runbook for ERR-9999"])
+    lexical_index.remove(["a_0"])
+    lexical_index.save()
+
+    assert (os.path.getmtime(lexical_index.path), os.path.getsize(lexical_index.path)) == snapshot
+    with open(f"{lexical_index.path}.log", "rb") as f:
+        assert len(f.read().splitlines()) == 3
+    reloaded = LexicalIndex(lexical_index.path)
+    assert "a_0" not in reloaded
+    assert reloaded.search("ERR-9999")[0][0] == "d_0"
+    assert reloaded.search("deployment") == lexical_index.search("deployment")
+
+    # Once the log outgrows the snapshot, the next save writes a new snapshot and an empty log
+    for i in range(10):
+        reloaded.add([f"e_{i}"], [f"Release notes for version {i}"])
+        reloaded.save()
+    with open(f"{lexical_index.path}.log", "rb") as f:
+        assert len(f.read().splitlines()) < 10
+    assert len(LexicalIndex(lexical_index.path)) == len(reloaded) == 13
+
+def test_pickled_index_is_ignored(tmp_path):
+    """Test that an index file written with pickle is not unpickled"""
+    path = str(tmp_path / "lexical_index.json")
+    with open(path, "wb") as f:
+        pickle.dump({"version": 1}, f)
+    assert len(LexicalIndex(path)) == 0
+
+def test_reciprocal_rank_fusion():
+    """Test that documents ranked by both lists come first"""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
@@ -0,0 +1,109 @@
+"""Tests for index maintenance"""
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import Settings
+from app.services.maintenance import IndexMaintenance
+from app.services.mmap_store import MmapVectorStore
+from app.services.rag import RAGService
+from app.services.vector_store import create_vector_store, read_active_index
+
+@pytest.fixture
+def mmap_settings(tmp_path):
+    return Settings(
+        CHROMA_PERSIST_DIR=str(tmp_path / "state"),
+        MMAP_INDEX_DIR=str(tmp_path / "mmap"),
+        VECTOR_BACKEND="mmap",
+        INDEX_SWAP_GRACE_SECONDS=0,
+        CHUNK_SIZE=1000,
+        _env_file=None
+    )
+
+@pytest.fixture
+def rag_service(mmap_settings):
+    model = Mock()
+    model.encode.side_effect = lambda chunks: [[1.0, float(len(chunk))] for chunk in chunks]
+    model.get_sentence_embedding_dimension.return_value = 2
+    with patch("sentence_transformers.SentenceTransformer", return_value=model):
+        return RAGService(MmapVectorStore(mmap_settings), mmap_settings)
+
+def _page(page_id, content):
+    return {"id": page_id, "title": f"Page {page_id}", "content": content, "space_key": "ENG"}
+
+@pytest.mark.asyncio
+async def test_reingest_replaces_chunks(rag_service):
+    """Test that chunk IDs are derived from the page so re-ingesting does not duplicate"""
+    await rag_service.ingest_documents([_page("1", "first version")])
+    await rag_service.ingest_documents([_page("1", "second version")])
+
+    assert await rag_service.vector_store.list_ids() == ["1_0"]
+
+@pytest.mark.asyncio
+async def test_collect_garbage(rag_service):
+    """Test that chunks of deleted pages are removed"""
+    await rag_service.ingest_documents([_page("1", "kept"), _page("2", "deleted upstream")])
+    maintenance = IndexMaintenance(rag_service)
+
+    report = await maintenance.collect_garbage({"1"}, dry_run=True)
+    assert report.removed == 1 and await rag_service.vector_store.count() == 2
+
+    report = await maintenance.collect_garbage({"1"})
+    assert report.removed == 1
+    assert await rag_service.vector_store.list_ids() == ["1_0"]
+    assert rag_service.metadata_index.resolve({"page_id": "2"}) == set()
+
+@pytest.mark.asyncio
+async def test_compact_swaps_in_new_store(rag_service, mmap_settings):
+    """Test that compaction copies live chunks into a new store and repoints readers"""
+    await rag_service.ingest_documents([_page("1", "one"), _page("2", "two")])
+    await rag_service.delete_documents(["2_0"])
+    old_path = rag_service.vector_store.path
+
+    report = await IndexMaintenance(rag_service).compact()
+
+    assert report.written == 1
+    assert rag_service.vector_store.path != old_path
+    reopened = create_vector_store(mmap_settings)
+    assert reopened.path == rag_service.vector_store.path and read_active_index(mmap_settings)
+    assert await reopened.list_ids() == ["1_0"]
+
+@pytest.mark.asyncio
+async def test_rebuild_replaces_index_and_side_indexes(rag_service):
+    """Test that a blue/green rebuild only exposes the rebuilt pages"""
+    await rag_service.ingest_documents([_page("1", "old page"), _page("2", "removed page")])
+
+    report = await IndexMaintenance(rag_service).rebuild([_page("3", "new page")])
+
+    assert report.written == 1
+    assert await rag_service.vector_store.list_ids() == ["3_0"]
+    assert rag_service.metadata_index.resolve({"page_id": "1"}) == set()
+    assert [doc_id for doc_id, _ in rag_service.lexical.search("new page")] == ["3_0"]
+
+@pytest.mark.asyncio
+async def test_rebuild_resolves_duplicates_within_the_shadow(mmap_settings, tmp_path):
+    """Test that a rebuild leaves the live side indexes alone and never aliases chunks of the replaced index"""
+    settings = mmap_settings.model_copy(update={"DEDUP_ENABLED": True, "HIERARCHICAL_SEARCH": True})
+    model = Mock()
+    model.encode.side_effect = lambda chunks: [[1.0, float(len(chunk))] for chunk in chunks]
+    model.get_sentence_embedding_dimension.return_value = 2
+    rag = RAGService(MmapVectorStore(settings), settings, model=model)
+    text = "the deployment runbook lists every step of the release in order"
+    await rag.ingest_documents([_page("1", text)])
+    live_dedup, live_pages = rag.dedup, rag.pages
+
+    maintenance = IndexMaintenance(rag)
+    swap = maintenance._swap
+
+    async def check_then_swap(*args):
+        # Nothing written by the rebuild is visible before the swap
+        assert live_dedup.ids() == {"1_0"} and live_pages.page_ids() == ["1"]
+        await swap(*args)
+
+    with patch.object(maintenance, "_swap", check_then_swap):
+        await maintenance.rebuild([_page("2", text)])
+
+    [doc] = await rag.vector_store.get_documents(["2_0"])
+    assert "duplicate_of" not in doc["metadata"]
+    assert rag.dedup.ids() == {"2_0"} and rag.dedup.canonical("2_0") == "2_0"
+    assert rag.pages.page_ids() == ["2"]
+    reopened = RAGService(create_vector_store(settings), settings, model=model)
+    assert reopened.dedup.ids() == {"2_0"} and reopened.pages.page_ids() == ["2"]
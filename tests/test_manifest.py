@@ -0,0 +1,22 @@
+"""Tests for the index manifest"""
+import pytest
+from app.services.manifest import IndexManifest, IndexMismatchError
+
+def test_roundtrip(tmp_path):
+    """Test that a saved manifest loads back unchanged"""
+    manifest = IndexManifest(embedding_model="all-MiniLM-L6-v2", dimension=384, backend="chroma", generation=4)
+    manifest.save(str(tmp_path))
+
+    loaded = IndexManifest.load(str(tmp_path))
+    assert loaded == manifest
+    assert IndexManifest.load(str(tmp_path / "missing")) is None
+
+def test_check_mismatch():
+    """Test that a different model or dimension is rejected"""
+    manifest = IndexManifest(embedding_model="all-MiniLM-L6-v2", dimension=384, backend="chroma")
+
+    manifest.check("all-MiniLM-L6-v2", 384)
+    with pytest.raises(IndexMismatchError):
+        manifest.check("all-mpnet-base-v2", 384)
+    with pytest.raises(IndexMismatchError):
+        manifest.check("all-MiniLM-L6-v2", 768)
@@ -0,0 +1,113 @@
+"""Tests for normalised metadata and the metadata index"""
+import os
+import pickle
+import pytest
+from app.services.metadata_index import (
+    MetadataIndex,
+    normalize_metadata,
+    split_filter,
+    to_where,
+)
+
+def chunk_metadata(space_key, author, labels, last_modified):
+    return normalize_metadata(
+        {"space_key": space_key, "author": author, "last_modified": last_modified},
+        labels=labels
+    )
+
+@pytest.fixture
+def metadata_index(tmp_path):
+    index = MetadataIndex(str(tmp_path / "metadata_index.json"))
+    index.add(
+        ["a_0", "a_1", "b_0", "c_0"],
+        [
+            chunk_metadata("ENG", "Alice", ["api", "runbook"], "2025-01-10T00:00:00Z"),
+            chunk_metadata("ENG", "Alice", ["api", "runbook"], "2025-01-10T00:00:00Z"),
+            chunk_metadata("ENG", "Bob", ["api"], "2025-03-01T00:00:00Z"),
+            chunk_metadata("OPS", "Bob", ["runbook"], "2025-06-01T00:00:00Z"),
+        ]
+    )
+    return index
+
+def test_normalize_metadata():
+    """Test that labels become boolean fields and dates become timestamps"""
+    metadata = chunk_metadata("ENG", "Alice", ["api", "runbook"], "2025-07-05T10:00:00Z")
+
+    assert metadata["labels"] == "api,runbook"
+    assert metadata["label:api"] is True
+    assert metadata["label:runbook"] is True
+    assert metadata["last_modified_ts"] == 1751709600.0
+
+def test_split_filter_and_where():
+    """Test that indexable keys are separated from plain ChromaDB filters"""
+    structured, remaining = split_filter({"labels": ["api"], "space_key": "ENG", "type": "page"})
+
+    assert structured == {"labels": ["api"], "space_key": "ENG"}
+    assert remaining == {"type": "page"}
+    assert to_where(structured, remaining) == {
+        "$and": [{"label:api": True}, {"space_key": "ENG"}, {"type": "page"}]
+    }
+
+def test_date_bounds_agree_between_where_and_index(metadata_index):
+    """Test that an unparseable date is rejected and an empty bound is open in both filter paths"""
+    with pytest.raises(ValueError):
+        split_filter({"last_modified_after": "last tuesday"})
+
+    structured, remaining = split_filter({"last_modified_after": "", "last_modified_before": "2025-04-01T00:00:00Z"})
+    assert to_where(structured, remaining) == {"last_modified_ts": {"$lte": 1743465600.0}}
+    assert metadata_index.resolve(structured) == {"a_0", "a_1", "b_0"}
+
+def test_resolve_filters(metadata_index):
+    """Test resolving label, author, space and date filters to candidate IDs"""
+    assert metadata_index.resolve({}) is None
+    assert metadata_index.resolve({"labels": ["api", "runbook"]}) == {"a_0", "a_1"}
+    assert metadata_index.resolve({"author": "Bob", "label": "runbook"}) == {"c_0"}
+    assert metadata_index.resolve({"space_key": ["ENG", "OPS"], "author": "Bob"}) == {"b_0", "c_0"}
+    assert metadata_index.resolve({"last_modified_after": "2025-02-01T00:00:00Z"}) == {"b_0", "c_0"}
+    assert metadata_index.resolve({
+        "last_modified_after": "2025-02-01T00:00:00Z",
+        "last_modified_before": "2025-04-01T00:00:00Z"
+    }) == {"b_0"}
+    assert metadata_index.resolve({"labels": ["missing"]}) == set()
+
+def test_incremental_updates_and_persistence(metadata_index):
+    """Test that re-indexing and removal keep postings consistent across reloads"""
+    metadata_index.add(["b_0"], [chunk_metadata("OPS", "Bob", [], "2025-03-01T00:00:00Z")])
+    metadata_index.remove(["a_1"])
+    metadata_index.save()
+
+    reloaded = MetadataIndex(metadata_index.path)
+
+    assert len(reloaded) == 3
+    assert reloaded.resolve({"label": "api"}) == {"a_0"}
+    assert reloaded.resolve({"space_key": "OPS"}) == {"b_0", "c_0"}
+
+def test_saves_log_changes_until_the_snapshot_is_due(metadata_index):
+    """Test that saves append the changes since the last one and replay on load, without pickle"""
+    metadata_index.save()
+    snapshot = os.path.getmtime(metadata_index.path), os.path.getsize(metadata_index.path)
+    metadata_index.add(["d_0"], [chunk_metadata("OPS", "Carol", ["api"], "2025-08-01T00:00:00Z")])
+    metadata_index.remove(["a_0"])
+    metadata_index.save()
+
+    assert (os.path.getmtime(metadata_index.path), os.path.getsize(metadata_index.path)) == snapshot
+    with open(f"{metadata_index.path}.log", "rb") as f:
+        assert len(f.read().splitlines()) == 3
+    reloaded = MetadataIndex(metadata_index.path)
+    assert reloaded.resolve({"label": "api"}) == {"a_1", "b_0", "d_0"}
+    assert reloaded.resolve({"last_modified_after": "2025-07-01T00:00:00Z"}) == {"d_0"}
+
+    # Once the log outgrows the snapshot, the next save writes a new snapshot and an empty log
+    for i in range(10):
+        reloaded.add([f"e_{i}"], [chunk_metadata("HR", "Dan", [], "2025-09-01T00:00:00Z")])
+        reloaded.save()
+    with open(f"{metadata_index.path}.log", "rb") as f:
+        assert len(f.read().splitlines()) < 10
+    assert len(MetadataIndex(metadata_index.path)) == len(reloaded) == 14
+
+def test_pickled_index_is_ignored(tmp_path):
+    """Test that an index file written with pickle is not unpickled"""
+    path = str(tmp_path / "metadata_index.json")
+    with open(path, "wb") as f:
+        pickle.dump({"version": 1}, f)
+    assert len(MetadataIndex(path)) == 0
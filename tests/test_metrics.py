@@ -0,0 +1,41 @@
+"""Tests for metrics exposition and tracing spans"""
+from app.core import tracing
+from app.core.config import Settings
+from app.core.metrics import MetricsRegistry
+
+def test_render_prometheus():
+    """Test counters, gauges and cumulative histogram buckets in the text format"""
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests by status").inc(2, status="200")
+    registry.gauge("queue_depth", "Queued items").set(3)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05, stage="encode")
+    latency.observe(0.5, stage="encode")
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{status="200"} 2' in lines
+    assert "queue_depth 3" in lines
+    assert 'latency_seconds_bucket{stage="encode",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="encode",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="encode",le="+Inf"} 2' in lines
+    assert 'latency_seconds_count{stage="encode"} 2' in lines
+
+def test_spans_are_noop_when_disabled():
+    """Test disabled tracing hands out one shared no-op span"""
+    tracing.configure(Settings(_env_file=None, TRACING_ENABLED=False))
+    assert tracing.span("a") is tracing.span("b")
+
+def test_spans_nest_when_enabled():
+    """Test an inner span joins the outer span's trace with it as parent"""
+    tracing.configure(Settings(_env_file=None, TRACING_ENABLED=True))
+    try:
+        with tracing.span("request") as outer:
+            with tracing.span("search.encode") as inner:
+                pass
+        assert inner.trace_id == outer.trace_id
+        assert inner.parent is outer and outer.parent is None
+        assert outer.duration >= inner.duration
+    finally:
+        tracing.configure(Settings(_env_file=None))
@@ -0,0 +1,132 @@
+"""Tests for the memory-mapped vector store"""
+import os
+import pickle
+import numpy as np
+import pytest
+from unittest.mock import patch
+from app.services.mmap_store import LEGACY_STATE_FILE, METADATA_FILE, STATE_FILE, MmapVectorStore
+from app.services.vector_store import matches_where
+
+@pytest.fixture
+def mmap_store(settings, tmp_path):
+    return MmapVectorStore(settings, path=str(tmp_path / "mmap_index"))
+
+@pytest.fixture
+async def populated_store(mmap_store):
+    await mmap_store.add_documents(
+        ids=["a_0", "b_0", "c_0"],
+        documents=["alpha chunk", "beta chunk", "gamma chunk ✓"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 2.0]],
+        metadatas=[{"space_key": "ENG"}, {"space_key": "OPS"}, {"space_key": "ENG"}]
+    )
+    return mmap_store
+
+@pytest.mark.asyncio
+async def test_search_exact(populated_store):
+    """Test exact cosine search returns nearest chunks first"""
+    results = await populated_store.search_batch([[0.0, 0.1, 1.0], [1.0, 0.0, 0.0]], n_results=2)
+
+    assert [doc["id"] for doc in results[0]] == ["c_0", "b_0"]
+    assert results[0][0]["content"] == "gamma chunk ✓"
+    assert results[1][0]["id"] == "a_0"
+    assert results[1][0]["distance"] == pytest.approx(0.0)
+
+@pytest.mark.asyncio
+async def test_search_with_where(populated_store):
+    """Test metadata filtering during search"""
+    results = await populated_store.search([0.0, 1.0, 0.0], n_results=3, where={"space_key": "ENG"})
+
+    assert {doc["id"] for doc in results} == {"a_0", "c_0"}
+
+@pytest.mark.asyncio
+async def test_upsert_and_delete(populated_store):
+    """Test that upserts replace rows and deletes hide them"""
+    await populated_store.add_documents(
+        ids=["a_0"], documents=["alpha v2"], embeddings=[[0.0, 1.0, 0.0]], metadatas=[{"space_key": "ENG"}]
+    )
+    await populated_store.delete_documents(["b_0"])
+
+    assert await populated_store.count() == 2
+    results = await populated_store.search([0.0, 1.0, 0.0], n_results=3)
+    assert [doc["id"] for doc in results] == ["a_0", "c_0"]
+    assert results[0]["content"] == "alpha v2"
+
+@pytest.mark.asyncio
+async def test_reopen_read_only(populated_store, settings):
+    """Test that a second read-only instance sees the committed index"""
+    reader = MmapVectorStore(settings, path=populated_store.path, read_only=True)
+
+    assert await reader.count() == 3
+    docs = await reader.get_documents(["b_0", "missing"], include_embeddings=True)
+    assert docs[0]["content"] == "beta chunk"
+    assert list(docs[0]["embedding"]) == [0.0, 1.0, 0.0]
+
+    with pytest.raises(PermissionError):
+        await reader.delete_documents(["a_0"])
+
+@pytest.mark.asyncio
+async def test_search_only_scores_candidates(populated_store):
+    """Test that candidate IDs from the metadata index bound the rows a filtered search scores"""
+    with patch("app.services.mmap_store.matches_where", wraps=matches_where) as check:
+        results = await populated_store.search(
+            [0.0, 1.0, 0.0], n_results=3, where={"space_key": "ENG"}, candidates={"a_0", "c_0", "missing"}
+        )
+
+    assert [doc["id"] for doc in results] == ["a_0", "c_0"]
+    assert check.call_count == 2
+
+@pytest.mark.asyncio
+async def test_writes_append_only_their_batch(populated_store, settings):
+    """Test that a commit appends its rows and tombstones instead of rewriting the whole state"""
+    log = os.path.join(populated_store.path, METADATA_FILE)
+    size = os.path.getsize(log)
+    await populated_store.add_documents(
+        ids=["d_0"], documents=["delta chunk"], embeddings=[[1.0, 1.0, 0.0]], metadatas=[{"space_key": "HR"}]
+    )
+    await populated_store.delete_documents(["a_0"])
+
+    with open(log, "rb") as f:
+        f.seek(size)
+        assert f.read().splitlines() == [b'["d_0",{"space_key":"HR"}]']
+    reopened = MmapVectorStore(settings, path=populated_store.path)
+    assert await reopened.list_ids() == ["b_0", "c_0", "d_0"]
+    assert (await reopened.get_document("d_0"))["metadata"] == {"space_key": "HR"}
+
+@pytest.mark.asyncio
+async def test_converts_pickled_state(populated_store, settings):
+    """Test that an index whose IDs and metadata were pickled whole opens and is converted"""
+    await populated_store.delete_documents(["b_0"])
+    os.remove(os.path.join(populated_store.path, STATE_FILE))
+    with open(os.path.join(populated_store.path, LEGACY_STATE_FILE), "wb") as f:
+        pickle.dump({
+            "version": 1, "dim": 3, "count": 3,
+            "ids": ["a_0", None, "c_0"],
+            "metadatas": [{"space_key": "ENG"}, None, {"space_key": "ENG"}],
+            "deleted": np.array([1]),
+        }, f)
+
+    converted = MmapVectorStore(settings, path=populated_store.path)
+    assert await converted.list_ids() == ["a_0", "c_0"]
+    assert not os.path.exists(os.path.join(populated_store.path, LEGACY_STATE_FILE))
+    assert await MmapVectorStore(settings, path=populated_store.path).list_ids() == ["a_0", "c_0"]
+
+@pytest.mark.asyncio
+async def test_hnsw_catches_up_with_rows_committed_after_save(settings, tmp_path):
+    """Test that a graph saved before later writes is brought up to date when the index is opened"""
+    pytest.importorskip("hnswlib")
+    settings = settings.model_copy(update={"MMAP_HNSW": True})
+    store = MmapVectorStore(settings, path=str(tmp_path / "hnsw_index"))
+    vectors = np.random.default_rng(0).normal(size=(12, 3))
+    for i in range(0, 12, 4):
+        await store.add_documents(
+            [f"chunk {j}" for j in range(i, i + 4)], [f"{j}_0" for j in range(i, i + 4)],
+            vectors[i:i + 4].tolist(), [{} for _ in range(4)]
+        )
+    await store.delete_documents(["11_0"])
+    # Saved at 4 and 8 rows; the last batch and the delete only reach the state file
+    assert store._hnsw_saved == 8
+
+    reopened = MmapVectorStore(settings, path=store.path, read_only=True)
+    assert reopened._hnsw.get_current_count() == 12
+    assert (await reopened.search(vectors[9].tolist(), n_results=1))[0]["id"] == "9_0"
+    assert "11_0" not in {doc["id"] for doc in await reopened.search(vectors[11].tolist(), n_results=11)}
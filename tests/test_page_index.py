@@ -0,0 +1,84 @@
+"""Tests for the page-level index and hierarchical search"""
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import Settings
+from app.services.mmap_store import MmapVectorStore
+from app.services.page_index import PageIndex, page_vector
+from app.services.rag import RAGService
+
+WORDS = ("alpha", "beta", "gamma")
+
+@pytest.fixture
+def rag_service(tmp_path):
+    settings = Settings(
+        CHROMA_PERSIST_DIR=str(tmp_path / "state"),
+        MMAP_INDEX_DIR=str(tmp_path / "mmap"),
+        VECTOR_BACKEND="mmap",
+        CHUNK_SIZE=1000,
+        HYBRID_SEARCH=False,
+        DEDUP_ENABLED=False,
+        HIERARCHICAL_SEARCH=True,
+        HIERARCHICAL_TOP_PAGES=1,
+        _env_file=None
+    )
+    model = Mock()
+    model.encode.side_effect = lambda texts: [
+        [float(text.lower().count(word)) for word in WORDS] + [0.1] for text in texts
+    ]
+    model.get_sentence_embedding_dimension.return_value = 4
+    with patch("sentence_transformers.SentenceTransformer", return_value=model):
+        return RAGService(MmapVectorStore(settings), settings)
+
+def test_page_index_search_remove_and_persist(tmp_path):
+    """Test that pages rank by similarity, removed rows are reused and the index survives a reload"""
+    path = str(tmp_path / "pages.pkl")
+    index = PageIndex(path)
+    index.add("a", [1.0, 0.0])
+    index.add("b", [0.6, 0.8])
+    index.add("c", [0.0, 1.0])
+    assert index.search([[1.0, 0.1], [0.0, 1.0]], k=2) == [["a", "b"], ["c", "b"]]
+
+    index.remove(["a", "unknown"])
+    index.add("d", [-1.0, 0.0])
+    assert len(index) == 3 and "a" not in index
+    assert index.search([[1.0, 0.0]], k=5) == [["b", "c", "d"]]
+
+    index.save()
+    assert PageIndex(path).search([[1.0, 0.0]], k=1) == [["b"]]
+
+def test_page_vector_blends_title_into_pooled_chunks():
+    """Test that a page vector is the normalised chunk mean pulled towards the title"""
+    pooled = page_vector([[2.0, 0.0], [0.0, 1.0]])
+    assert np.allclose(pooled, [np.sqrt(0.5), np.sqrt(0.5)])
+    titled = page_vector([[2.0, 0.0], [0.0, 1.0]], title_embedding=[1.0, 0.0], title_weight=0.5)
+    assert titled[0] > titled[1] and np.isclose(np.linalg.norm(titled), 1.0)
+
+@pytest.mark.asyncio
+async def test_search_ranks_chunks_of_the_closest_pages_only(rag_service):
+    """Test that chunks are ranked only within the top pages, and deleted pages leave the page index"""
+    await rag_service.ingest_documents([
+        {"id": str(i), "title": f"{word} guide", "content": f"{word} notes", "space_key": "ENG"}
+        for i, word in enumerate(WORDS)
+    ])
+    assert len(rag_service.pages) == 3
+    # Each page's title was embedded in the same call as its chunks
+    assert rag_service.model.encode.call_args.args[0] == ["gamma notes", "gamma guide"]
+
+    # The store gets the top pages' chunk IDs from the page postings, and the page filter for ChromaDB
+    search_batch = rag_service.vector_store.search_batch
+    with patch.object(rag_service.vector_store, "search_batch", wraps=search_batch) as search:
+        results = await rag_service.search("beta", n_results=3)
+    assert [doc["metadata"]["page_id"] for doc in results] == ["1"]
+    assert search.call_args.kwargs["candidates"] == {"1_0"}
+    assert search.call_args.kwargs["where"] == {"page_id": {"$in": ["1"]}}
+
+    batch = await rag_service.search_batch(["alpha", "gamma"], n_results=3)
+    assert sorted(doc["metadata"]["page_id"] for doc in batch[0]) == ["0", "2"]
+
+    # Structured filters skip the page stage and search every matching chunk
+    results = await rag_service.search("beta", n_results=3, metadata_filter={"space_key": "ENG"})
+    assert len(results) == 3
+
+    await rag_service.delete_documents(["1_0"])
+    assert "1" not in rag_service.pages
@@ -1,12 +1,20 @@
 """Tests for RAG service"""
+import os
 import pytest
 from unittest.mock import Mock, patch, AsyncMock
+from app.core.config import Settings
+from app.services.lexical import LexicalIndex
+from app.services.metadata_index import MetadataIndex
+from app.services.mmap_store import MmapVectorStore
+from app.services.progress import CrawlProgress, JobCancelled
 from app.services.rag import RAGService
+from app.services.manifest import IndexManifest, IndexMismatchError
 
 @pytest.fixture
 def mock_embedding_model():
     mock = Mock()
     mock.encode = Mock()  # Set the return value in each test for more flexibility
+    mock.get_sentence_embedding_dimension.return_value = 3
     return mock
 
 @pytest.fixture
@@ -14,6 +22,8 @@ def mock_chromadb():
     mock = Mock()
     mock.search = AsyncMock()
     mock.add_documents = AsyncMock()
+    mock.max_batch_size.return_value = 100
+    mock.distance_space.return_value = "l2"
     return mock
 
 @pytest.fixture
@@ -69,7 +79,7 @@ async def test_search_no_results(rag_service, mock_chromadb, mock_embedding_mode
     assert len(results) == 0
 
 @pytest.mark.asyncio
-async def test_ingest_documents(rag_service, mock_chromadb):
+async def test_ingest_documents(rag_service, mock_chromadb, mock_embedding_model):
     """Test document ingestion"""
     # Test data
     documents = [
@@ -84,9 +94,191 @@ async def test_ingest_documents(rag_service, mock_chromadb):
     
     # Configure mock
     mock_chromadb.add_documents = AsyncMock()
+    mock_embedding_model.encode.return_value = [[0.1, 0.2, 0.3]]
     
     # Test ingestion
     await rag_service.ingest_documents(documents)
     
     # Verify
     mock_chromadb.add_documents.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_search_hybrid_fusion(rag_service, mock_chromadb, mock_embedding_model):
+    """Test that lexical-only hits are merged into the vector results"""
+    rag_service.lexical.add(["page2_0"], ["Runbook for ERR-1234 failures"])
+
+    mock_chromadb.search.return_value = [
+        {
+            "id": "page1_0",
+            "content": "Unrelated content",
+            "metadata": {"title": "Doc 1", "url": "http://test1.com", "last_modified": "2025-07-05T10:00:00Z"},
+            "distance": 0.4
+        }
+    ]
+    mock_chromadb.get_documents = AsyncMock(return_value=[
+        {
+            "id": "page2_0",
+            "content": "Runbook for ERR-1234 failures",
+            "metadata": {"title": "Doc 2", "url": "http://test2.com", "last_modified": "2025-07-05T10:00:00Z"},
+            "embedding": [0.6, 0.8]
+        }
+    ])
+    mock_embedding_model.encode.return_value = [[1.0, 0.0]]
+
+    results = await rag_service.search("ERR-1234", n_results=2)
+
+    assert {doc["id"] for doc in results} == {"page1_0", "page2_0"}
+    lexical_doc = next(doc for doc in results if doc["id"] == "page2_0")
+    # Scored in the store's squared L2 metric, like the vector hit beside it, not as cosine distance (0.4)
+    assert lexical_doc["distance"] == pytest.approx(0.8)
+    assert "embedding" not in lexical_doc
+    mock_chromadb.get_documents.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_search_batch(rag_service, mock_chromadb, mock_embedding_model):
+    """Test batch search encodes once and groups queries by filter"""
+    def doc(doc_id):
+        return {"id": doc_id, "content": "content", "metadata": {}, "distance": 0.1}
+
+    mock_embedding_model.encode.return_value = [[0.1], [0.2], [0.3]]
+    mock_chromadb.search_batch = AsyncMock(side_effect=[
+        [[doc("a")], [doc("c")]],
+        [[doc("b")]],
+    ])
+
+    results = await rag_service.search_batch(
+        ["query a", "query b", "query c"],
+        n_results=2,
+        metadata_filters=[None, {"space_key": "TEST"}, None]
+    )
+
+    mock_embedding_model.encode.assert_called_once_with(["query a", "query b", "query c"])
+    assert mock_chromadb.search_batch.call_count == 2
+    assert [[d["id"] for d in r] for r in results] == [["a"], ["b"], ["c"]]
+
+@pytest.mark.asyncio
+async def test_query_encode_runs_off_event_loop(rag_service, mock_chromadb, mock_embedding_model):
+    """Test query embedding runs in a worker thread so other requests keep being served"""
+    import threading
+    threads = []
+
+    def encode(texts):
+        threads.append(threading.current_thread())
+        return [[0.1] for _ in texts]
+    mock_embedding_model.encode.side_effect = encode
+    mock_chromadb.search.return_value = []
+    mock_chromadb.search_batch = AsyncMock(return_value=[[], []])
+
+    await rag_service.search("query")
+    await rag_service.search_batch(["query a", "query b"])
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+@pytest.mark.asyncio
+async def test_search_narrow_filter_uses_exact_search(rag_service, mock_chromadb, mock_embedding_model):
+    """Test that a filter resolved by the metadata index searches only its candidates"""
+    rag_service.metadata_index.add(
+        ["a_0", "b_0"],
+        [{"space_key": "TEST", "label:api": True}, {"space_key": "TEST"}]
+    )
+    mock_chromadb.get_documents = AsyncMock(return_value=[
+        {"id": "a_0", "content": "API docs", "metadata": {"title": "API"}, "embedding": [0.0, 2.0]}
+    ])
+    mock_embedding_model.encode.return_value = [[0.0, 1.0]]
+
+    results = await rag_service.search("api", metadata_filter={"label": "api"})
+
+    mock_chromadb.search.assert_not_called()
+    assert mock_chromadb.get_documents.call_args.args[0] == ["a_0"]
+    assert len(results) == 1
+    # Squared L2 like the l2 collection's own search, not cosine distance (0.0)
+    assert results[0]["distance"] == pytest.approx(1.0)
+
+@pytest.mark.asyncio
+async def test_open_index_writes_and_checks_manifest(rag_service, mock_chromadb, settings):
+    """Test that opening the index records a manifest and rejects a different model"""
+    mock_chromadb.count = AsyncMock(return_value=0)
+
+    assert await rag_service.open_index() == 0
+    manifest = IndexManifest.load(settings.CHROMA_PERSIST_DIR)
+    assert manifest.embedding_model == settings.EMBEDDING_MODEL
+    assert manifest.dimension == 3
+
+    manifest.embedding_model = "other-model"
+    manifest.save(settings.CHROMA_PERSIST_DIR)
+    with pytest.raises(IndexMismatchError):
+        await rag_service.open_index()
+
+@pytest.mark.asyncio
+async def test_ingest_bumps_generation(rag_service, mock_chromadb, mock_embedding_model, settings):
+    """Test that each completed ingest advances the manifest generation"""
+    mock_embedding_model.encode.return_value = [[0.1, 0.2, 0.3]]
+    document = {
+        "id": "1", "title": "Doc", "content": "Short content", "url": "http://test.com",
+        "space_key": "TEST", "author": "Author", "last_modified": "2025-07-05T10:00:00Z"
+    }
+
+    await rag_service.ingest_documents([document])
+    await rag_service.ingest_documents([document])
+
+    assert IndexManifest.load(settings.CHROMA_PERSIST_DIR).generation == 2
+
+@pytest.mark.asyncio
+async def test_cancelled_ingest_persists_indexes_of_written_rows(tmp_path):
+    """Test that rows flushed before a cancellation keep their side index entries after a restart"""
+    settings = Settings(
+        CHROMA_PERSIST_DIR=str(tmp_path / "state"),
+        MMAP_INDEX_DIR=str(tmp_path / "mmap"),
+        VECTOR_BACKEND="mmap",
+        WRITE_BATCH_SIZE=1,
+        _env_file=None
+    )
+    progress = CrawlProgress()
+    model = Mock()
+    model.get_sentence_embedding_dimension.return_value = 2
+
+    def encode(texts):
+        # Cancel while the first page is being embedded; the check before the second page stops the ingest
+        progress.cancel()
+        return [[1.0, float(len(text))] for text in texts]
+
+    model.encode.side_effect = encode
+    rag = RAGService(MmapVectorStore(settings), settings, model=model)
+    with pytest.raises(JobCancelled):
+        await rag.ingest_documents(
+            [{"id": "1", "content": "first page"}, {"id": "2", "content": "second page"}], progress
+        )
+
+    assert await rag.vector_store.list_ids() == ["1_0"]
+    metadata_index = MetadataIndex(os.path.join(settings.CHROMA_PERSIST_DIR, settings.METADATA_INDEX_FILE))
+    assert metadata_index.resolve({"page_id": "1"}) == {"1_0"}
+    lexical = LexicalIndex(os.path.join(settings.CHROMA_PERSIST_DIR, settings.LEXICAL_INDEX_FILE))
+    assert len(lexical) == 1
+
+@pytest.mark.asyncio
+async def test_open_index_rebuilds_missing_side_indexes(tmp_path):
+    """Test that an index whose metadata or lexical index file is gone, or in an old format, gets it back from the store"""
+    settings = Settings(
+        CHROMA_PERSIST_DIR=str(tmp_path / "state"),
+        MMAP_INDEX_DIR=str(tmp_path / "mmap"),
+        VECTOR_BACKEND="mmap",
+        _env_file=None
+    )
+    model = Mock()
+    model.get_sentence_embedding_dimension.return_value = 2
+    model.encode.side_effect = lambda texts: [[1.0, float(len(text))] for text in texts]
+    rag = RAGService(MmapVectorStore(settings), settings, model=model)
+    await rag.ingest_documents([{"id": "1", "content": "first page", "space_key": "ENG"}])
+    path = os.path.join(settings.CHROMA_PERSIST_DIR, settings.METADATA_INDEX_FILE)
+    os.remove(path)
+    os.remove(f"{path}.log")
+    lexical_path = os.path.join(settings.CHROMA_PERSIST_DIR, settings.LEXICAL_INDEX_FILE)
+    os.remove(lexical_path)
+
+    reopened = RAGService(MmapVectorStore(settings), settings, model=model)
+    assert await reopened.open_index() == 1
+    assert reopened.metadata_index.resolve({"space_key": "ENG"}) == {"1_0"}
+    assert MetadataIndex(path).resolve({"page_id": "1"}) == {"1_0"}
+    assert reopened.lexical.search("first")[0][0] == "1_0"
+    assert len(LexicalIndex(lexical_path)) == 1
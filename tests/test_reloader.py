@@ -0,0 +1,97 @@
+"""Tests for read-only serving processes following the writer's index generations"""
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import Settings
+from app.services.manifest import IndexMismatchError
+from app.services.mmap_store import MmapVectorStore
+from app.services.rag import RAGService
+from app.services.reloader import IndexReloader
+from app.services.vector_store import create_vector_store
+
+def _settings(root, **overrides):
+    return Settings(
+        CHROMA_PERSIST_DIR=str(root / "state"),
+        MMAP_INDEX_DIR=str(root / "mmap"),
+        VECTOR_BACKEND="mmap",
+        CHUNK_SIZE=1000,
+        _env_file=None,
+        **overrides
+    )
+
+def _rag(settings):
+    model = Mock()
+    model.encode.side_effect = lambda texts: [[1.0, float(text.count("e")), float(len(text))] for text in texts]
+    model.get_sentence_embedding_dimension.return_value = 3
+    with patch("sentence_transformers.SentenceTransformer", return_value=model):
+        return RAGService(create_vector_store(settings), settings)
+
+@pytest.mark.asyncio
+async def test_reader_switches_to_published_generations(tmp_path):
+    """Test that a read-only process serves each generation the writer publishes, without restarting"""
+    writer = _rag(_settings(tmp_path))
+    reader = _rag(_settings(tmp_path, READ_ONLY=True))
+    assert isinstance(reader.vector_store, MmapVectorStore) and reader.vector_store.read_only
+    await reader.open_index()
+    assert reader.manifest.generation == 0
+
+    reloaded = Mock()
+    reloader = IndexReloader(reader, on_reload=reloaded)
+    assert not await reloader.reload()
+
+    await writer.ingest_documents([{"id": "1", "title": "Release", "content": "release checklist"}])
+    assert await reloader.reload()
+    assert reloader.generation == 1
+    assert reloaded.call_count == 1
+    assert [doc["id"] for doc in await reader.search("release checklist")] == ["1_0"]
+    assert reader.metadata_index.resolve({"page_id": "1"}) == {"1_0"}
+
+    # Nothing new published: the served index stays as it is
+    assert not await reloader.reload()
+
+    await writer.ingest_documents([{"id": "2", "title": "Onboarding", "content": "onboarding notes"}])
+    await writer.delete_documents(["1_0"])
+    assert await reloader.reload()
+    assert sorted(await reader.vector_store.list_ids()) == ["2_0"]
+
+    with pytest.raises(PermissionError):
+        await reader.vector_store.add_documents(["x"], ["x_0"], [[1.0, 0.0, 0.0]], [{}])
+
+@pytest.mark.asyncio
+async def test_failed_reload_keeps_serving_current_generation(tmp_path):
+    """Test that a generation built with another model is refused and the current one kept"""
+    writer = _rag(_settings(tmp_path))
+    await writer.ingest_documents([{"id": "1", "content": "release checklist"}])
+    reader = _rag(_settings(tmp_path, READ_ONLY=True))
+    await reader.open_index()
+    reloader = IndexReloader(reader)
+
+    writer.manifest.embedding_model = "another-model"
+    writer.record_generation()
+    with pytest.raises(IndexMismatchError):
+        await reloader.reload()
+    assert reloader.generation == 1
+    assert [doc["id"] for doc in await reader.search("release checklist")] == ["1_0"]
+
+@pytest.mark.asyncio
+async def test_maintenance_publishes_generations(tmp_path):
+    """Test that garbage collection and compaction publish a generation readers switch to"""
+    from app.services.maintenance import IndexMaintenance
+    writer = _rag(_settings(tmp_path, INDEX_SWAP_GRACE_SECONDS=0))
+    await writer.ingest_documents([
+        {"id": "1", "title": "Release", "content": "release checklist"},
+        {"id": "2", "title": "Onboarding", "content": "onboarding notes"}
+    ])
+    reader = _rag(_settings(tmp_path, READ_ONLY=True, INDEX_SWAP_GRACE_SECONDS=0))
+    await reader.open_index()
+    reloader = IndexReloader(reader)
+    maintenance = IndexMaintenance(writer)
+
+    await maintenance.collect_garbage({"1"})
+    assert await reloader.reload()
+    assert sorted(await reader.vector_store.list_ids()) == ["1_0"]
+    assert reader.metadata_index.resolve({"page_id": "2"}) == set()
+
+    await maintenance.compact()
+    assert await reloader.reload()
+    assert reader.vector_store.path == writer.vector_store.path
+    assert [doc["id"] for doc in await reader.search("release checklist")] == ["1_0"]
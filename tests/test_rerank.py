@@ -0,0 +1,79 @@
+"""Tests for the rerank service"""
+import time
+import pytest
+from unittest.mock import Mock, patch
+from app.services.rerank import RerankService, RERANK_ORDER_CHANGED, RERANK_REQUESTS
+
+@pytest.fixture
+def mock_cross_encoder():
+    mock = Mock()
+    # Score by content length so the longest candidate wins
+    mock.predict.side_effect = lambda pairs, **kwargs: [float(len(doc)) for _, doc in pairs]
+    return mock
+
+@pytest.fixture
+def rerank_service(settings, mock_cross_encoder):
+    settings.RERANK_BATCH_SIZE = 2
+    with patch("sentence_transformers.CrossEncoder") as mock_class:
+        mock_class.return_value = mock_cross_encoder
+        return RerankService(settings)
+
+@pytest.fixture
+def candidates():
+    return [
+        {"id": "a", "content": "short", "distance": 0.1},
+        {"id": "b", "content": "a much longer chunk", "distance": 0.2},
+        {"id": "c", "content": "medium text", "distance": 0.3},
+    ]
+
+@pytest.mark.asyncio
+async def test_rerank_orders_by_score(rerank_service, candidates, mock_cross_encoder):
+    """Test that candidates are reordered by cross-encoder score"""
+    changed_before = RERANK_ORDER_CHANGED.value()
+
+    results = await rerank_service.rerank("query", candidates, top_k=2)
+
+    assert [doc["id"] for doc in results] == ["b", "c"]
+    assert results[0]["rerank_score"] == 19.0
+    assert mock_cross_encoder.predict.call_count == 2  # 3 pairs in batches of 2
+    assert RERANK_ORDER_CHANGED.value() == changed_before + 1
+
+@pytest.mark.asyncio
+async def test_rerank_uses_score_cache(rerank_service, candidates, mock_cross_encoder):
+    """Test that repeated (query, chunk) pairs are not scored again"""
+    await rerank_service.rerank("query", candidates, top_k=3)
+    mock_cross_encoder.predict.reset_mock()
+
+    results = await rerank_service.rerank("query", candidates, top_k=3)
+
+    mock_cross_encoder.predict.assert_not_called()
+    assert [doc["id"] for doc in results] == ["b", "c", "a"]
+
+@pytest.mark.asyncio
+async def test_rerank_cache_misses_edited_chunk(rerank_service, candidates, mock_cross_encoder):
+    """Test that a chunk re-ingested with new text under the same ID is scored again"""
+    await rerank_service.rerank("query", candidates, top_k=3)
+    mock_cross_encoder.predict.reset_mock()
+
+    edited = [{**candidates[0], "content": "an edited chunk that is now the longest"}] + candidates[1:]
+    results = await rerank_service.rerank("query", edited, top_k=3)
+
+    assert mock_cross_encoder.predict.call_args.args[0] == [("query", edited[0]["content"])]
+    assert results[0]["id"] == "a"
+
+@pytest.mark.asyncio
+async def test_rerank_timeout_falls_back(rerank_service, candidates, mock_cross_encoder):
+    """Test that exceeding the budget keeps the vector order"""
+    rerank_service.settings.RERANK_TIMEOUT_MS = 10
+
+    def slow_predict(pairs, **kwargs):
+        time.sleep(0.05)
+        return [0.0] * len(pairs)
+
+    mock_cross_encoder.predict.side_effect = slow_predict
+    timeouts_before = RERANK_REQUESTS.value(outcome="timeout")
+
+    results = await rerank_service.rerank("query", candidates, top_k=2)
+
+    assert [doc["id"] for doc in results] == ["a", "b"]
+    assert RERANK_REQUESTS.value(outcome="timeout") == timeouts_before + 1
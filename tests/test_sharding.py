@@ -0,0 +1,66 @@
+"""Tests for the per-space sharded vector store"""
+import os
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.mmap_store import MmapVectorStore
+from app.services.sharding import ShardedVectorStore, shard_spaces
+
+@pytest.fixture
+def factory(settings, tmp_path):
+    return lambda name: MmapVectorStore(settings, path=str(tmp_path / "shards" / name))
+
+@pytest.fixture
+async def sharded(settings, factory):
+    store = ShardedVectorStore(settings, factory)
+    await store.add_documents(
+        ids=["eng_0", "eng_1", "ops_0", "hr_0"],
+        documents=["eng zero", "eng one", "ops zero", "hr zero"],
+        embeddings=[[1.0, 0.0], [0.8, 0.6], [0.9, 0.1], [0.0, 1.0]],
+        metadatas=[{"space_key": "ENG"}, {"space_key": "ENG"}, {"space_key": "OPS"}, {"space_key": "HR"}]
+    )
+    return store
+
+def test_shard_spaces():
+    """Test extracting the spaces a where clause can match"""
+    assert shard_spaces(None) is None
+    assert shard_spaces({"space_key": "ENG"}) == {"ENG"}
+    assert shard_spaces({"$and": [{"space_key": {"$in": ["ENG", "OPS"]}}, {"author": "a"}]}) == {"ENG", "OPS"}
+    assert shard_spaces({"$or": [{"space_key": "ENG"}, {"author": "a"}]}) is None
+
+@pytest.mark.asyncio
+async def test_fan_out_merges_top_k(sharded):
+    """Test that an unfiltered search merges every shard by distance"""
+    results = await sharded.search([1.0, 0.0], n_results=3)
+
+    assert sharded.spaces() == ["ENG", "HR", "OPS"]
+    assert [doc["id"] for doc in results] == ["eng_0", "ops_0", "eng_1"]
+
+@pytest.mark.asyncio
+async def test_filter_routes_to_matching_shards(sharded):
+    """Test that a space filter only searches that space"""
+    results = await sharded.search([0.0, 1.0], n_results=5, where={"space_key": "OPS"})
+
+    assert [doc["id"] for doc in results] == ["ops_0"]
+
+@pytest.mark.asyncio
+async def test_rebuild_and_swap(sharded, settings, factory):
+    """Test that swapping a rebuilt shard replaces only that space and survives reopening"""
+    name, shadow = await sharded.create_shadow("ENG")
+    await shadow.add_documents(
+        ids=["eng_new"], documents=["eng rebuilt"], embeddings=[[1.0, 0.0]], metadatas=[{"space_key": "ENG"}]
+    )
+    assert await sharded.count() == 4
+
+    old = await sharded.swap("ENG", name, shadow)
+
+    # The replaced shard stays readable for in-flight searches until the grace period ends
+    assert await old.count() == 2
+    with patch("app.services.sharding.asyncio.sleep", new=AsyncMock()) as sleep:
+        await sharded.retire(old)
+    sleep.assert_awaited_once_with(settings.INDEX_SWAP_GRACE_SECONDS)
+    assert not os.path.exists(old.path)
+
+    reopened = ShardedVectorStore(settings, factory)
+    assert await reopened.count() == 3
+    results = await reopened.search([1.0, 0.0], n_results=5, where={"space_key": "ENG"})
+    assert [doc["id"] for doc in results] == ["eng_new"]
@@ -0,0 +1,82 @@
+"""Tests for index snapshot export and import"""
+import os
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from app.core.config import Settings
+from app.services.lexical import LexicalIndex
+from app.services.manifest import IndexManifest, IndexMismatchError
+from app.services.metadata_index import MetadataIndex
+from app.services.mmap_store import MmapVectorStore
+from app.services.page_index import PageIndex
+from app.services.rag import RAGService
+from app.services.snapshot import SNAPSHOT_MANIFEST, SnapshotManifest, export_snapshot, import_snapshot
+
+def _settings(root, **overrides):
+    return Settings(
+        CHROMA_PERSIST_DIR=str(root / "state"),
+        MMAP_INDEX_DIR=str(root / "mmap"),
+        VECTOR_BACKEND="mmap",
+        CHUNK_SIZE=1000,
+        _env_file=None,
+        **overrides
+    )
+
+@pytest.fixture
+def source(tmp_path):
+    settings = _settings(tmp_path / "source")
+    model = Mock()
+    model.encode.side_effect = lambda chunks: [[1.0, float(len(chunk))] for chunk in chunks]
+    model.get_sentence_embedding_dimension.return_value = 2
+    with patch("sentence_transformers.SentenceTransformer", return_value=model):
+        return RAGService(MmapVectorStore(settings), settings)
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(source, tmp_path):
+    """Test that an imported snapshot reproduces chunks, embeddings, side indexes and generation"""
+    await source.ingest_documents([
+        {"id": str(i), "title": f"Page {i}", "content": f"release note {i} ünïcode", "space_key": "ENG", "labels": ["ops"]}
+        for i in range(5)
+    ])
+    snapshot_dir = str(tmp_path / "snapshot")
+    exported = await export_snapshot(source.vector_store, source.settings, snapshot_dir, batch_size=2)
+    assert exported.rows == 5 and len(exported.parts) == 3
+    assert exported.generation == 1 and exported.dimension == 2
+
+    target_settings = _settings(tmp_path / "target", HIERARCHICAL_SEARCH=True)
+    target = MmapVectorStore(target_settings)
+    await target.add_documents(["stale"], ["stale_0"], [[0.0, 1.0]], [{"page_id": "stale"}])
+    imported = await import_snapshot(target, target_settings, snapshot_dir)
+
+    assert imported.rows == 5
+    assert sorted(await target.list_ids()) == sorted(await source.vector_store.list_ids())
+    original = (await source.vector_store.get_documents(["3_0"], include_embeddings=True))[0]
+    copy = (await target.get_documents(["3_0"], include_embeddings=True))[0]
+    assert copy["content"] == original["content"] and copy["metadata"] == original["metadata"]
+    assert np.allclose(copy["embedding"], original["embedding"])
+
+    metadata_index = MetadataIndex(os.path.join(target_settings.CHROMA_PERSIST_DIR, target_settings.METADATA_INDEX_FILE))
+    assert metadata_index.resolve({"page_id": "3"}) == {"3_0"}
+    lexical = LexicalIndex(os.path.join(target_settings.CHROMA_PERSIST_DIR, target_settings.LEXICAL_INDEX_FILE))
+    assert len(lexical) == 5
+    pages = PageIndex(os.path.join(target_settings.CHROMA_PERSIST_DIR, target_settings.PAGE_INDEX_FILE))
+    assert len(pages) == 5
+    assert IndexManifest.load(target_settings.CHROMA_PERSIST_DIR).generation == 1
+
+@pytest.mark.asyncio
+async def test_import_rejects_other_model_and_incomplete_snapshots(source, tmp_path):
+    """Test that snapshots from another model, or without a manifest, are refused"""
+    await source.ingest_documents([{"id": "1", "content": "one"}])
+    snapshot_dir = str(tmp_path / "snapshot")
+    await export_snapshot(source.vector_store, source.settings, snapshot_dir)
+
+    with pytest.raises(FileExistsError):
+        await export_snapshot(source.vector_store, source.settings, snapshot_dir)
+
+    other = _settings(tmp_path / "other", EMBEDDING_MODEL="another-model")
+    with pytest.raises(IndexMismatchError):
+        await import_snapshot(MmapVectorStore(other), other, snapshot_dir)
+
+    os.remove(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST))
+    with pytest.raises(FileNotFoundError):
+        SnapshotManifest.load(snapshot_dir)
@@ -0,0 +1,130 @@
+"""Tests for the stdio JSON-RPC server"""
+import asyncio
+import json
+import pytest
+from unittest.mock import Mock, AsyncMock
+from app.api.mcp.stdio import StdioServer, METHOD_NOT_FOUND, PARSE_ERROR
+from app.services.context import ContextPacker
+from app.services.jobs import JobManager
+
+class QueueReader:
+    """Feeds lines to the server as a test pushes them"""
+
+    def __init__(self):
+        self.lines = asyncio.Queue()
+
+    def send(self, message):
+        self.lines.put_nowait((json.dumps(message) if isinstance(message, dict) else message).encode() + b"\n")
+
+    def close(self):
+        self.lines.put_nowait(b"")
+
+    async def readline(self):
+        return await self.lines.get()
+
+@pytest.fixture
+def services(settings):
+    services = Mock()
+    services.settings = settings
+    services.rerank = None
+    services.packer = ContextPacker(settings)
+    services.rag.search = AsyncMock(return_value=[{
+        "id": "1_0",
+        "content": "Deploy with the release pipeline",
+        "metadata": {"title": "Deploying", "url": "http://test.com", "last_modified": "2025-07-05T10:00:00Z"},
+        "distance": 0.1
+    }])
+    services.rag.ingest_documents = AsyncMock()
+    services.jobs = JobManager(services.confluence, services.rag, settings)
+    return services
+
+async def _run(services, messages, crawl_gate=None):
+    reader, written = QueueReader(), []
+    if crawl_gate is not None:
+        async def crawl(progress=None):
+            await crawl_gate.wait()
+            return [{"id": "1"}]
+        services.confluence.crawl = crawl
+    server = StdioServer(services, reader=reader, write=lambda line: written.append(json.loads(line)))
+    task = asyncio.create_task(server.serve())
+    for message in messages:
+        reader.send(message)
+    return reader, written, task
+
+@pytest.mark.asyncio
+async def test_crawl_runs_as_job(services):
+    """Test that crawl answers at once with a job whose status can be polled"""
+    gate = asyncio.Event()
+    reader, written, task = await _run(services, [
+        {"jsonrpc": "2.0", "id": 1, "method": "crawl"},
+        {"jsonrpc": "2.0", "id": 2, "method": "crawl"},
+    ], crawl_gate=gate)
+
+    while len(written) < 2:
+        await asyncio.sleep(0.01)
+    by_id = {message["id"]: message["result"] for message in written}
+    job_id = by_id[1]["job"]["id"]
+    assert by_id[2]["merged"] and by_id[2]["job"]["id"] == job_id
+
+    gate.set()
+    await services.jobs.wait(job_id)
+    reader.send({"jsonrpc": "2.0", "id": 3, "method": "crawl/status", "params": {"job_id": job_id}})
+    reader.close()
+    await asyncio.wait_for(task, 1)
+    assert written[2]["result"]["status"] == "succeeded"
+    assert written[2]["result"]["documents"] == 1
+
+@pytest.mark.asyncio
+async def test_errors_and_legacy_format(services):
+    """Test JSON-RPC errors, notifications and the legacy request format"""
+    reader, written, task = await _run(services, [
+        "not json",
+        {"jsonrpc": "2.0", "id": 3, "method": "missing"},
+        {"jsonrpc": "2.0", "method": "health"},
+        {"version": "1.0", "type": "request", "id": "legacy", "content": {"query": "deploy"}},
+    ])
+    reader.close()
+    await asyncio.wait_for(task, 1)
+
+    by_id = {message.get("id"): message for message in written}
+    assert len(written) == 3
+    assert by_id[None]["error"]["code"] == PARSE_ERROR
+    assert by_id[3]["error"]["code"] == METHOD_NOT_FOUND
+    assert by_id["legacy"]["type"] == "response"
+    assert by_id["legacy"]["content"]["sources"][0]["url"] == "http://test.com"
+
+@pytest.mark.asyncio
+async def test_handshake_answers_before_services_load(services, settings):
+    """Test that initialize and health answer while the models load and context waits for them"""
+    loaded = asyncio.get_running_loop().create_future()
+    reader, written = QueueReader(), []
+    server = StdioServer(loaded, reader=reader, write=lambda line: written.append(json.loads(line)), settings=settings)
+    task = asyncio.create_task(server.serve())
+    reader.send({"jsonrpc": "2.0", "id": 1, "method": "initialize"})
+    reader.send({"jsonrpc": "2.0", "id": 2, "method": "context", "params": {"messages": [], "query": "deploy"}})
+    reader.send({"jsonrpc": "2.0", "id": 3, "method": "health"})
+
+    while len(written) < 2:
+        await asyncio.sleep(0.01)
+    by_id = {message["id"]: message["result"] for message in written}
+    assert by_id[1]["serverInfo"]["name"] and by_id[1]["ready"] is False
+    assert by_id[3] == {"status": "healthy", "ready": False}
+    assert 2 not in by_id
+
+    loaded.set_result(services)
+    reader.close()
+    await asyncio.wait_for(task, 1)
+    assert written[-1]["id"] == 2
+    assert written[-1]["result"]["sources"][0]["title"] == "Deploying"
+
+@pytest.mark.asyncio
+async def test_requests_fail_when_services_fail_to_load(settings):
+    """Test that requests get an error rather than hanging when loading fails"""
+    failed = asyncio.get_running_loop().create_future()
+    failed.set_exception(RuntimeError("model not found"))
+    reader, written = QueueReader(), []
+    server = StdioServer(failed, reader=reader, write=lambda line: written.append(json.loads(line)), settings=settings)
+    reader.send({"jsonrpc": "2.0", "id": 1, "method": "context", "params": {"messages": [], "query": "deploy"}})
+    reader.close()
+    await asyncio.wait_for(server.serve(), 1)
+    assert "model not found" in written[0]["error"]["message"]
@@ -0,0 +1,58 @@
+"""Tests for the bulk writer"""
+import pytest
+from unittest.mock import Mock, AsyncMock
+from app.services.writer import BulkWriter, BulkWriteError
+
+@pytest.fixture
+def store():
+    mock = Mock()
+    mock.add_documents = AsyncMock()
+    mock.max_batch_size.return_value = 3
+    return mock
+
+def _records(n):
+    return (
+        [f"c_{i}" for i in range(n)],
+        [f"text {i}" for i in range(n)],
+        [[float(i)] for i in range(n)],
+        [{"i": i} for i in range(n)]
+    )
+
+@pytest.mark.asyncio
+async def test_flushes_in_backend_batches(store, settings):
+    """Test that records are written in batches no larger than the backend limit"""
+    flushed = []
+    writer = BulkWriter(store, settings, on_flush=lambda ids, docs, metas: flushed.extend(ids))
+
+    await writer.put_many(*_records(7))
+    stats = await writer.close()
+
+    sizes = [len(call.kwargs["ids"]) for call in store.add_documents.call_args_list]
+    assert sizes == [3, 3, 1]
+    assert stats.rows == 7 and stats.batches == 3
+    assert sorted(flushed) == sorted(_records(7)[0])
+
+@pytest.mark.asyncio
+async def test_retries_failed_batch(store, settings):
+    """Test that a transient failure only retries the failing batch"""
+    store.add_documents.side_effect = [RuntimeError("busy"), None, None]
+    writer = BulkWriter(store, settings, retry_backoff=0)
+
+    await writer.put_many(*_records(6))
+    stats = await writer.close()
+
+    assert store.add_documents.call_count == 3
+    assert stats.retries == 1 and stats.rows == 6
+
+@pytest.mark.asyncio
+async def test_reports_lost_batches(store, settings):
+    """Test that batches failing every attempt are reported on close"""
+    store.add_documents.side_effect = RuntimeError("down")
+    writer = BulkWriter(store, settings, retry_backoff=0)
+
+    await writer.put_many(*_records(2))
+    with pytest.raises(BulkWriteError) as excinfo:
+        await writer.close()
+
+    assert excinfo.value.failed_ids == ["c_0", "c_1"]
+    assert store.add_documents.call_count == settings.WRITE_MAX_RETRIES